@@ -0,0 +1,264 @@
+"""
+Bulk generator of random dictionaries for the merge benchmarks of task4_dict_merge.py.
+generate_list_of_dictionaries of task4_dict.py makes at most 10 dicts with one random call per value;
+DictGenerator makes millions of them in batches, either as dicts or in the columnar form of
+MaxMerge.update_columns, and draws the sizes, keys and values of a whole batch at once.
+
+With numpy installed the batches are filled with numpy arrays, otherwise with random.choices.
+The same seed gives the same dicts on the same backend.
+
+Run: python task4_dict_gen.py --count 1000000 --keys 1000 --distribution zipf
+"""
+
+import argparse
+import math
+import random
+import string
+import time
+from array import array
+from itertools import accumulate
+from typing import Dict, Iterator, List
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DISTRIBUTIONS = ("uniform", "normal", "zipf")
+
+
+def key_names(count: int) -> List[str]:
+    """
+    Generates key names: a to z like task4_dict.py, then aa, ab and so on.
+
+    Args:
+    count (int): Number of keys.
+
+    Returns:
+    list: Distinct key names.
+    """
+    names = []
+    for number in range(count):
+        name = ""
+        number += 1
+        while number:
+            number, letter = divmod(number - 1, 26)
+            name = string.ascii_lowercase[letter] + name
+        names.append(name)
+    return names
+
+
+def value_weights(low: int, high: int, distribution: str = "uniform") -> List[float]:
+    """
+    Computes the probability of every value from low to high.
+
+    Args:
+    low (int): Smallest value.
+    high (int): Largest value.
+    distribution (str): "uniform", "normal" centered between low and high with 3 standard deviations
+    to either end, or "zipf" where value low + n has weight 1 / (n + 1).
+
+    Returns:
+    list: Probabilities of low, low + 1, ..., high.
+    """
+    if distribution not in DISTRIBUTIONS:
+        raise ValueError(f"Unknown distribution: {distribution}. Use one of {', '.join(DISTRIBUTIONS)}.")
+    if high < low:
+        raise ValueError("high must not be smaller than low.")
+    span = high - low + 1
+    if distribution == "uniform":
+        weights = [1.0] * span
+    elif distribution == "normal":
+        center, deviation = (span - 1) / 2, max(span / 6, 1e-9)
+        weights = [math.exp(-0.5 * ((n - center) / deviation) ** 2) for n in range(span)]
+    else:
+        weights = [1 / (n + 1) for n in range(span)]
+    total = sum(weights)
+    return [weight / total for weight in weights]
+
+
+class DictGenerator:
+    """
+    Seeded generator of dictionaries with min_size to max_size distinct keys out of a key space
+    and values drawn from a distribution.
+    """
+
+    def __init__(self, keys: int = 26, min_size: int = 2, max_size: int = 10, low: int = 0, high: int = 100,
+                 distribution: str = "uniform", seed: int = 0):
+        """
+        Args:
+        keys (int): Size of the key space.
+        min_size (int): Smallest number of keys of a dict.
+        max_size (int): Largest number of keys of a dict, at most keys.
+        low (int): Smallest value.
+        high (int): Largest value.
+        distribution (str): Distribution of the values, see value_weights.
+        seed (int): Seed of the generator.
+        """
+        if not 0 <= min_size <= max_size <= keys:
+            raise ValueError("Dict sizes must satisfy 0 <= min_size <= max_size <= keys.")
+        self.keys = key_names(keys)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.low = low
+        self.high = high
+        self.distribution = distribution
+        self.weights = value_weights(low, high, distribution)
+        self.count = 0
+        if np is not None:
+            self._rng = np.random.default_rng(seed)
+        else:
+            self._rng = random.Random(seed)
+            self._cum_weights = list(accumulate(self.weights))
+
+    def _numpy_columns(self, count: int) -> tuple:
+        rng = self._rng
+        sizes = rng.integers(self.min_size, self.max_size + 1, count)
+        used = np.arange(self.max_size) < sizes[:, None]
+        space = len(self.keys)
+        if space <= 8 * self.max_size:
+            # a random permutation of the key space per dict, its first keys are a sample without replacement
+            codes = rng.random((count, space)).argsort(axis=1)[:, :self.max_size]
+        else:
+            # duplicates are rare in a large key space, the dicts with one are drawn again
+            codes = rng.integers(0, space, (count, self.max_size))
+            redraw = np.arange(count)
+            while len(redraw):
+                rows = np.sort(np.where(used[redraw], codes[redraw], -1 - np.arange(self.max_size)), axis=1)
+                redraw = redraw[(rows[:, 1:] == rows[:, :-1]).any(axis=1)]
+                codes[redraw] = rng.integers(0, space, (len(redraw), self.max_size))
+        key_codes = codes[used]
+        if self.distribution == "uniform":
+            values = rng.integers(self.low, self.high + 1, len(key_codes))
+        else:
+            values = rng.choice(len(self.weights), len(key_codes), p=self.weights) + self.low
+        idxs = np.repeat(np.arange(self.count, self.count + count), sizes)
+        return key_codes, values, idxs
+
+    def _python_columns(self, count: int) -> tuple:
+        rng = self._rng
+        sizes = rng.choices(range(self.min_size, self.max_size + 1), k=count)
+        key_codes, idxs = array("q"), array("q")
+        space = range(len(self.keys))
+        for idx, size in enumerate(sizes, start=self.count):
+            key_codes.extend(rng.sample(space, size))
+            idxs.extend([idx] * size)
+        values = array("q", rng.choices(range(self.low, self.high + 1), cum_weights=self._cum_weights,
+                                        k=len(key_codes)))
+        return key_codes, values, idxs
+
+    def columns(self, count: int) -> tuple:
+        """
+        Generates the next dicts in the columnar form of MaxMerge.update_columns.
+
+        Args:
+        count (int): Number of dictionaries.
+
+        Returns:
+        tuple: keys, key codes, values and dict indexes; numpy arrays with numpy installed, else arrays.
+        """
+        if np is not None:
+            key_codes, values, idxs = self._numpy_columns(count)
+        else:
+            key_codes, values, idxs = self._python_columns(count)
+        self.count += count
+        return self.keys, key_codes, values, idxs
+
+    def dicts(self, count: int) -> List[Dict[str, int]]:
+        """
+        Generates the next dicts.
+
+        Args:
+        count (int): Number of dictionaries.
+
+        Returns:
+        list: Dictionaries.
+        """
+        start = self.count
+        return to_dicts(*self.columns(count), start=start, count=count)
+
+    def batches(self, count: int, batch: int = 100000, columnar: bool = False) -> Iterator:
+        """
+        Generates count dicts in batches, so they do not have to be in memory at once.
+
+        Args:
+        count (int): Number of dictionaries.
+        batch (int): Number of dictionaries per batch.
+        columnar (bool): Yield the columns of every batch instead of lists of dicts.
+
+        Returns:
+        iterator: Lists of dicts or column tuples.
+        """
+        for start in range(0, count, batch):
+            size = min(batch, count - start)
+            yield self.columns(size) if columnar else self.dicts(size)
+
+
+def to_dicts(keys, key_codes, values, idxs, start: int = None, count: int = None) -> List[Dict[str, int]]:
+    """
+    Converts the columnar form back to dictionaries.
+
+    Args:
+    start (int): Index of the first dict, the first index of idxs by default.
+    count (int): Number of dicts, up to the last index of idxs by default; dicts without keys have no entries.
+
+    Returns:
+    list: Dictionaries in index order.
+    """
+    if np is not None and isinstance(idxs, np.ndarray):
+        key_codes, values, idxs = key_codes.tolist(), values.tolist(), idxs.tolist()
+    if start is None:
+        start = idxs[0] if len(idxs) else 0
+    if count is None:
+        count = idxs[-1] - start + 1 if len(idxs) else 0
+    list_of_dicts = [{} for _ in range(count)]
+    for code, value, idx in zip(key_codes, values, idxs):
+        list_of_dicts[idx - start][keys[code]] = value
+    return list_of_dicts
+
+
+def generate_dicts(count: int, seed: int = 0, **options) -> List[Dict[str, int]]:
+    """
+    Generates a list of dictionaries, see DictGenerator for the options.
+
+    Args:
+    count (int): Number of dictionaries.
+    seed (int): Seed of the generator.
+
+    Returns:
+    list: Dictionaries.
+    """
+    return DictGenerator(seed=seed, **options).dicts(count)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate random dictionaries in bulk")
+    parser.add_argument("--count", type=int, default=1000000, help="number of dictionaries")
+    parser.add_argument("--keys", type=int, default=26, help="size of the key space")
+    parser.add_argument("--min-size", type=int, default=2, help="smallest number of keys of a dict")
+    parser.add_argument("--max-size", type=int, default=10, help="largest number of keys of a dict")
+    parser.add_argument("--low", type=int, default=0, help="smallest value")
+    parser.add_argument("--high", type=int, default=100, help="largest value")
+    parser.add_argument("--distribution", choices=DISTRIBUTIONS, default="uniform", help="distribution of values")
+    parser.add_argument("--batch", type=int, default=100000, help="dictionaries generated at once")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the generator")
+    parser.add_argument("--show", type=int, default=3, help="number of dictionaries to print")
+    args = parser.parse_args()
+
+    generator = DictGenerator(args.keys, args.min_size, args.max_size, args.low, args.high, args.distribution,
+                              args.seed)
+    for columnar in (True, False):
+        generator.count = 0
+        start = time.perf_counter()
+        entries = 0
+        for batch in generator.batches(args.count, args.batch, columnar):
+            entries += len(batch[1]) if columnar else sum(map(len, batch))
+        elapsed = time.perf_counter() - start
+        print(f"{'columns' if columnar else 'dicts':>8}: {args.count} dicts, {entries} entries in {elapsed:.2f}s, "
+              f"{args.count / elapsed if elapsed else 0:.0f} dicts/s")
+    print(generate_dicts(args.show, args.seed, keys=args.keys, min_size=args.min_size, max_size=args.max_size,
+                         low=args.low, high=args.high, distribution=args.distribution))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,384 @@
+import argparse
+import os
+import random
+import string
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Mapping, Sequence
+
+from task4_dict_gen import DISTRIBUTIONS, DictGenerator, to_dicts
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+_MISSING = object()
+
+
+class MaxMerge:
+    """
+    Running state of merge_dicts: for every key the maximum value and the index of the first dict holding it.
+    Dicts can be added one batch at a time, so the input never has to be in memory as a whole.
+    """
+
+    def __init__(self, start: int = 0):
+        """
+        Args:
+        start (int): index of the first dict added to this state, used for partial merges of a later part.
+        """
+        self.values: Dict[str, Any] = {}
+        self.idxs: Dict[str, int] = {}
+        self.count = start
+
+    def update(self, dicts: Iterable[Mapping[str, Any]]) -> "MaxMerge":
+        """
+        Adds dictionaries, they get the indexes following the dicts added before.
+
+        Args:
+        dicts (iterable): Dictionaries, e.g. a generator.
+
+        Returns:
+        MaxMerge: This state.
+        """
+        values, idxs = self.values, self.idxs
+        idx = self.count
+        for d in dicts:
+            for key, value in d.items():
+                current = values.get(key, _MISSING)
+                # a strictly greater value replaces the current one, so ties keep the lowest index
+                if current is _MISSING or value > current:
+                    values[key] = value
+                    idxs[key] = idx
+            idx += 1
+        self.count = idx
+        return self
+
+    def update_columns(self, keys: Sequence[str], key_codes: Sequence[int], values: Sequence[int],
+                       idxs: Sequence[int]) -> "MaxMerge":
+        """
+        Adds dictionaries in columnar form: entry n is key keys[key_codes[n]] with value values[n] of dict idxs[n].
+        Entries are ordered by dict index and by position in their dict. With numpy installed the entries are
+        merged with vectorized operations, values must then be integers that fit in 64 bits.
+
+        Args:
+        keys (sequence): Distinct keys.
+        key_codes (sequence): Position of the key of every entry in keys.
+        values (sequence): Value of every entry.
+        idxs (sequence): Index of the dict of every entry.
+
+        Returns:
+        MaxMerge: This state.
+        """
+        if not len(key_codes):
+            return self
+        if np is None:
+            state_values, state_idxs = self.values, self.idxs
+            for code, value, idx in zip(key_codes, values, idxs):
+                key = keys[code]
+                current = state_values.get(key, _MISSING)
+                if current is _MISSING or value > current:
+                    state_values[key] = value
+                    state_idxs[key] = idx
+            self.count = max(self.count, idxs[-1] + 1)
+            return self
+
+        key_codes = np.asarray(key_codes)
+        values = np.asarray(values, dtype=np.int64)
+        idxs = np.asarray(idxs, dtype=np.int64)
+        # a stable sort groups the entries by key and keeps every group in dict order
+        order = np.argsort(key_codes, kind="stable")
+        sorted_codes = key_codes[order]
+        starts = np.flatnonzero(np.concatenate(([True], sorted_codes[1:] != sorted_codes[:-1])))
+        sorted_values = values[order]
+        best = np.maximum.reduceat(sorted_values, starts)
+        # the lowest dict index among the entries holding the maximum of their group
+        is_best = sorted_values == np.repeat(best, np.diff(np.append(starts, len(order))))
+        best_idx = np.minimum.reduceat(np.where(is_best, idxs[order], np.iinfo(np.int64).max), starts)
+        # keys in the order of their first entry, like the insertion order of the dict path
+        by_appearance = np.argsort(order[starts], kind="stable")
+        self._combine_items(zip([keys[code] for code in sorted_codes[starts][by_appearance].tolist()],
+                                best[by_appearance].tolist(), best_idx[by_appearance].tolist()))
+        self.count = max(self.count, int(idxs[-1]) + 1)
+        return self
+
+    def combine(self, other: "MaxMerge") -> "MaxMerge":
+        """
+        Adds the partial merge of dicts following the dicts of this state.
+        The merge is associative: merging the parts and combining them in order equals merging everything at once.
+
+        Args:
+        other (MaxMerge): Partial merge of a later part.
+
+        Returns:
+        MaxMerge: This state.
+        """
+        self._combine_items((key, value, other.idxs[key]) for key, value in other.values.items())
+        self.count = max(self.count, other.count)
+        return self
+
+    def _combine_items(self, items: Iterable[tuple]) -> None:
+        values, idxs = self.values, self.idxs
+        for key, value, idx in items:
+            current = values.get(key, _MISSING)
+            if current is _MISSING or value > current or (value == current and idx < idxs[key]):
+                values[key] = value
+                idxs[key] = idx
+
+    def result(self) -> Dict[str, Any]:
+        """
+        Compiles the merged dictionary like task2.py: keys whose maximum is not from the first dict
+        are renamed to key_idx.
+
+        Returns:
+        dict: The merged dictionary.
+        """
+        idxs = self.idxs
+        final_dict = {}
+        for key, value in self.values.items():
+            idx = idxs[key]
+            final_dict[key if idx == 0 else f"{key}_{idx}"] = value
+        return final_dict
+
+
+def merge_dicts(list_of_dicts: Iterable[Mapping[str, Any]]) -> Dict[str, Any]:
+    """
+    Merges dictionaries into a single dictionary, retaining the maximum value for each key
+    with the semantics of task2.py: the first dict with the maximum wins, and its index is
+    appended to the key unless it is the first dict.
+
+    Args:
+    list_of_dicts (iterable): Dictionaries, a list or any iterable, e.g. a generator.
+
+    Returns:
+    dict: The merged dictionary.
+    """
+    return MaxMerge().update(list_of_dicts).result()
+
+
+def _merge_part(part: tuple) -> MaxMerge:
+    """
+    Partial merge of a part of the dicts in a worker process.
+    """
+    dicts, start = part
+    return MaxMerge(start).update(dicts)
+
+
+def partitions(count: int, parts: int) -> List[tuple]:
+    """
+    Splits range(count) into contiguous parts of nearly equal size.
+
+    Returns:
+    list: (start, stop) of every non-empty part in order.
+    """
+    size, extra = divmod(count, parts)
+    bounds, start = [], 0
+    for part in range(parts):
+        stop = start + size + (part < extra)
+        if stop > start:
+            bounds.append((start, stop))
+        start = stop
+    return bounds
+
+
+def parallel_merge_dicts(list_of_dicts: Sequence[Mapping[str, Any]], workers: int = None,
+                         parts: int = None) -> Dict[str, Any]:
+    """
+    Merges dictionaries like merge_dicts with a pool of processes: every worker merges a contiguous part
+    of the list into a partial MaxMerge, and the partial results are combined in list order,
+    so ties still go to the lowest index and the keys keep the order of their first appearance.
+
+    Args:
+    list_of_dicts (sequence): Dictionaries, keys and values must be picklable.
+    workers (int): Number of processes, the number of CPUs by default.
+    parts (int): Number of parts, one per worker by default.
+
+    Returns:
+    dict: The merged dictionary, equal to merge_dicts(list_of_dicts).
+    """
+    workers = workers or os.cpu_count() or 1
+    bounds = partitions(len(list_of_dicts), parts or workers)
+    jobs = [(list_of_dicts[start:stop], start) for start, stop in bounds]
+    merged = MaxMerge()
+    if workers == 1 or len(jobs) < 2:
+        for partial in map(_merge_part, jobs):
+            merged.combine(partial)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for partial in executor.map(_merge_part, jobs):
+                merged.combine(partial)
+    return merged.result()
+
+
+def merge_columns(keys: Sequence[str], key_codes: Sequence[int], values: Sequence[int],
+                  idxs: Sequence[int]) -> Dict[str, int]:
+    """
+    Merges dictionaries given in columnar form, see MaxMerge.update_columns.
+
+    Returns:
+    dict: The merged dictionary.
+    """
+    return MaxMerge().update_columns(keys, key_codes, values, idxs).result()
+
+
+def to_columns(list_of_dicts: Iterable[Mapping[str, int]]) -> tuple:
+    """
+    Converts dictionaries with integer values to the columnar form of merge_columns.
+
+    Returns:
+    tuple: keys, key codes, values and dict indexes.
+    """
+    codes: Dict[str, int] = {}
+    key_codes, values, idxs = array("q"), array("q"), array("q")
+    for idx, d in enumerate(list_of_dicts):
+        for key, value in d.items():
+            code = codes.get(key)
+            if code is None:
+                code = codes[key] = len(codes)
+            key_codes.append(code)
+            values.append(value)
+            idxs.append(idx)
+    return list(codes), key_codes, values, idxs
+
+
+def reference_merge(list_of_dicts: List[Mapping[str, Any]]) -> Dict[str, Any]:
+    """
+    merge_dicts of task2.py, which cannot be imported because it runs on import.
+    """
+    result_dict = {}
+    for idx, d in enumerate(list_of_dicts, start=0):
+        for key, value in d.items():
+            if key in result_dict:
+                if value > result_dict[key][0]:
+                    result_dict[key] = (value, idx)
+            else:
+                result_dict[key] = (value, idx)
+
+    final_dict = {}
+    for key, (value, idx) in result_dict.items():
+        if idx == 0:
+            final_dict[key] = value
+        else:
+            final_dict[f"{key}_{idx}"] = value
+    return final_dict
+
+
+def check(samples: int = 1000, seed: int = 0, workers: int = 2) -> int:
+    """
+    Compares the partial merges combined in order with the task2 reference on random inputs:
+    few keys and values, so ties and renamed keys are common, split into random parts.
+    Every tenth sample also runs through parallel_merge_dicts with a process pool.
+
+    Args:
+    samples (int): Number of random inputs.
+    seed (int): Seed of the generator.
+    workers (int): Number of processes of the pool samples.
+
+    Returns:
+    int: Number of mismatches, they are printed.
+    """
+    rng = random.Random(seed)
+    mismatches = 0
+    for sample in range(samples):
+        keys = string.ascii_lowercase[:rng.randint(1, 8)]
+        list_of_dicts = [{key: rng.randint(0, 4) for key in rng.sample(keys, rng.randint(0, len(keys)))}
+                         for _ in range(rng.randint(0, 40))]
+        expected = reference_merge(list_of_dicts)
+        cuts = sorted(rng.sample(range(len(list_of_dicts) + 1), rng.randint(0, len(list_of_dicts) + 1)))
+        merged = MaxMerge()
+        for start, stop in zip([0] + cuts, cuts + [len(list_of_dicts)]):
+            merged.combine(MaxMerge(start).update(list_of_dicts[start:stop]))
+        results = [merged.result()]
+        if sample % 10 == 0:
+            results.append(parallel_merge_dicts(list_of_dicts, workers, rng.randint(1, 5)))
+        for actual in results:
+            if list(actual.items()) != list(expected.items()):
+                mismatches += 1
+                print(f"Mismatch for {list_of_dicts!r}:\n  expected {expected!r}\n  actual   {actual!r}")
+                break
+    return mismatches
+
+
+def benchmark(sizes: Sequence[int], batch: int = 100000, seed: int = 0, workers: int = None,
+              **generator_options) -> None:
+    """
+    Times the merge implementations, generation of the input is not timed.
+    The input comes from task4_dict_gen.DictGenerator in columnar form, the dict implementations get
+    the same dicts converted with to_dicts.
+    Inputs are generated and merged in batches, so 10^7 dicts do not have to be in memory at once;
+    the task2 reference needs the whole list and is only run up to 10^6 dicts.
+
+    Args:
+    sizes (sequence): Numbers of dictionaries.
+    batch (int): Number of dictionaries generated and merged at once.
+    seed (int): Seed of the generator.
+    workers (int): Number of processes of parallel_merge_dicts, which runs on the task2 input.
+    generator_options: Key space, dict sizes and value distribution, see DictGenerator.
+    """
+    print(f"{'dicts':>10}{'implementation':>26}{'seconds':>10}{'dicts/s':>14}")
+    for size in sizes:
+        timings = {"task2 reference": 0.0, "MaxMerge.update": 0.0, "update_columns": 0.0}
+        streaming, columnar = MaxMerge(), MaxMerge()
+        reference_input = [] if size <= 1_000_000 else None
+        generator = DictGenerator(seed=seed, **generator_options)
+        for offset in range(0, size, batch):
+            count = min(batch, size - offset)
+            columns = generator.columns(count)
+            dicts = to_dicts(*columns, start=offset, count=count)
+            start = time.perf_counter()
+            streaming.update(dicts)
+            timings["MaxMerge.update"] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            columnar.update_columns(*columns)
+            timings["update_columns"] += time.perf_counter() - start
+            if reference_input is not None:
+                reference_input.extend(dicts)
+
+        expected = streaming.result()
+        # checked explicitly, python -O removes assert statements
+        checks = {"columnar merge differs": columnar.result() == expected}
+        if reference_input is not None:
+            start = time.perf_counter()
+            reference = reference_merge(reference_input)
+            timings["task2 reference"] = time.perf_counter() - start
+            checks["merge differs from task2"] = list(reference.items()) == list(expected.items())
+            start = time.perf_counter()
+            parallel = parallel_merge_dicts(reference_input, workers)
+            timings["parallel_merge_dicts"] = time.perf_counter() - start
+            checks["parallel merge differs"] = list(parallel.items()) == list(expected.items())
+        else:
+            del timings["task2 reference"]
+        failed = [message for message, passed in checks.items() if not passed]
+        if failed:
+            raise AssertionError(f"Benchmark of {size} dicts failed: {', '.join(failed)}")
+
+        for name, seconds in timings.items():
+            label = f"{name} (numpy)" if name == "update_columns" and np is not None else name
+            print(f"{size:>10}{label:>26}{seconds:>10.3f}{size / seconds if seconds else 0:>14.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark merge_dicts implementations")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10 ** 3, 10 ** 5, 10 ** 7],
+                        help="numbers of dictionaries")
+    parser.add_argument("--batch", type=int, default=100000, help="dictionaries generated and merged at once")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the generator")
+    parser.add_argument("--keys", type=int, default=26, help="size of the key space")
+    parser.add_argument("--high", type=int, default=100, help="largest value, values start at 0")
+    parser.add_argument("--distribution", choices=DISTRIBUTIONS, default="uniform", help="distribution of values")
+    parser.add_argument("--workers", type=int, help="processes of the parallel merge, the number of CPUs by default")
+    parser.add_argument("--check", type=int, metavar="SAMPLES",
+                        help="compare partial and parallel merges with task2 on random inputs instead")
+    args = parser.parse_args()
+    if args.check is not None:
+        mismatches = check(args.check, args.seed, args.workers or 2)
+        print(f"{args.check} samples, {mismatches} mismatches")
+        return
+    benchmark(args.sizes, args.batch, args.seed, args.workers, keys=args.keys, high=args.high,
+              distribution=args.distribution)
+
+
+if __name__ == "__main__":
+    main()
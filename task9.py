@@ -4,14 +4,38 @@ and that folder is placed in the same folder as this script.
 You can find sample xml file with records in the branch.
 """
 
-import csv
-import json
+import functools
+import mmap
 import os
 from collections import Counter
-import xml.etree.ElementTree as eT
-from datetime import datetime
-from typing import List
-from task9_imp_module import capitalize_first_word, normalize_text
+from itertools import repeat
+from datetime import date, datetime, time
+from typing import Callable, Iterator, List, Optional, Tuple
+# csv, json, xml.etree, concurrent.futures and the optional task9_* features are imported on the code paths
+# using them, so a run with manual entry or a txt source does not pay for loading them at startup
+from task9_imp_module import capitalize_first_word, normalize_text, tokenize
+from task9_io import FeedWriter, compression_suffix, open_file, source_extension
+from task9_metrics import (TextfileExporter, duplicates_skipped, feed_records, parse_failures, parse_seconds,
+                           records_added, records_parsed, registry)
+from task9_profiling import profiler
+
+# txt source files bigger than this are parsed by a pool of processes
+PARALLEL_PARSE_THRESHOLD = 64 * 1024 * 1024
+PARALLEL_CHUNK_SIZE = 16 * 1024 * 1024
+SOURCE_ENCODING = "utf-8"
+TXT_RECORD_TYPES = {"news", "private ad", "weather"}
+
+
+def cached_rendering(method: Callable[["Record"], str]) -> Callable[["Record"], str]:
+    """
+    Cache the text returned by a rendering method of a record until its cache_key changes
+    """
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self: "Record") -> str:
+        return self.rendered(name, lambda: method(self))
+    return wrapper
 
 
 class Record:
@@ -22,12 +46,42 @@ class Record:
     def __init__(self, text: str):
         self.text = text
 
+    def cache_key(self) -> tuple:
+        """
+        Get the fields the rendered texts depend on, a change of any of them invalidates the cached texts
+        """
+        return (self.text,)
+
+    def rendered(self, name: str, render: Callable[[], str]) -> str:
+        """
+        Get a rendering of the record, render is called only if the record changed since the last call
+        :param name: name of the rendering, e.g. "publish"
+        :param render: function building the text
+        """
+        key = self.cache_key()
+        # records restored with __new__, e.g. from a snapshot, have no cache yet
+        cache = self.__dict__.get("_renderings")
+        if cache is None or cache[0] != key:
+            cache = self._renderings = (key, {})
+        text = cache[1].get(name)
+        if text is None:
+            text = cache[1][name] = render()
+        return text
+
+    @cached_rendering
+    def render_normalized(self) -> str:
+        """
+        Render the published record normalized and capitalized, the way publish_feed shows it
+        """
+        return capitalize_first_word(normalize_text(self.publish())) + "\n"
+
 
 class News(Record):
     """
     Class for news records
     """
 
+    @profiler.timed("build_record")
     def __init__(self, text: str, city: str):
         """
         Initialise a news record
@@ -47,6 +101,10 @@ class News(Record):
     def city(self, value):
         self._city = value.capitalize()
 
+    def cache_key(self) -> tuple:
+        return self.text, self._city, self.date
+
+    @cached_rendering
     def publish(self) -> str:
         """
         Publish news record
@@ -59,6 +117,7 @@ class PrivateAd(Record):
     Class for private advertisements
     """
 
+    @profiler.timed("build_record")
     def __init__(self, text: str, expiration_date: datetime):
         """
         Initialise a private advertisement record
@@ -67,8 +126,18 @@ class PrivateAd(Record):
         """
         super().__init__(text)
         self.expiration_date = expiration_date
-        self.days_left = (self.expiration_date - datetime.now()).days
 
+    @property
+    def days_left(self) -> int:
+        """
+        Number of whole days left at the end of today, it changes once a day and not during the day
+        """
+        return (self.expiration_date - datetime.combine(date.today(), time.max)).days
+
+    def cache_key(self) -> tuple:
+        return self.text, self.expiration_date, date.today()
+
+    @cached_rendering
     def publish(self) -> str:
         """
         Publish the private adv
@@ -80,11 +149,26 @@ class PrivateAd(Record):
                 f"{self.days_left} days left\n")
 
 
+def temperature_band(temperature: int) -> str:
+    """
+    Get the band of a temperature in Celsius: cold, cool, warm or hot
+    """
+    if temperature < 0:
+        return "cold"
+    elif 0 <= temperature <= 15:
+        return "cool"
+    elif 16 <= temperature <= 25:
+        return "warm"
+    else:
+        return "hot"
+
+
 class Weather(Record):
     """
     Class for weather records
     """
 
+    @profiler.timed("build_record")
     def __init__(self, city: str, temperature: int):
         """
         Initialise a weather record
@@ -104,48 +188,137 @@ class Weather(Record):
     def city(self, value):
         self._city = capitalize_first_word(value)
 
+    def cache_key(self) -> tuple:
+        return self.text, self._city, self.temperature, self.date
+
+    @cached_rendering
     def publish(self) -> str:
         """
         Publish the notification about the weather
         """
         message = f"Weather today--------------\nIt is {self.temperature} in {self.city} today.\n{self.date}\n"
-        if self.temperature < 0:
-            message += "It is cold\n"
-        elif 0 <= self.temperature <= 15:
-            message += "It is cool\n"
-        elif 16 <= self.temperature <= 25:
-            message += "It is warm\n"
-        else:
-            message += "It is hot\n"
+        message += f"It is {temperature_band(self.temperature)}\n"
         return message
 
 
+def count_added(records: List[Record]) -> None:
+    """
+    Count merged records in the records_added metric per type, like add_record counts a single record
+    """
+    for record_type, count in Counter(type(record).__name__ for record in records).items():
+        records_added.labels(record_type).inc(count)
+
+
 class NewsFeed:
     """
     Class representing a collection of records
     """
 
-    def __init__(self):
+    def __init__(self, word_counts=None, dedup=None, weather_index=None, feed_index=None):
+        """
+        :param word_counts: container of the word counts, a Counter by default; an ApproximateWordCounts
+        from task9_sketch keeps the memory fixed and saves only the heavy hitters with save_cnt_words
+        :param dedup: RecordDeduplicator from task9_dedup, records it has seen before are skipped by add_record
+        :param weather_index: WeatherIndex from task9_weather updated with the added weather records
+        :param feed_index: FeedIndex from task9_publish updated with the positions of the added records
+        """
         self.records = []
-        self.word_counts: Counter = Counter()
+        self.dedup = dedup
+        self.weather_index = weather_index
+        self.feed_index = feed_index
+        self.word_counts: Counter = Counter() if word_counts is None else word_counts
         self.letter_counts: Counter = Counter()
         self.total_letters = 0
         self.total_uppercase_letters: dict = {}  # Initialize as an empty dictionary
 
-    def add_record(self, record: Record) -> None:
+    @profiler.timed("add_record")
+    def add_record(self, record: Record) -> bool:
         """
         Add a record to the news feed
+        :return: bool: False if the record is a duplicate and was skipped
         """
+        if self.dedup is not None and self.dedup.check_and_add(record):
+            duplicates_skipped.inc()
+            return False
         self.records.append(record)
         self.count_words(record.text)
         self.count_letters(record.text)
+        if self.weather_index is not None and isinstance(record, Weather):
+            self.weather_index.add(record)
+        if self.feed_index is not None:
+            self.feed_index.add(record, len(self.records) - 1)
+        records_added.labels(type(record).__name__).inc()
+        feed_records.set(len(self.records))
+        return True
+
+    def merge(self, other: "NewsFeed") -> None:
+        """
+        Merge records and statistics of another news feed into this one
+        :param other: NewsFeed whose records are appended after the records of this feed
+        """
+        if self.dedup is not None:
+            other = self.without_duplicates(other, self.dedup.check_and_add)
+        count_added(other.records)
+        if self.feed_index is not None:
+            self.feed_index.add_records(other.records, len(self.records))
+        self.records.extend(other.records)
+        if self.weather_index is not None:
+            self.weather_index.add_records(other.records)
+        self.word_counts.update(other.word_counts)
+        self.letter_counts.update(other.letter_counts)
+        for letter, count in other.total_uppercase_letters.items():
+            self.total_uppercase_letters[letter] = self.total_uppercase_letters.get(letter, 0) + count
+        if other.records:
+            # total_letters holds the letters of the last counted record, keep the same meaning after merge
+            self.total_letters = other.total_letters
+        feed_records.set(len(self.records))
+
+    @staticmethod
+    def without_duplicates(news_feed: "NewsFeed", is_duplicate: Callable[[Record], bool]) -> "NewsFeed":
+        """
+        Drop the duplicate records of a news feed before it is merged
+        :param news_feed: feed whose records are checked in order
+        :param is_duplicate: check_and_add of a RecordDeduplicator, it adds the fingerprints of new records
+        :return: NewsFeed: news_feed itself if no record is a duplicate, otherwise a feed with the new records
+            and the statistics of news_feed without the statistics of the duplicates
+        """
+        kept, duplicates = [], NewsFeed()
+        for record in news_feed.records:
+            if is_duplicate(record):
+                duplicates.records.append(record)
+            else:
+                kept.append(record)
+        if not duplicates.records:
+            return news_feed
+        duplicates_skipped.inc(len(duplicates.records))
+        deduplicated = NewsFeed()
+        deduplicated.records = kept
+        if isinstance(news_feed.word_counts, Counter):
+            # duplicates are rare, subtracting their statistics is cheaper than counting the new records
+            for record in duplicates.records:
+                duplicates.count_words(record.text)
+                duplicates.count_letters(record.text)
+            deduplicated.word_counts = news_feed.word_counts - duplicates.word_counts
+            deduplicated.letter_counts = news_feed.letter_counts - duplicates.letter_counts
+            deduplicated.total_uppercase_letters = dict(
+                Counter(news_feed.total_uppercase_letters) - Counter(duplicates.total_uppercase_letters))
+        else:
+            # sketches cannot be subtracted from, the new records are counted again
+            for record in kept:
+                deduplicated.count_words(record.text)
+                deduplicated.count_letters(record.text)
+        if kept and kept[-1] is news_feed.records[-1]:
+            deduplicated.total_letters = news_feed.total_letters
+        elif kept:
+            # total_letters holds the letters of the last counted record
+            deduplicated.total_letters = sum(1 for char in kept[-1].text.lower() if char.isalpha())
+        return deduplicated
 
     def count_words(self, text):
         """
         Count words in the text and update word counts
         """
-        words = text.lower().split()
-        self.word_counts.update(words)
+        self.word_counts.update(tokenize(text.lower()).words)
 
     def count_letters(self, text):
         """
@@ -163,18 +336,23 @@ class NewsFeed:
                 if char.isupper():
                     self.total_uppercase_letters[char_lower] = self.total_uppercase_letters.get(char_lower, 0) + 1
 
-    def save_cnt_words(self, filename):
-        with open(filename, 'w', newline="") as csvfile:
+    @profiler.timed("save_cnt_words")
+    def save_cnt_words(self, filename, compresslevel: int = None):
+        import csv
+        with open_file(filename, 'w', compresslevel, newline="") as csvfile:
             writer = csv.writer(csvfile, delimiter='-')
             for word, count in self.word_counts.items():
                 writer.writerow([word, count])
 
-    def save_cnt_letters(self, filename):
+    @profiler.timed("save_cnt_letters")
+    def save_cnt_letters(self, filename, compresslevel: int = None):
         """
         Save letter counts to a CSV file
-        :param filename: Name of the CSV file
+        :param filename: Name of the CSV file, a compression suffix like .gz compresses the file
+        :param compresslevel: compression level for compressed files
         """
-        with open(filename, 'w', newline='') as csvfile:
+        import csv
+        with open_file(filename, 'w', compresslevel, newline='') as csvfile:
             headers = ["letter", "count_all", "count_uppercase", "percentage"]
             writer = csv.DictWriter(csvfile, fieldnames=headers)
             writer.writeheader()
@@ -193,21 +371,102 @@ class NewsFeed:
         """
         Publish the entire news feed
         """
-        output = "News feed:\n"
-        for record in self.records:
-            output += capitalize_first_word(normalize_text(record.publish())) + "\n"
-        return output
+        return "News feed:\n" + "".join([record.render_normalized() for record in self.records])
 
-    def save_to_file(self) -> None:
+    @staticmethod
+    def render_record(record: Record) -> str:
+        """
+        Render a record the way it is saved to the news feed file, the text is cached by the record
+        """
+        if isinstance(record, Weather):
+            return record.publish()
+        return record.render_normalized()
+
+    @profiler.timed("save_to_file")
+    def save_to_file(self, filename: str = "NewsFeed.txt", compresslevel: int = None,
+                     writer: FeedWriter = None) -> None:
         """
         Save the news feed to a file
+        :param filename: Name of the file, a compression suffix like .gz appends a compressed stream
+        :param compresslevel: compression level for compressed files
+        :param writer: long lived FeedWriter to use instead of opening the file, filename is ignored then
         """
-        with open("NewsFeed.txt", "a") as file:
-            for record in self.records:
-                if isinstance(record, Weather):
-                    file.write(record.publish())
-                else:
-                    file.write(capitalize_first_word(normalize_text(record.publish())) + "\n")
+        profiler.add("save_to_file", records=len(self.records))
+        if writer is not None:
+            writer.write_records(map(self.render_record, self.records))
+            return
+        with open_file(filename, "a", compresslevel) as file:
+            file.writelines(map(self.render_record, self.records))
+
+
+def validate_city(city: str) -> str:
+    """
+    Check a city name entered by a user
+    :return: str: the city
+    :raises ValueError: if the city contains digits
+    """
+    if any(char.isdigit() for char in city):  # check if city input contains digits
+        raise ValueError("Invalid city. Please enter a valid city name.")
+    return city
+
+
+def validate_expiration_date(value: str) -> datetime:
+    """
+    Check an expiration date entered by a user
+    :param value: date in the format dd/mm/yyyy
+    :return: datetime: the expiration date
+    :raises ValueError: if the format is wrong or the date is in the past
+    """
+    try:
+        expiration_date = datetime.strptime(value, "%d/%m/%Y")
+    except (TypeError, ValueError):
+        raise ValueError("Wrong date format. Please enter date in the format dd/mm/yyyy.") from None
+    if expiration_date < datetime.now():  # check valid date
+        raise ValueError("Expiration date cannot be in the past. Please enter a future date.")
+    return expiration_date
+
+
+def validate_temperature(value) -> int:
+    """
+    Check a temperature entered by a user
+    :param value: temperature in Celsius, an integer or its text
+    :return: int: the temperature
+    :raises ValueError: if the value is not an integer
+    """
+    try:
+        if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+            raise ValueError(value)
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError("Invalid temperature. Please enter a valid integer value.") from None
+
+
+def validate_record(fields: dict) -> Record:
+    """
+    Create a record from the fields of a submitted record with the checks of get_user_input
+    :param fields: type ("news", "private ad" or "weather") and text, city, expiration_date or temperature
+    :return: Record: created record
+    :raises ValueError: if a field is missing or invalid
+    """
+    record_type = str(fields.get("type") or "").strip().lower()
+
+    def text_field(name: str) -> str:
+        value = fields[name]
+        # e.g. a JSON null would become the text "None"
+        if not isinstance(value, str):
+            raise ValueError(f"Field {name} of {record_type} record must be a string.")
+        return value
+
+    try:
+        if record_type == "news":
+            return News(text_field("text"), validate_city(text_field("city")))
+        elif record_type == "private ad":
+            return PrivateAd(text_field("text"), validate_expiration_date(fields["expiration_date"]))
+        elif record_type == "weather":
+            return Weather(validate_city(text_field("city")), validate_temperature(fields["temperature"]))
+    except KeyError as e:
+        raise ValueError(f"Missing field {e.args[0]} of {record_type} record.") from None
+    raise ValueError(f"Unknown record type: {fields.get('type')}.")
 
 
 # Function to get user input
@@ -220,43 +479,27 @@ def get_user_input() -> Record:
     if record_type == 1 or record_type == 2:
         text = input("Insert text: ")
     if record_type == 1:
-        while True:
-            city = input("Insert city: ")
-            if not any(char.isdigit() for char in city):  # check if city input contains digits
-                break
-            else:
-                print("Invalid city. Please enter a valid city name.")
-        return News(text, city)
+        return News(text, _ask("Insert city: ", validate_city))
     elif record_type == 2:
-        while True:
-            expiration_date_str = input("Insert expiration date (dd/mm/yyyy): ")
-            try:
-                expiration_date = datetime.strptime(expiration_date_str, "%d/%m/%Y")
-                if expiration_date < datetime.now():  # check valid date
-                    print("Expiration date cannot be in the past. Please enter a future date.")
-                else:
-                    return PrivateAd(text, expiration_date)
-            except ValueError:
-                print("Wrong date format. Please enter date in the format dd/mm/yyyy.")
+        return PrivateAd(text, _ask("Insert expiration date (dd/mm/yyyy): ", validate_expiration_date))
     elif record_type == 3:
-        while True:
-            city = input("Insert city: ")
-            if not any(char.isdigit() for char in city):  # check if city input contains digits
-                break
-            else:
-                print("Invalid city. Please enter a valid city name.")
-        while True:
-            temperature_str = input("Insert temperature in Celsius: ")
-            try:
-                temperature = int(temperature_str)
-                break
-            except ValueError:
-                print("Invalid temperature. Please enter a valid integer value.")
-        return Weather(city, temperature)
+        city = _ask("Insert city: ", validate_city)
+        return Weather(city, _ask("Insert temperature in Celsius: ", validate_temperature))
     else:
         print("Invalid choice. Please try again.")
 
 
+def _ask(prompt: str, validate: Callable):
+    """
+    Ask until the answer passes the check, the reason of a rejected answer is printed
+    """
+    while True:
+        try:
+            return validate(input(prompt))
+        except ValueError as e:
+            print(e)
+
+
 class TxtParser:
     def __init__(self, file_path: str = None):
         if file_path:
@@ -266,6 +509,7 @@ class TxtParser:
             script_dir = os.path.dirname(os.path.abspath(__file__))
             self.file_path = os.path.join(script_dir, "news_file.txt")
 
+    @profiler.timed("txt.read_records", count_result=True)
     def read_records(self) -> List[str]:
         """
         Read records from the source file
@@ -273,7 +517,8 @@ class TxtParser:
         """
         try:
             if os.path.exists(self.file_path):
-                with open(self.file_path, "r") as file:
+                profiler.add("txt.read_records", nbytes=os.path.getsize(self.file_path))
+                with open_file(self.file_path, "r") as file:
                     records = file.readlines()
                     if not records:
                         print("No records found in the source file.")
@@ -297,7 +542,7 @@ class TxtParser:
         Write records to the file
         :param records: List of records to be written
         """
-        with open(self.file_path, "a") as file:
+        with open_file(self.file_path, "a") as file:
             for record in records:
                 file.write(record)
 
@@ -312,37 +557,235 @@ class TxtParser:
         except Exception as e:
             print(f"An unexpected error occurred while deleting the file: {e}")
 
+    @staticmethod
+    def parse_line(record: str, news_feed: NewsFeed) -> None:
+        """
+        Parse one line of the source file and add the record to the news feed
+        :param record: line of the source file, e.g. news|text|city
+        :param news_feed: NewsFeed object to add the record to
+        """
+        try:
+            record_data = record.strip().split("|")
+            if len(record_data) >= 3:  # ensure there are enough elements in the record_data
+                TxtParser.add_fields(record_data[0].strip().lower(), record_data[1], record_data[2], news_feed)
+            else:
+                parse_failures.labels("txt").inc()
+                print(f"Unknown record type: {record_data[0]}. Skipping.")
+        except IndexError:
+            parse_failures.labels("txt").inc()
+            print("Record format is incorrect. Skipping this record.")
+
+    @staticmethod
+    def build_record(record_type: str, first: str, second: str) -> Optional[Record]:
+        """
+        Create a record from the fields of one line
+        :param record_type: lowercase record type
+        :param first: text of news and private ads, city of weather records
+        :param second: city of news, expiration date of private ads, temperature of weather records
+        :return: Optional[Record]: created record, None for unknown record types
+        """
+        if record_type == "news":
+            return News(first, second)
+        elif record_type == "private ad":
+            expiration_date = datetime.strptime(second, "%d/%m/%Y")
+            return PrivateAd(first, expiration_date)
+        elif record_type == "weather":
+            return Weather(first, int(second))
+        return None
+
+    @staticmethod
+    def add_fields(record_type: str, first: str, second: str, news_feed: NewsFeed) -> None:
+        """
+        Create a record from the fields of one line and add it to the news feed
+        :param record_type: lowercase record type
+        :param first: text of news and private ads, city of weather records
+        :param second: city of news, expiration date of private ads, temperature of weather records
+        :param news_feed: NewsFeed object to add the record to
+        """
+        record = TxtParser.build_record(record_type, first, second)
+        if record is not None:
+            news_feed.add_record(record)
+
+    def read_records_mmap(self, start: int = 0, end: int = None) -> Iterator[Tuple[str, Optional[str], Optional[str]]]:
+        """
+        Read records from the memory mapped source file without decoding the whole file.
+        Lines and fields are found in the mapped buffer and only the first three fields are decoded,
+        text fields of unknown record types are not decoded at all
+        :param start: offset of the first byte to read, must be at the start of a line
+        :param end: offset after the last byte to read, defaults to the end of the file
+        :return: Iterator[Tuple[str, Optional[str], Optional[str]]]: (type, first, second) of every line,
+            type is lowercase; for lines with less than three fields the raw first field and None, None
+        """
+        with open(self.file_path, "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                view = memoryview(buf)
+                find = buf.find
+                try:
+                    end = len(buf) if end is None else end
+                    while start < end:
+                        line_end = find(b"\n", start, end)
+                        if line_end == -1:
+                            line_end = end
+                        first_bar = find(b"|", start, line_end)
+                        second_bar = find(b"|", first_bar + 1, line_end) if first_bar != -1 else -1
+                        if second_bar == -1:
+                            if first_bar == -1:
+                                yield str(view[start:line_end], SOURCE_ENCODING).strip(), None, None
+                            else:
+                                yield str(view[start:first_bar], SOURCE_ENCODING).lstrip(), None, None
+                        else:
+                            # decoded before stripping, so Unicode whitespace is stripped like parse_line does
+                            record_type = str(view[start:first_bar], SOURCE_ENCODING).strip().lower()
+                            if record_type not in TXT_RECORD_TYPES:
+                                yield record_type, "", ""
+                            else:
+                                third_bar = find(b"|", second_bar + 1, line_end)
+                                if third_bar == -1:
+                                    # the last field of the line, strip it like the whole line is stripped
+                                    second = str(view[second_bar + 1:line_end], SOURCE_ENCODING).rstrip()
+                                else:
+                                    second = str(view[second_bar + 1:third_bar], SOURCE_ENCODING)
+                                yield record_type, str(view[first_bar + 1:second_bar], SOURCE_ENCODING), second
+                        start = line_end + 1
+                finally:
+                    view.release()
+
+    def split_byte_ranges(self, chunk_size: int) -> List[Tuple[int, int]]:
+        """
+        Split the source file into byte ranges which start and end on line boundaries
+        :param chunk_size: approximate size of one range in bytes
+        :return: List[Tuple[int, int]]: (start, end) offsets of the ranges in file order
+        """
+        size = os.path.getsize(self.file_path)
+        ranges = []
+        with open(self.file_path, "rb") as file:
+            start = 0
+            while start < size:
+                end = min(start + chunk_size, size)
+                if end < size:
+                    # move the end of the range to the end of the line it falls into
+                    file.seek(end)
+                    file.readline()
+                    end = file.tell()
+                ranges.append((start, end))
+                start = end
+        return ranges
+
+    @profiler.timed("txt.parse")
+    @parse_seconds.labels("txt").timed
     def parse_txt(self, news_feed: NewsFeed) -> bool:
         """
         Parse the source file and add records to the news feed
         :param news_feed: NewsFeed object to add records to
         :return: bool: True if parsing is successful, False otherwise
         """
+        return self._parse_txt(news_feed)
+
+    def _parse_txt(self, news_feed: NewsFeed) -> bool:
+        # not timed, parse_txt_mmap and parse_txt_parallel fall back to it and are timed themselves
         records = self.read_records()
         if not records:
             return False
 
+        records_before = len(news_feed.records)
         for record in records:
-            try:
-                record_data = record.strip().split("|")
-                if len(record_data) >= 3:  # ensure there are enough elements in the record_data
-                    record_type = record_data[0].strip().lower()
-                    if record_type == "news":
-                        news_feed.add_record(News(record_data[1], record_data[2]))
-                    elif record_type == "private ad":
-                        expiration_date = datetime.strptime(record_data[2], "%d/%m/%Y")
-                        news_feed.add_record(PrivateAd(record_data[1], expiration_date))
-                    elif record_type == "weather":
-                        news_feed.add_record(Weather(record_data[1], int(record_data[2])))
-                else:
-                    print(f"Unknown record type: {record_data[0]}. Skipping.")
-            except IndexError:
-                print("Record format is incorrect. Skipping this record.")
+            self.parse_line(record, news_feed)
+        records_parsed.labels("txt").inc(len(news_feed.records) - records_before)
+
+        self.delete_file()
+        return True
+
+    @profiler.timed("txt.parse_mmap")
+    @parse_seconds.labels("txt").timed
+    def parse_txt_mmap(self, news_feed: NewsFeed) -> bool:
+        """
+        Parse the memory mapped source file and add records to the news feed
+        :param news_feed: NewsFeed object to add records to
+        :return: bool: True if parsing is successful, False otherwise
+        """
+        if not os.path.exists(self.file_path):
+            print("Source file not found at the specified path or already deleted.")
+            return False
+        if compression_suffix(self.file_path):
+            # compressed files cannot be mapped, they are decompressed while streaming
+            return self._parse_txt(news_feed)
+        if os.path.getsize(self.file_path) == 0:
+            print("No records found in the source file.")
+            return False
+
+        profiler.add("txt.parse_mmap", nbytes=os.path.getsize(self.file_path))
+        records_before = len(news_feed.records)
+        self.add_mmap_records(self.read_records_mmap(), news_feed)
+        records_parsed.labels("txt").inc(len(news_feed.records) - records_before)
+        self.delete_file()
+        return True
+
+    @staticmethod
+    def add_mmap_records(records: Iterator[Tuple[str, Optional[str], Optional[str]]], news_feed: NewsFeed) -> None:
+        """
+        Add records produced by read_records_mmap to the news feed
+        :param records: (type, first, second) tuples
+        :param news_feed: NewsFeed object to add records to
+        """
+        for record_type, first, second in records:
+            if second is None:
+                parse_failures.labels("txt").inc()
+                print(f"Unknown record type: {record_type}. Skipping.")
+            else:
+                TxtParser.add_fields(record_type, first, second, news_feed)
+
+    @profiler.timed("txt.parse_parallel")
+    @parse_seconds.labels("txt").timed
+    def parse_txt_parallel(self, news_feed: NewsFeed, workers: int = None,
+                           chunk_size: int = PARALLEL_CHUNK_SIZE) -> bool:
+        """
+        Parse the source file with a pool of processes and add records to the news feed.
+        The file is split into line aligned byte ranges, every range is parsed into a partial news feed
+        and partial feeds are merged in file order, so records keep the order of the source file
+        :param news_feed: NewsFeed object to add records to
+        :param workers: number of worker processes, defaults to the number of CPUs
+        :param chunk_size: approximate size of one byte range
+        :return: bool: True if parsing is successful, False otherwise
+        """
+        if not os.path.exists(self.file_path):
+            print("Source file not found at the specified path or already deleted.")
+            return False
+        if compression_suffix(self.file_path):
+            # a compressed stream cannot be split into byte ranges
+            return self._parse_txt(news_feed)
+        ranges = self.split_byte_ranges(chunk_size)
+        if not ranges:
+            print("No records found in the source file.")
+            return False
+
+        from concurrent.futures import ProcessPoolExecutor
+        profiler.add("txt.parse_parallel", nbytes=ranges[-1][1])
+        starts, ends = zip(*ranges)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for partial_feed in executor.map(parse_txt_range, repeat(self.file_path), starts, ends):
+                records_before = len(news_feed.records)
+                news_feed.merge(partial_feed)
+                records_parsed.labels("txt").inc(len(news_feed.records) - records_before)
 
         self.delete_file()
         return True
 
 
+def parse_txt_range(file_path: str, start: int, end: int) -> NewsFeed:
+    """
+    Parse the lines of a txt source file which lie in the byte range [start, end)
+    :param file_path: path to the source file
+    :param start: offset of the first byte of the range
+    :param end: offset after the last byte of the range
+    :return: NewsFeed: partial news feed with records and statistics of the range
+    """
+    news_feed = NewsFeed()
+    TxtParser.add_mmap_records(TxtParser(file_path).read_records_mmap(start, end), news_feed)
+    return news_feed
+
+
 class JsonParser:
     def __init__(self, folder_path: str = None):
         if folder_path:
@@ -351,25 +794,30 @@ class JsonParser:
             script_dir = os.path.dirname(os.path.abspath(__file__))
             self.folder_path = os.path.join(script_dir, "json_files")
 
+    @profiler.timed("json.read_records", count_result=True)
     def read_records(self) -> list:
         """
         Reads records from JSON files in the specified folder.
         Returns a list of records.
         """
+        import json
         records = []
         try:
             if os.path.exists(self.folder_path):
-                files = [f for f in os.listdir(self.folder_path) if f.endswith('.json')]
+                files = [f for f in os.listdir(self.folder_path) if source_extension(f) == '.json']
                 if not files:
                     print("No JSON files found in the specified folder.")
                     return records
                 else:
                     for file_name in files:
-                        with open(os.path.join(self.folder_path, file_name), "r") as file:
+                        file_path = os.path.join(self.folder_path, file_name)
+                        profiler.add("json.read_records", nbytes=os.path.getsize(file_path))
+                        with open_file(file_path, "r") as file:
                             data = json.load(file)
                             if isinstance(data, list):
                                 records.extend(data)
                             else:
+                                parse_failures.labels("json").inc()
                                 print("Invalid JSON format in file:", file_name)
                 return records
             else:
@@ -379,23 +827,27 @@ class JsonParser:
             print("Folder not found at the specified path.")
             return records
         except IOError:
+            parse_failures.labels("json").inc()
             print("An error occurred while reading the JSON files.")
             return records
         except Exception as e:
+            parse_failures.labels("json").inc()
             print(f"An unexpected error occurred: {e}")
             return records
 
-    def write_records(self, records: list) -> bool:
+    def write_records(self, records: list, compression: str = "", compresslevel: int = None) -> bool:
         """
         Writes records to JSON files in the specified folder.
+        Files are compressed if compression is a suffix like ".gz".
         Returns True if writing is successful, False otherwise.
         """
+        import json
         try:
             if not os.path.exists(self.folder_path):
                 os.makedirs(self.folder_path)
             for i, record in enumerate(records):
-                file_path = os.path.join(self.folder_path, f"record_{i}.json")
-                with open(file_path, "w") as file:
+                file_path = os.path.join(self.folder_path, f"record_{i}.json{compression}")
+                with open_file(file_path, "w", compresslevel) as file:
                     json.dump(record, file, indent=4)
             return True
         except IOError:
@@ -422,12 +874,15 @@ class JsonParser:
             print(f"An unexpected error occurred: {e}")
             return False
 
+    @profiler.timed("json.parse")
+    @parse_seconds.labels("json").timed
     def parse_json(self, news_feed: NewsFeed, data: list) -> bool:
         """
         Parses JSON data and adds records to the news feed.
         Returns True if parsing is successful, False otherwise.
         """
         try:
+            records_before = len(news_feed.records)
             for record in data:
                 try:
                     record_type = record.get("type", "").strip().lower()
@@ -439,9 +894,12 @@ class JsonParser:
                     elif record_type == "weather":
                         news_feed.add_record(Weather(record["city"], record["temperature"]))
                 except KeyError:
+                    parse_failures.labels("json").inc()
                     print("Record format is incorrect. Skipping this record.")
+            records_parsed.labels("json").inc(len(news_feed.records) - records_before)
             return True
         except Exception as e:
+            parse_failures.labels("json").inc()
             print(f"An unexpected error occurred: {e}")
             return False
 
@@ -454,17 +912,22 @@ class XmlParser:
             script_dir = os.path.dirname(os.path.abspath(__file__))
             self.folder_path = os.path.join(script_dir, "xml_files")
 
+    @profiler.timed("xml.read_records", count_result=True)
     def read_records(self) -> list:
+        import xml.etree.ElementTree as eT
         records = []
         try:
             if os.path.exists(self.folder_path):
-                files = [f for f in os.listdir(self.folder_path) if f.endswith('.xml')]
+                files = [f for f in os.listdir(self.folder_path) if source_extension(f) == '.xml']
                 if not files:
                     print("No XML files found in the specified folder.")
                     return records
                 else:
                     for file_name in files:
-                        tree = eT.parse(os.path.join(self.folder_path, file_name))
+                        file_path = os.path.join(self.folder_path, file_name)
+                        profiler.add("xml.read_records", nbytes=os.path.getsize(file_path))
+                        with open_file(file_path, "rb") as file:
+                            tree = eT.parse(file)
                         root = tree.getroot()
                         for record in root.findall('record'):
                             record_data = {}
@@ -479,17 +942,21 @@ class XmlParser:
             print("Folder not found at the specified path.")
             return records
         except IOError:
+            parse_failures.labels("xml").inc()
             print("An error occurred while reading the XML files.")
             return records
         except Exception as e:
+            parse_failures.labels("xml").inc()
             print(f"An unexpected error occurred: {e}")
             return records
 
-    def write_records(self, records: list) -> bool:
+    def write_records(self, records: list, compression: str = "", compresslevel: int = None) -> bool:
         """
         Writes records to XML files in the specified folder.
+        Files are compressed if compression is a suffix like ".gz".
         Returns True if writing is successful, False otherwise.
         """
+        import xml.etree.ElementTree as eT
         try:
             if not os.path.exists(self.folder_path):
                 os.makedirs(self.folder_path)
@@ -500,8 +967,9 @@ class XmlParser:
                     child = eT.SubElement(record_element, key)
                     child.text = str(value)
                 tree = eT.ElementTree(root)
-                file_path = os.path.join(self.folder_path, f"record_{i}.xml")
-                tree.write(file_path)
+                file_path = os.path.join(self.folder_path, f"record_{i}.xml{compression}")
+                with open_file(file_path, "wb", compresslevel) as file:
+                    tree.write(file)
             return True
         except IOError:
             print("An error occurred while writing the XML files.")
@@ -527,12 +995,15 @@ class XmlParser:
             print(f"An unexpected error occurred: {e}")
             return False
 
+    @profiler.timed("xml.parse")
+    @parse_seconds.labels("xml").timed
     def parse_xml(self, news_feed: NewsFeed, data: list) -> bool:
         """
         Parses XML data and adds records to the news feed.
         Returns True if parsing is successful, False otherwise.
         """
         try:
+            records_before = len(news_feed.records)
             for record_data in data:
                 record_type = record_data.get("type", "").strip().lower()
                 if record_type == "news":
@@ -542,8 +1013,10 @@ class XmlParser:
                     news_feed.add_record(PrivateAd(record_data["text"], expiration_date))
                 elif record_type == "weather":
                     news_feed.add_record(Weather(record_data["city"], int(record_data["temperature"])))
+            records_parsed.labels("xml").inc(len(news_feed.records) - records_before)
             return True
         except Exception as e:
+            parse_failures.labels("xml").inc()
             print(f"An unexpected error occurred: {e}")
             return False
 
@@ -552,102 +1025,145 @@ def main():
     default_file_path = os.path.join(os.getcwd(), "news_file.txt")
     default_folder_path = os.path.join(os.getcwd(), "json_files")
     default_folder_path_xml = os.path.join(os.getcwd(), "xml_files")
-    news_feed = NewsFeed()
+    # TASK9_APPROXIMATE_WORDS=1 counts words with sketches instead of an exact Counter
+    approximate = os.environ.get("TASK9_APPROXIMATE_WORDS", "") not in ("", "0")
+    # TASK9_DEDUP_FILE keeps the fingerprints of the ingested records in that file between runs;
+    # news and weather records are keyed by the day they are ingested, so only re-deliveries on the same day
+    # are skipped, private ads are keyed by their expiration date and skipped on any day
+    dedup_file = os.environ.get("TASK9_DEDUP_FILE")
+    dedup = None
+    if dedup_file:
+        from task9_dedup import RecordDeduplicator
+        dedup = RecordDeduplicator(dedup_file)
+    if approximate:
+        from task9_sketch import ApproximateWordCounts
+        news_feed = NewsFeed(ApproximateWordCounts(), dedup)
+    else:
+        news_feed = NewsFeed(dedup=dedup)
+
+    # TASK9_PARTITIONS=day or hour writes the feed to time-partitioned segments in the NewsFeed folder,
+    # otherwise NewsFeed.txt stays open for the whole session and written records are flushed once a second
+    partitions = os.environ.get("TASK9_PARTITIONS")
+    if partitions:
+        from task9_partitions import PartitionedFeedStore
+        feed_writer = PartitionedFeedStore("NewsFeed", partitions)
+    else:
+        feed_writer = FeedWriter("NewsFeed.txt", flush_interval=1000)
+    metrics_file = os.environ.get("TASK9_METRICS_FILE")
+    exporter = TextfileExporter(registry, metrics_file).start() if metrics_file else None
 
-    while True:
-        try:
-            choice = int(input("How do you want to add records? "
-                               "(1 - file (txt), "
-                               "2 - file (json), "
-                               "3 - file (xml), "
-                               "4 - manual, "
-                               "5 - quit): "))
-
-            if choice == 1:
-                file_choice = input("Enter path to source file or type 'skip' to process default source file: ")
-                if file_choice.lower() == "skip":
-                    file_path = default_file_path
-                else:
-                    # check if the provided file path is valid
-                    if os.path.exists(file_choice):
-                        file_path = file_choice
-                    else:
-                        print("Invalid file path. Using default file path instead.")
+    try:
+        while True:
+            try:
+                choice = int(input("How do you want to add records? "
+                                   "(1 - file (txt), "
+                                   "2 - file (json), "
+                                   "3 - file (xml), "
+                                   "4 - manual, "
+                                   "5 - quit): "))
+
+                if choice == 1:
+                    file_choice = input("Enter path to source file or type 'skip' to process default source file: ")
+                    if file_choice.lower() == "skip":
                         file_path = default_file_path
-
-                txt_parser = TxtParser(file_path)
-                success = txt_parser.parse_txt(news_feed)
-                if success:
-                    news_feed.save_to_file()
-                    print("Records added from file successfully.")
-                else:
-                    print("No records added from file")
-            elif choice == 2:
-                folder_choice = input("Enter folder path containing JSON files or type 'skip' to use default folder: ")
-                if folder_choice.lower() == "skip":
-                    folder_path = default_folder_path
-                else:
-                    # check if the provided folder path is valid
-                    if os.path.exists(folder_choice):
-                        folder_path = folder_choice
                     else:
-                        print("Invalid folder path. Using default folder path instead.")
-                        folder_path = default_folder_path
-
-                json_parser = JsonParser(folder_path)
-                data = json_parser.read_records()
-                if data:
-                    success = json_parser.parse_json(news_feed, data)
+                        # check if the provided file path is valid
+                        if os.path.exists(file_choice):
+                            file_path = file_choice
+                        else:
+                            print("Invalid file path. Using default file path instead.")
+                            file_path = default_file_path
+
+                    txt_parser = TxtParser(file_path)
+                    if os.path.exists(file_path) and os.path.getsize(file_path) > PARALLEL_PARSE_THRESHOLD:
+                        success = txt_parser.parse_txt_parallel(news_feed)
+                    else:
+                        success = txt_parser.parse_txt_mmap(news_feed)
                     if success:
-                        news_feed.save_to_file()
-                        print("Records added from JSON files successfully.")
-                        for file_name in os.listdir(folder_path):
-                            if file_name.endswith('.json'):
-                                json_parser.delete_file(file_name)
+                        news_feed.save_to_file(writer=feed_writer)
+                        print("Records added from file successfully.")
                     else:
-                        print("No records added from JSON files.")
-            elif choice == 3:  # New option for XML files
-                folder_choice = input("Enter folder path containing XML files or type 'skip' to use default folder: ")
-                if folder_choice.lower() == "skip":
-                    folder_path = default_folder_path_xml
-                else:
-                    # check if the provided folder path is valid
-                    if os.path.exists(folder_choice):
-                        folder_path = folder_choice
+                        print("No records added from file")
+                elif choice == 2:
+                    folder_choice = input(
+                        "Enter folder path containing JSON files or type 'skip' to use default folder: ")
+                    if folder_choice.lower() == "skip":
+                        folder_path = default_folder_path
                     else:
-                        print("Invalid folder path. Using default folder path instead.")
+                        # check if the provided folder path is valid
+                        if os.path.exists(folder_choice):
+                            folder_path = folder_choice
+                        else:
+                            print("Invalid folder path. Using default folder path instead.")
+                            folder_path = default_folder_path
+
+                    json_parser = JsonParser(folder_path)
+                    data = json_parser.read_records()
+                    if data:
+                        success = json_parser.parse_json(news_feed, data)
+                        if success:
+                            news_feed.save_to_file(writer=feed_writer)
+                            print("Records added from JSON files successfully.")
+                            for file_name in os.listdir(folder_path):
+                                if source_extension(file_name) == '.json':
+                                    json_parser.delete_file(file_name)
+                        else:
+                            print("No records added from JSON files.")
+                elif choice == 3:  # New option for XML files
+                    folder_choice = input(
+                        "Enter folder path containing XML files or type 'skip' to use default folder: ")
+                    if folder_choice.lower() == "skip":
                         folder_path = default_folder_path_xml
-
-                xml_parser = XmlParser(folder_path)
-                data = xml_parser.read_records()
-                if data:
-                    success = xml_parser.parse_xml(news_feed, data)
-                    if success:
-                        news_feed.save_to_file()
-                        print("Records added from XML files successfully.")
-                        for file_name in os.listdir(folder_path):
-                            if file_name.endswith('.xml'):
-                                xml_parser.delete_file(file_name)
                     else:
-                        print("No records added from XML files.")
-            elif choice == 4:
-                record = get_user_input()
-                if record:
-                    news_feed.add_record(record)
-                    news_feed.save_to_file()
-                    print("Record added successfully.")
-            elif choice == 5:
-                break
-            else:
-                print("Invalid choice. Please try again.")
+                        # check if the provided folder path is valid
+                        if os.path.exists(folder_choice):
+                            folder_path = folder_choice
+                        else:
+                            print("Invalid folder path. Using default folder path instead.")
+                            folder_path = default_folder_path_xml
+
+                    xml_parser = XmlParser(folder_path)
+                    data = xml_parser.read_records()
+                    if data:
+                        success = xml_parser.parse_xml(news_feed, data)
+                        if success:
+                            news_feed.save_to_file(writer=feed_writer)
+                            print("Records added from XML files successfully.")
+                            for file_name in os.listdir(folder_path):
+                                if source_extension(file_name) == '.xml':
+                                    xml_parser.delete_file(file_name)
+                        else:
+                            print("No records added from XML files.")
+                elif choice == 4:
+                    record = get_user_input()
+                    if record:
+                        if news_feed.add_record(record):
+                            news_feed.save_to_file(writer=feed_writer)
+                            print("Record added successfully.")
+                        else:
+                            print("Record skipped: it was added before.")
+                elif choice == 5:
+                    break
+                else:
+                    print("Invalid choice. Please try again.")
 
-            news_feed.save_cnt_words("word_counts.csv")
-            news_feed.save_cnt_letters("letter_counts.csv")
+                news_feed.save_cnt_words("word_counts.csv")
+                news_feed.save_cnt_letters("letter_counts.csv")
 
-        except ValueError:
-            print("Invalid input. Please enter a number.")
-        except Exception as e:
-            print(f"An unexpected error occurred: {e}")
+            except ValueError:
+                print("Invalid input. Please enter a number.")
+            except Exception as e:
+                print(f"An unexpected error occurred: {e}")
+
+    finally:
+        feed_writer.close()
+        if dedup is not None:
+            dedup.save()
+        if exporter is not None:
+            exporter.stop()
+        if profiler.enabled:
+            print(profiler.summary())
+            profiler.save_report("profile_report.json")
 
 
 if __name__ == '__main__':
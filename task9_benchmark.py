@@ -0,0 +1,654 @@
+"""
+Benchmarks for the news feed ingestion in task9.py.
+Synthetic txt, JSON and XML sources are generated in a temporary folder, so the sample files in the branch
+are not touched. Results of the suite are saved to the results folder and compared with the previous run
+of the same size, so regressions are visible.
+
+Run: python task9_benchmark.py --records 100000 --mix news=5,ad=3,weather=2
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import xml.etree.ElementTree as eT
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from task9 import JsonParser, News, NewsFeed, PrivateAd, Record, TxtParser, Weather, XmlParser
+from task9_concurrent import ConcurrentNewsFeed
+from task9_io import COMPRESSORS, FeedWriter, open_file
+
+WORDS = ["turtle", "ran", "away", "through", "the", "window", "something", "happened", "in", "city",
+         "selling", "some", "interesting", "staff", "it", "iz", "is", "sunny", "today", "news"]
+CITIES = ["klaipeda", "palanga", "vilnius", "kaunas", "riga", "tallinn"]
+DEFAULT_MIX = {"news": 0.5, "private ad": 0.3, "weather": 0.2}
+MIX_ALIASES = {"news": "news", "ad": "private ad", "private ad": "private ad", "weather": "weather"}
+TXT_TYPE_NAMES = {"news": "News", "private ad": "Private Ad", "weather": "Weather"}
+# modules task9 imports only on the code paths using them, a plain import of task9 must not load them
+LAZY_MODULES = ["csv", "json", "xml.etree.ElementTree", "concurrent.futures", "gzip", "bz2", "lzma", "hashlib",
+                "task9_dedup", "task9_partitions", "task9_sketch"]
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """
+    Parse a record type mix like "news=5,ad=3,weather=2", weights are normalised to fractions
+    :param value: comma separated type=weight pairs
+    :return: Dict[str, float]: fraction of every record type
+    """
+    weights = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        record_type = MIX_ALIASES.get(name.strip().lower())
+        if record_type is None:
+            raise argparse.ArgumentTypeError(f"Unknown record type in mix: {name}")
+        weights[record_type] = float(weight or 1)
+    total = sum(weights.values())
+    if total <= 0:
+        raise argparse.ArgumentTypeError("Record type mix must have a positive weight.")
+    return {record_type: weight / total for record_type, weight in weights.items()}
+
+
+def generate_records(records: int, mix: Dict[str, float] = None, seed: int = 0) -> Iterator[dict]:
+    """
+    Generate records as dictionaries with the fields used by the JSON and XML sources
+    :param records: number of records to generate
+    :param mix: fraction of every record type, DEFAULT_MIX if None
+    :param seed: seed of the random generator
+    :return: Iterator[dict]: generated records
+    """
+    rnd = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    types = rnd.choices(list(mix), weights=list(mix.values()), k=records)
+    for record_type in types:
+        if record_type == "news":
+            yield {"type": "news", "text": " ".join(rnd.choices(WORDS, k=rnd.randint(3, 12))),
+                   "city": rnd.choice(CITIES)}
+        elif record_type == "private ad":
+            yield {"type": "private ad", "text": " ".join(rnd.choices(WORDS, k=rnd.randint(3, 12))),
+                   "expiration_date": f"{rnd.randint(1, 28):02d}/{rnd.randint(1, 12):02d}/2030"}
+        else:
+            yield {"type": "weather", "city": rnd.choice(CITIES), "temperature": rnd.randint(-20, 35)}
+
+
+def generate_txt_feed(file_path: str, records: int, seed: int = 0, mix: Dict[str, float] = None) -> int:
+    """
+    Generate a txt source file with a mix of news, private ad and weather records
+    :param file_path: path of the file to create
+    :param records: number of records to generate
+    :param seed: seed of the random generator
+    :param mix: fraction of every record type, DEFAULT_MIX if None
+    :return: int: size of the generated file in bytes
+    """
+    with open(file_path, "w") as file:
+        for record in generate_records(records, mix, seed):
+            if record["type"] == "news":
+                file.write(f"News|{record['text']}|{record['city']}\n")
+            elif record["type"] == "private ad":
+                file.write(f"Private Ad|{record['text']}|{record['expiration_date']}\n")
+            else:
+                file.write(f"Weather|{record['city']}|{record['temperature']}\n")
+    return os.path.getsize(file_path)
+
+
+def _split(records: List[dict], files: int) -> Iterator[List[dict]]:
+    size = -(-len(records) // files) or 1
+    for position in range(0, len(records), size):
+        yield records[position:position + size]
+
+
+def generate_json_feed(folder_path: str, records: int, files: int = 1, seed: int = 0,
+                       mix: Dict[str, float] = None) -> int:
+    """
+    Generate JSON source files, every file holds a list of records like the sample news_file.json
+    :param folder_path: folder for the files, created if missing
+    :param records: number of records to generate
+    :param files: number of files the records are split into
+    :param seed: seed of the random generator
+    :param mix: fraction of every record type, DEFAULT_MIX if None
+    :return: int: size of the generated files in bytes
+    """
+    os.makedirs(folder_path, exist_ok=True)
+    size = 0
+    for i, part in enumerate(_split(list(generate_records(records, mix, seed)), files)):
+        file_path = os.path.join(folder_path, f"news_file_{i}.json")
+        with open(file_path, "w") as file:
+            json.dump(part, file, indent=2)
+        size += os.path.getsize(file_path)
+    return size
+
+
+def generate_xml_feed(folder_path: str, records: int, files: int = 1, seed: int = 0,
+                      mix: Dict[str, float] = None) -> int:
+    """
+    Generate XML source files with <records><record>...</record></records> like the sample news_file.xml
+    :param folder_path: folder for the files, created if missing
+    :param records: number of records to generate
+    :param files: number of files the records are split into
+    :param seed: seed of the random generator
+    :param mix: fraction of every record type, DEFAULT_MIX if None
+    :return: int: size of the generated files in bytes
+    """
+    os.makedirs(folder_path, exist_ok=True)
+    size = 0
+    for i, part in enumerate(_split(list(generate_records(records, mix, seed)), files)):
+        root = eT.Element("records")
+        for record in part:
+            record_element = eT.SubElement(root, "record")
+            for key, value in record.items():
+                eT.SubElement(record_element, key).text = str(value)
+        file_path = os.path.join(folder_path, f"news_file_{i}.xml")
+        eT.ElementTree(root).write(file_path)
+        size += os.path.getsize(file_path)
+    return size
+
+
+def measure(func: Callable, setup: Callable = None, repeat: int = 3) -> float:
+    """
+    Time a function, setup runs before every run and is not timed
+    :param func: function to time, gets the result of setup if it is given
+    :param setup: function preparing the input of one run
+    :param repeat: number of runs
+    :return: float: the best time in seconds
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        args = (setup(),) if setup else ()
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_suite(folder: str, records: int, mix: Dict[str, float], seed: int, repeat: int) -> Dict[str, dict]:
+    """
+    Run end to end and per stage benchmarks on generated sources
+    :param folder: temporary folder for the sources and outputs
+    :param records: number of records in every source
+    :param mix: fraction of every record type
+    :param seed: seed of the generators
+    :param repeat: number of runs of every benchmark, the best one is reported
+    :return: Dict[str, dict]: seconds and records per second of every benchmark
+    """
+    txt_path = os.path.join(folder, "news_file.txt")
+    json_folder = os.path.join(folder, "json_files")
+    xml_folder = os.path.join(folder, "xml_files")
+    generate_txt_feed(txt_path, records, seed, mix)
+    generate_json_feed(json_folder, records, seed=seed, mix=mix)
+    generate_xml_feed(xml_folder, records, seed=seed, mix=mix)
+    work_path = txt_path + ".run"
+    output_path = os.path.join(folder, "NewsFeed.txt")
+
+    def txt_parser() -> TxtParser:
+        shutil.copyfile(txt_path, work_path)
+        return TxtParser(work_path)
+
+    json_parser, xml_parser = JsonParser(json_folder), XmlParser(xml_folder)
+    json_data, xml_data = json_parser.read_records(), xml_parser.read_records()
+    news_feed = NewsFeed()
+    json_parser.parse_json(news_feed, json_data)
+    built_records = list(news_feed.records)
+
+    def add_records() -> None:
+        feed = NewsFeed()
+        for record in built_records:
+            feed.add_record(record)
+
+    def fresh_output() -> None:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+
+    def cold_renderings() -> None:
+        # records render once and keep the texts, a cold run renders every record again like a fresh parse
+        for record in news_feed.records:
+            record.__dict__.pop("_renderings", None)
+
+    def warm_renderings() -> None:
+        news_feed.publish_feed()
+
+    def end_to_end(parser: TxtParser) -> None:
+        feed = NewsFeed()
+        parser.parse_txt_mmap(feed)
+        feed.save_to_file(output_path)
+        feed.save_cnt_words(os.path.join(folder, "word_counts.csv"))
+        feed.save_cnt_letters(os.path.join(folder, "letter_counts.csv"))
+
+    benchmarks = {
+        "txt.parse_txt": (lambda parser: parser.parse_txt(NewsFeed()), txt_parser),
+        "txt.parse_txt_mmap": (lambda parser: parser.parse_txt_mmap(NewsFeed()), txt_parser),
+        "json.read_records": (json_parser.read_records, None),
+        "json.parse_json": (lambda: json_parser.parse_json(NewsFeed(), json_data), None),
+        "xml.read_records": (xml_parser.read_records, None),
+        "xml.parse_xml": (lambda: xml_parser.parse_xml(NewsFeed(), xml_data), None),
+        "feed.add_record": (add_records, None),
+        "feed.publish_feed.cold": (lambda _: news_feed.publish_feed(), cold_renderings),
+        "feed.publish_feed.warm": (lambda _: news_feed.publish_feed(), warm_renderings),
+        "feed.save_to_file.cold": (lambda _: news_feed.save_to_file(output_path),
+                                   lambda: (fresh_output(), cold_renderings())),
+        "feed.save_to_file.warm": (lambda _: news_feed.save_to_file(output_path),
+                                   lambda: (fresh_output(), warm_renderings())),
+        "feed.save_cnt_words": (lambda: news_feed.save_cnt_words(os.path.join(folder, "word_counts.csv")), None),
+        "feed.save_cnt_letters": (lambda: news_feed.save_cnt_letters(os.path.join(folder, "letter_counts.csv")),
+                                  None),
+        "end_to_end.txt": (end_to_end, lambda: (fresh_output(), txt_parser())[1]),
+    }
+    results = {}
+    for name, (func, setup) in benchmarks.items():
+        seconds = measure(func, setup, repeat)
+        results[name] = {"seconds": seconds, "records_per_second": records / seconds if seconds else 0.0}
+        print(f"{name:<28}{seconds:>9.3f}s{results[name]['records_per_second']:>14.0f} records/s")
+    # startup latency of short runs, guarded by the comparison with the baseline like the other results
+    seconds, eager = bench_import_time("task9", max(repeat, 5))
+    results["startup.import_task9"] = {"seconds": seconds, "records_per_second": 0.0, "eager_modules": eager}
+    return results
+
+
+def import_times(statement: str = "import task9") -> Dict[str, int]:
+    """
+    Run a statement in a fresh interpreter with -X importtime
+    :return: Dict[str, int]: cumulative import time in microseconds of every loaded module
+    """
+    # startup of a deployed script uses the bytecode cache, the first run writes it
+    env = {name: value for name, value in os.environ.items() if name != "PYTHONDONTWRITEBYTECODE"}
+    # run next to the task9 modules, wherever the benchmark is started from
+    folder = os.path.dirname(os.path.abspath(__file__))
+    subprocess.run([sys.executable, "-c", statement], check=True, env=env, cwd=folder)
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], check=True, env=env, cwd=folder,
+                            capture_output=True, text=True).stderr
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def bench_import_time(module: str = "task9", repeat: int = 5) -> Tuple[float, List[str]]:
+    """
+    Measure the startup cost of importing a module and check that the lazily imported modules are not loaded
+    :return: Tuple[float, List[str]]: best import time in seconds and the modules of LAZY_MODULES loaded by the import,
+        every one of them counts as a regression
+    """
+    interpreter = import_times("pass")
+    best, slowest = None, {}
+    for _ in range(repeat):
+        times = import_times(f"import {module}")
+        if best is None or times[module] < best:
+            best, slowest = times[module], times
+    # modules loaded by the interpreter itself are not part of the startup cost of the module
+    slowest = {name: cumulative for name, cumulative in slowest.items() if name not in interpreter}
+    eager = [name for name in LAZY_MODULES if name in slowest]
+    print(f"{'import ' + module:<28}{best / 1e6:>9.3f}s{len(slowest):>10} modules")
+    for name, cumulative in sorted(slowest.items(), key=lambda item: item[1], reverse=True)[1:6]:
+        print(f"    {name:<24}{cumulative / 1e3:>9.1f} ms")
+    if eager:
+        print(f"    eagerly imported: {', '.join(eager)}  REGRESSION")
+    return best / 1e6, eager
+
+
+def save_results(results_dir: str, results: Dict[str, dict], parameters: dict) -> str:
+    """
+    Save suite results with the parameters of the run
+    :param results_dir: folder for result files, created if missing
+    :param results: results of run_suite
+    :param parameters: records, mix and seed of the run, only runs with the same parameters are compared
+    :return: str: path of the result file
+    """
+    os.makedirs(results_dir, exist_ok=True)
+    created = datetime.now()
+    file_path = os.path.join(results_dir, f"benchmark_{created.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(file_path, "w") as file:
+        json.dump({
+            "created": created.isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "parameters": parameters,
+            "results": results,
+        }, file, indent=4)
+    return file_path
+
+
+def find_baseline(results_dir: str, parameters: dict) -> Optional[str]:
+    """
+    Find the latest result file of a run with the same parameters
+    """
+    if not os.path.isdir(results_dir):
+        return None
+    for file_name in sorted(os.listdir(results_dir), reverse=True):
+        if not file_name.endswith(".json"):
+            continue
+        file_path = os.path.join(results_dir, file_name)
+        with open(file_path) as file:
+            if json.load(file).get("parameters") == parameters:
+                return file_path
+    return None
+
+
+def compare_results(results: Dict[str, dict], baseline_path: str, threshold: float) -> int:
+    """
+    Print the change of every benchmark against the baseline run
+    :param results: results of the current run
+    :param baseline_path: result file of an earlier run
+    :param threshold: slowdown, as a fraction, reported as a regression
+    :return: int: number of regressions
+    """
+    with open(baseline_path) as file:
+        baseline = json.load(file)["results"]
+    print(f"\nCompared with {baseline_path}:")
+    regressions = 0
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        change = result["seconds"] / baseline[name]["seconds"] - 1 if baseline[name]["seconds"] else 0.0
+        regression = change > threshold
+        regressions += regression
+        print(f"{name:<28}{baseline[name]['seconds']:>9.3f}s ->{result['seconds']:>9.3f}s{change:>+9.1%}"
+              f"{'  REGRESSION' if regression else ''}")
+    return regressions
+
+
+def bench_parallel_txt(source_path: str, worker_counts: List[int], chunk_size: int) -> None:
+    """
+    Compare TxtParser.parse_txt with TxtParser.parse_txt_parallel for different numbers of workers
+    :param source_path: generated source file, it is copied before every run because parsing deletes it
+    :param worker_counts: numbers of worker processes to measure
+    :param chunk_size: size of the byte ranges handed to the workers
+    """
+    size_mb = os.path.getsize(source_path) / 1024 / 1024
+    work_path = source_path + ".run"
+
+    shutil.copyfile(source_path, work_path)
+    start = time.perf_counter()
+    TxtParser(work_path).parse_txt(NewsFeed())
+    baseline = time.perf_counter() - start
+    print(f"{'parse_txt':<28}{baseline:>9.2f}s{size_mb / baseline:>10.1f} MB/s")
+
+    for workers in worker_counts:
+        shutil.copyfile(source_path, work_path)
+        start = time.perf_counter()
+        TxtParser(work_path).parse_txt_parallel(NewsFeed(), workers=workers, chunk_size=chunk_size)
+        elapsed = time.perf_counter() - start
+        print(f"{f'parse_txt_parallel({workers})':<28}{elapsed:>9.2f}s{size_mb / elapsed:>10.1f} MB/s"
+              f"{baseline / elapsed:>8.2f}x")
+
+
+def drop_file_cache(file_path: str) -> bool:
+    """
+    Evict the file from the page cache, so the next read comes from the disk
+    :param file_path: file to evict
+    :return: bool: False if the platform cannot drop the cache of a single file
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return False
+    with open(file_path, "rb") as file:
+        os.fsync(file.fileno())
+        os.posix_fadvise(file.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+    return True
+
+
+def bench_read_paths(source_path: str, repeat: int = 3) -> None:
+    """
+    Compare the readlines and mmap read paths of TxtParser with a cold and a warm page cache.
+    Both paths split every line into fields, records are not created
+    :param source_path: generated source file
+    :param repeat: number of runs, the best one is reported
+    """
+    size_mb = os.path.getsize(source_path) / 1024 / 1024
+    parser = TxtParser(source_path)
+    readers = {
+        "readlines": lambda: [record.strip().split("|") for record in parser.read_records()],
+        "mmap": lambda: list(parser.read_records_mmap()),
+    }
+    for cache in ("cold", "warm"):
+        for name, reader in readers.items():
+            timings = []
+            for _ in range(repeat):
+                if cache == "warm":
+                    reader()
+                elif not drop_file_cache(source_path):
+                    break
+                start = time.perf_counter()
+                reader()
+                timings.append(time.perf_counter() - start)
+            if timings:
+                best = min(timings)
+                print(f"{f'{name} ({cache} cache)':<28}{best:>9.2f}s{size_mb / best:>10.1f} MB/s")
+
+
+def bench_compression(source_path: str, levels: List[int]) -> None:
+    """
+    Measure write and read throughput and compression ratio of NewsFeed.save_to_file for every compressor
+    :param source_path: generated source file, parsed once to get the news feed
+    :param levels: compression levels to measure
+    """
+    work_path = source_path + ".run"
+    shutil.copyfile(source_path, work_path)
+    news_feed = NewsFeed()
+    TxtParser(work_path).parse_txt_mmap(news_feed)
+
+    folder = os.path.dirname(source_path)
+    plain_size = 0
+    for suffix in [""] + list(COMPRESSORS):
+        for level in (levels if suffix else [None]):
+            output_path = os.path.join(folder, "NewsFeed.txt" + suffix)
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            start = time.perf_counter()
+            news_feed.save_to_file(output_path, level)
+            write_time = time.perf_counter() - start
+            start = time.perf_counter()
+            with open_file(output_path) as file:
+                for _ in file:
+                    pass
+            read_time = time.perf_counter() - start
+
+            size = os.path.getsize(output_path)
+            plain_size = plain_size or size
+            size_mb = plain_size / 1024 / 1024
+            name = f"{suffix or 'plain'} {level if level is not None else ''}"
+            print(f"{name:<28}ratio{plain_size / size:>7.2f}  write{size_mb / write_time:>8.1f} MB/s"
+                  f"  read{size_mb / read_time:>8.1f} MB/s")
+
+
+def bench_writer(source_path: str, batch: int = 10) -> None:
+    """
+    Compare saving small batches of records with save_to_file, which opens the file for every batch,
+    and with a long lived FeedWriter for different flush policies
+    :param source_path: generated source file, parsed once to get the records
+    :param batch: number of records saved at once, like records added by one ingestion
+    """
+    work_path = source_path + ".run"
+    shutil.copyfile(source_path, work_path)
+    records = NewsFeed()
+    TxtParser(work_path).parse_txt_mmap(records)
+    batches = []
+    for position in range(0, len(records.records), batch):
+        news_feed = NewsFeed()
+        news_feed.records = records.records[position:position + batch]
+        batches.append(news_feed)
+
+    output_path = os.path.join(os.path.dirname(source_path), "NewsFeed.txt")
+    policies = {
+        "every record": dict(flush_every=1),
+        "every 1000 records": dict(flush_every=1000),
+        "every 100 ms": dict(flush_interval=100),
+        "on close": dict(),
+        "every 1000 + fsync": dict(flush_every=1000, fsync=True),
+    }
+    start = time.perf_counter()
+    for news_feed in batches:
+        news_feed.save_to_file(output_path)
+    elapsed = time.perf_counter() - start
+    print(f"{'save_to_file per batch':<32}{elapsed:>9.2f}s{len(records.records) / elapsed:>12.0f} records/s")
+    for name, policy in policies.items():
+        os.remove(output_path)
+        start = time.perf_counter()
+        with FeedWriter(output_path, **policy) as writer:
+            for news_feed in batches:
+                news_feed.save_to_file(writer=writer)
+        elapsed = time.perf_counter() - start
+        print(f"{f'FeedWriter {name}':<32}{elapsed:>9.2f}s{len(records.records) / elapsed:>12.0f} records/s")
+
+
+def build_records(records: int, seed: int = 0, mix: Dict[str, float] = None) -> List[Record]:
+    """
+    Create record objects from generated records
+    """
+    built = []
+    for record in generate_records(records, mix, seed):
+        if record["type"] == "news":
+            built.append(News(record["text"], record["city"]))
+        elif record["type"] == "private ad":
+            built.append(PrivateAd(record["text"], datetime.strptime(record["expiration_date"], "%d/%m/%Y")))
+        else:
+            built.append(Weather(record["city"], record["temperature"]))
+    return built
+
+
+def _produce(news_feed: NewsFeed, records: List[Record], batch: int, io_latency: float) -> None:
+    """
+    Add records in batches, sleeping io_latency seconds before every batch like a parser waiting for a file
+    """
+    for position in range(0, len(records), batch):
+        if io_latency:
+            time.sleep(io_latency)
+        for record in records[position:position + batch]:
+            news_feed.add_record(record)
+
+
+def stress_concurrent_feed(threads: int = 8, records: int = 20000, seed: int = 0) -> None:
+    """
+    Fill a ConcurrentNewsFeed from several threads and check that its statistics equal the statistics
+    of a NewsFeed filled sequentially with the same records
+    :param threads: number of producer threads
+    :param records: number of records per thread
+    :param seed: seed of the generator
+    """
+    parts = [build_records(records, seed + i) for i in range(threads)]
+    expected = NewsFeed()
+    for part in parts:
+        for record in part:
+            expected.add_record(record)
+
+    news_feed = ConcurrentNewsFeed()
+    producers = [threading.Thread(target=_produce, args=(news_feed, part, 1, 0)) for part in parts]
+    for producer in producers:
+        producer.start()
+    for producer in producers:
+        producer.join()
+
+    snapshot = news_feed.snapshot()
+    # checked explicitly, python -O removes assert statements
+    checks = {
+        "records are lost": len(snapshot.records) == threads * records,
+        "records differ": sorted(map(id, snapshot.records)) == sorted(map(id, expected.records)),
+        "word counts differ": snapshot.word_counts == expected.word_counts,
+        "letter counts differ": snapshot.letter_counts == expected.letter_counts,
+        "uppercase counts differ": snapshot.total_uppercase_letters == expected.total_uppercase_letters,
+    }
+    failed = [message for message, passed in checks.items() if not passed]
+    if failed:
+        raise AssertionError(f"Stress test failed: {', '.join(failed)}")
+    print(f"Stress test passed: {threads} threads x {records} records, statistics are exact")
+
+
+def bench_concurrent_feed(thread_counts: List[int], records: int, io_latency: float, batch: int = 100) -> None:
+    """
+    Measure ConcurrentNewsFeed throughput for different numbers of producer threads.
+    With io_latency every producer waits before each batch, like parsers reading files,
+    so threads overlap the waiting even with the GIL; with io_latency 0 the work is CPU bound
+    and scales only on a free threaded Python
+    :param thread_counts: numbers of producer threads to measure
+    :param records: total number of records, split between the threads
+    :param io_latency: seconds a producer waits before every batch
+    :param batch: records per batch
+    """
+    built = build_records(records)
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print(f"ConcurrentNewsFeed, {records} records, io latency {io_latency * 1000:.1f} ms per {batch} records, "
+          f"GIL {'enabled' if gil else 'disabled'}")
+    for threads in thread_counts:
+        news_feed = ConcurrentNewsFeed()
+        parts = [built[i::threads] for i in range(threads)]
+        producers = [threading.Thread(target=_produce, args=(news_feed, part, batch, io_latency)) for part in parts]
+        start = time.perf_counter()
+        for producer in producers:
+            producer.start()
+        for producer in producers:
+            producer.join()
+        elapsed = time.perf_counter() - start
+        print(f"{f'{threads} threads':<28}{elapsed:>9.2f}s{records / elapsed:>12.0f} records/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for task9 news feed ingestion")
+    parser.add_argument("--records", type=int, default=100000, help="number of generated records")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="record type mix, e.g. news=5,ad=3,weather=2")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the generators")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of every suite benchmark")
+    parser.add_argument("--benchmarks", nargs="+", default=["suite"],
+                        choices=["suite", "read", "parallel", "compression", "writer", "concurrent", "startup"],
+                        help="benchmarks to run")
+    parser.add_argument("--results-dir", default="benchmark_results", help="folder for suite results")
+    parser.add_argument("--baseline", help="result file to compare with, the latest matching run by default")
+    parser.add_argument("--threshold", type=float, default=0.1, help="slowdown reported as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with status 1 on regressions")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1],
+                        help="numbers of worker processes for the parallel parser")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8],
+                        help="numbers of producer threads for the concurrent news feed")
+    parser.add_argument("--io-latency", type=float, default=0.002,
+                        help="seconds a concurrent producer waits before every batch of 100 records")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 6, 9], help="compression levels")
+    parser.add_argument("--chunk-size", type=int, default=4 * 1024 * 1024, help="byte range size for the workers")
+    args = parser.parse_args()
+
+    regressions = 0
+    with tempfile.TemporaryDirectory() as folder:
+        if "suite" in args.benchmarks:
+            parameters = {"records": args.records, "mix": args.mix, "seed": args.seed}
+            print(f"Suite: {args.records} records, mix {args.mix}, {os.cpu_count()} CPUs")
+            results = run_suite(folder, args.records, args.mix, args.seed, args.repeat)
+            regressions += len(results["startup.import_task9"]["eager_modules"])
+            baseline = args.baseline or find_baseline(args.results_dir, parameters)
+            print(f"Results saved to {save_results(args.results_dir, results, parameters)}")
+            if baseline:
+                regressions += compare_results(results, baseline, args.threshold)
+
+        source_path = os.path.join(folder, "news_file.txt")
+        experiments = [name for name in args.benchmarks if name != "suite"]
+        if experiments:
+            size = generate_txt_feed(source_path, args.records, args.seed, args.mix)
+            print(f"Generated {args.records} records, {size / 1024 / 1024:.1f} MB, {os.cpu_count()} CPUs")
+        if "read" in experiments:
+            bench_read_paths(source_path)
+        if "parallel" in experiments:
+            bench_parallel_txt(source_path, sorted(set(args.workers)), args.chunk_size)
+        if "compression" in experiments:
+            bench_compression(source_path, args.levels)
+        if "writer" in experiments:
+            bench_writer(source_path)
+        if "startup" in experiments:
+            regressions += len(bench_import_time("task9", args.repeat)[1])
+        if "concurrent" in experiments:
+            stress_concurrent_feed()
+            bench_concurrent_feed(sorted(set(args.threads)), args.records, 0)
+            bench_concurrent_feed(sorted(set(args.threads)), args.records, args.io_latency)
+
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+News feed which can be filled from several producer threads at once.
+"""
+
+import threading
+from collections import Counter
+from typing import List
+
+from task9 import NewsFeed, Record, Weather, count_added
+from task9_metrics import duplicates_skipped, feed_records, records_added
+
+
+class _Shard(NewsFeed):
+    """
+    Statistics of one producer thread, the lock is only contended while the shards are merged
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+
+
+class ConcurrentNewsFeed(NewsFeed):
+    """
+    News feed with statistics sharded per producer thread.
+    Every thread counts words and letters in its own shard, only appending the record to the shared list
+    takes the shared lock. Statistics are exact: word_counts, letter_counts, total_uppercase_letters
+    and total_letters merge the shards when they are read
+    """
+
+    def __init__(self, dedup=None, weather_index=None, feed_index=None):
+        """
+        :param dedup: RecordDeduplicator from task9_dedup, records it has seen before are skipped by add_record
+        :param weather_index: WeatherIndex from task9_weather updated with the added weather records
+        :param feed_index: FeedIndex from task9_publish updated with the positions of the added records
+        """
+        # the statistics attributes of NewsFeed are properties here, so NewsFeed.__init__ is not called
+        self.records = []
+        self.dedup = dedup
+        self.weather_index = weather_index
+        self.feed_index = feed_index
+        self._dedup_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._shards: List[_Shard] = []
+        self._total_letters = 0
+
+    def _shard(self) -> _Shard:
+        """
+        Get the statistics shard of the current thread
+        """
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def add_record(self, record: Record) -> bool:
+        """
+        Add a record to the news feed, safe to call from several threads
+        :return: bool: False if the record is a duplicate and was skipped
+        """
+        if self.dedup is not None and self._is_duplicate(record):
+            duplicates_skipped.inc()
+            return False
+        shard = self._shard()
+        with shard.lock:
+            shard.count_words(record.text)
+            shard.count_letters(record.text)
+        if self.weather_index is not None and isinstance(record, Weather):
+            self.weather_index.add(record)
+        with self._lock:
+            self.records.append(record)
+            if self.feed_index is not None:
+                # indexed under the lock, so records of the same date keep the order of the list
+                self.feed_index.add(record, len(self.records) - 1)
+            self._total_letters = shard.total_letters
+            records_count = len(self.records)
+        records_added.labels(type(record).__name__).inc()
+        feed_records.set(records_count)
+        return True
+
+    def _is_duplicate(self, record: Record) -> bool:
+        with self._dedup_lock:
+            return self.dedup.check_and_add(record)
+
+    def merge(self, other: NewsFeed) -> None:
+        """
+        Merge records and statistics of another news feed into this one, safe to call from several threads
+        """
+        if self.dedup is not None:
+            other = self.without_duplicates(other, self._is_duplicate)
+        count_added(other.records)
+        shard = self._shard()
+        with shard.lock:
+            shard.merge(_statistics_only(other))
+        if self.weather_index is not None:
+            self.weather_index.add_records(other.records)
+        with self._lock:
+            if self.feed_index is not None:
+                self.feed_index.add_records(other.records, len(self.records))
+            self.records.extend(other.records)
+            if other.records:
+                self._total_letters = other.total_letters
+            records_count = len(self.records)
+        feed_records.set(records_count)
+
+    def count_words(self, text):
+        """
+        Count words in the text in the shard of the current thread
+        """
+        shard = self._shard()
+        with shard.lock:
+            shard.count_words(text)
+
+    def count_letters(self, text):
+        """
+        Count letters in the text in the shard of the current thread
+        """
+        shard = self._shard()
+        with shard.lock:
+            shard.count_letters(text)
+        self._total_letters = shard.total_letters
+
+    def _merged(self) -> NewsFeed:
+        with self._lock:
+            shards = list(self._shards)
+        merged = NewsFeed()
+        for shard in shards:
+            with shard.lock:
+                merged.merge(_statistics_only(shard))
+        return merged
+
+    @property
+    def word_counts(self) -> Counter:
+        return self._merged().word_counts
+
+    @property
+    def letter_counts(self) -> Counter:
+        return self._merged().letter_counts
+
+    @property
+    def total_uppercase_letters(self) -> dict:
+        return self._merged().total_uppercase_letters
+
+    @property
+    def total_letters(self) -> int:
+        return self._total_letters
+
+    def save_cnt_words(self, filename, compresslevel: int = None):
+        self.snapshot().save_cnt_words(filename, compresslevel)
+
+    def save_cnt_letters(self, filename, compresslevel: int = None):
+        # merge the shards once instead of on every lookup of an uppercase count
+        self.snapshot().save_cnt_letters(filename, compresslevel)
+
+    def snapshot(self) -> NewsFeed:
+        """
+        Get a plain news feed with a copy of the records and merged statistics,
+        useful to save several statistics files without merging the shards for each of them
+        """
+        merged = self._merged()
+        with self._lock:
+            merged.records = list(self.records)
+            merged.total_letters = self._total_letters
+        return merged
+
+
+def _statistics_only(news_feed: NewsFeed) -> NewsFeed:
+    """
+    Get a news feed with the statistics of the given one and without records
+    """
+    statistics = NewsFeed()
+    statistics.word_counts = news_feed.word_counts
+    statistics.letter_counts = news_feed.letter_counts
+    statistics.total_uppercase_letters = news_feed.total_uppercase_letters
+    statistics.total_letters = news_feed.total_letters
+    return statistics
@@ -0,0 +1,153 @@
+"""
+Whole-word corrections used by normalize_text, e.g. the misspelling "iz" -> "is".
+All rules are compiled into one regular expression whose alternatives form a trie of the words,
+so a text is corrected in a single pass and the alternatives sharing a prefix are tried once.
+The trie still gets deeper as rules are added, so large sets of plain words (WORD_LOOKUP_RULES or more)
+are applied by splitting the text into words and looking every word up in a dict instead:
+slower than the regex for a few rules, but its cost does not depend on the number of rules.
+
+A word matches when it is not part of a longer word: "iz" is corrected in "it iz", "iz." and “iz”,
+but not in "izmir". Rules must not contain whitespace, so text split after a whitespace character
+can be corrected piece by piece with the same result as the whole text.
+
+Run: python task9_corrections.py --rules 1 10 100 1000 10000
+"""
+
+import re
+from typing import Dict, Iterable, Mapping
+
+# from this many rules on, rule sets of plain \w words are applied with dict lookups instead of the trie regex
+WORD_LOOKUP_RULES = 1000
+_WORDS = re.compile(r"(\w+)")
+
+
+def trie_pattern(words: Iterable[str]) -> str:
+    """
+    Build a regular expression matching any of the words, with common prefixes factored out
+    :param words: non-empty words
+    :return: str: the pattern, longer words are preferred over their prefixes
+    """
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+    return _node_pattern(trie)
+
+
+def _node_pattern(node: dict) -> str:
+    terminal = "" in node
+    branches = []
+    chars = []
+    for char, child in sorted(node.items()):
+        if not char:
+            continue
+        if list(child) == [""]:
+            # words ending here are collected into one character class
+            chars.append(re.escape(char))
+        else:
+            branches.append(re.escape(char) + _node_pattern(child))
+    if chars:
+        branches.append(chars[0] if len(chars) == 1 else "[" + "".join(chars) + "]")
+    if not branches:
+        return ""
+    if len(branches) == 1 and not terminal:
+        return branches[0]
+    pattern = "(?:" + "|".join(branches) + ")"
+    return pattern + "?" if terminal else pattern
+
+
+class Corrections:
+    """
+    Compiled set of whole-word replacement rules
+    """
+
+    def __init__(self, rules: Mapping[str, str]):
+        """
+        :param rules: replacement of every word, matched case-sensitively
+        """
+        for word in rules:
+            if not word or any(char.isspace() for char in word):
+                raise ValueError(f"Invalid correction rule {word!r}: words must be non-empty and without whitespace.")
+        self.rules: Dict[str, str] = dict(rules)
+        # a plain word matches exactly when it is a whole run of word characters
+        self.word_lookup = len(self.rules) >= WORD_LOOKUP_RULES and \
+            all(_WORDS.fullmatch(word) for word in self.rules)
+        self.pattern = None
+        if self.rules and not self.word_lookup:
+            self.pattern = re.compile(rf"(?<!\w)(?:{trie_pattern(self.rules)})(?!\w)")
+
+    def apply(self, text: str) -> str:
+        """
+        Replace every whole-word occurrence of a rule word in one pass
+        """
+        rules = self.rules
+        if self.word_lookup:
+            parts = _WORDS.split(text)
+            parts[1::2] = [rules.get(word, word) for word in parts[1::2]]
+            return "".join(parts)
+        if self.pattern is None:
+            return text
+        return self.pattern.sub(lambda match: rules[match.group()], text)
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    @classmethod
+    def load(cls, file_path: str) -> "Corrections":
+        """
+        Load rules from a JSON object mapping words to their replacements
+        """
+        import json
+        with open(file_path, encoding="utf-8") as file:
+            rules = json.load(file)
+        if not isinstance(rules, dict):
+            raise ValueError(f"{file_path} must hold a JSON object of word replacements.")
+        return cls(rules)
+
+
+DEFAULT_CORRECTIONS = Corrections({"iz": "is"})
+
+
+def benchmark(rule_counts: Iterable[int], text_size: int = 1024 * 1024, seed: int = 0) -> None:
+    """
+    Time the correction of the same text with growing random rule sets, the "iz" rule is always included
+    """
+    # normalize_text imports this module at startup, the benchmark modules are loaded only when it runs
+    import random
+    import string
+    import time
+    rng = random.Random(seed)
+    words = ["the", "weather", "iz", "nice", "in", "paris", "today", "izmir", "news", "ad"]
+    text = ""
+    while len(text) < text_size:
+        text += " ".join(rng.choice(words) for _ in range(1000)) + ". "
+    print(f"{'rules':>8}{'engine':>10}{'compile s':>12}{'MB/s':>10}")
+    for count in rule_counts:
+        rules = {"iz": "is"}
+        while len(rules) < count:
+            word = "".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 12)))
+            rules.setdefault(word, word.upper())
+        start = time.perf_counter()
+        corrections = Corrections(rules)
+        compiled = time.perf_counter() - start
+        start = time.perf_counter()
+        corrections.apply(text)
+        elapsed = time.perf_counter() - start
+        engine = "lookup" if corrections.word_lookup else "regex"
+        print(f"{count:>8}{engine:>10}{compiled:>12.3f}{len(text) / elapsed / 1024 / 1024:>10.1f}")
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmark the whole-word correction engine")
+    parser.add_argument("--rules", type=int, nargs="+", default=[1, 10, 100, 1000, 10000],
+                        help="numbers of rules")
+    parser.add_argument("--size", type=int, default=1024 * 1024, help="characters of the corrected text")
+    args = parser.parse_args()
+    benchmark(args.rules, args.size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Duplicate detection of records with content fingerprints kept in a Bloom filter.
+
+The fingerprint of a record is a hash of its type, normalized text, city, the expiration date of
+private ads and the creation day of news and weather records; the text of a weather record holds its
+temperature. The source files carry no dates, so the creation day is the day the record is ingested:
+a news or weather record re-delivered on the same day is a duplicate, while the same reading or headline
+on a later day is not. Re-ingesting an archive of an earlier day therefore adds its news and weather
+records again; only its private ads, keyed by their expiration date, are recognised on any day.
+
+The filter saves to a file, so a source ingested in an earlier run of the same day is recognised in the next one.
+The file is loaded when the first record is checked and only written back if fingerprints were added,
+so a run that ingests nothing does not pay for it.
+A Bloom filter never misses a duplicate, a new record is taken for a duplicate with probability error_rate.
+When more than capacity fingerprints are added, a filter with twice the capacity is added (scalable Bloom
+filter), so the error rate stays bounded while the feed grows.
+
+Layout of the file (little endian):
+    header      magic, version, number of filters
+    filters     per filter: capacity, number of hashes, number of bits, number of fingerprints, bits
+"""
+
+import hashlib
+import math
+import os
+import struct
+from typing import List, Optional
+
+from task9_imp_module import normalize_text
+
+MAGIC = b"NFDEDUP\x00"
+VERSION = 1
+
+HEADER = struct.Struct("<8sII")
+FILTER = struct.Struct("<QIQQ")
+
+_MASK_64 = 0xFFFFFFFFFFFFFFFF
+
+
+class DedupError(Exception):
+    """
+    Raised when a file is not a fingerprint file or has an unsupported version
+    """
+
+
+def fingerprint(record) -> bytes:
+    """
+    Get the 16 byte content fingerprint of a record
+    """
+    fields = [type(record).__name__, " ".join(normalize_text(record.text).split()),
+              getattr(record, "city", "").lower()]
+    expiration_date = getattr(record, "expiration_date", None)
+    if expiration_date is not None:
+        fields.append(expiration_date.strftime("%Y-%m-%d"))
+    created = getattr(record, "date", None)
+    if created:
+        # dd/mm/yyyy, the time of news records is left out
+        fields.append(created[:10])
+    return hashlib.blake2b("\x1f".join(fields).encode("utf-8"), digest_size=16).digest()
+
+
+class BloomFilter:
+    """
+    Bit array with a fixed capacity, every fingerprint sets hashes bits chosen by double hashing
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        """
+        :param capacity: number of fingerprints the error rate holds for
+        :param error_rate: probability that a new fingerprint is reported as seen
+        """
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, digest: bytes):
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        size = self.size
+        for _ in range(self.hashes):
+            yield first % size
+            first = (first + second) & _MASK_64
+
+    def __contains__(self, digest: bytes) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(digest))
+
+    def add(self, digest: bytes) -> None:
+        bits = self.bits
+        for position in self._positions(digest):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+
+class RecordDeduplicator:
+    """
+    Set of the fingerprints of ingested records, pass it to NewsFeed(dedup=...) to skip duplicates in add_record
+    """
+
+    def __init__(self, file_path: str = None, capacity: int = 100_000, error_rate: float = 1e-6):
+        """
+        :param file_path: file the fingerprints are loaded from if it exists and saved to with save()
+        :param capacity: number of fingerprints of the first filter, memory is about 4 bytes per fingerprint;
+            the filters grow with the feed, so the first one fits the records of a few runs
+        :param error_rate: probability that a new record is skipped as a duplicate
+        """
+        self.file_path = file_path
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._filters: Optional[List[BloomFilter]] = None
+        self._changed = False
+
+    @property
+    def filters(self) -> List[BloomFilter]:
+        """
+        Filters of the fingerprints, loaded from file_path on first use
+        """
+        if self._filters is None:
+            if self.file_path is not None and os.path.exists(self.file_path):
+                self.load(self.file_path)
+            else:
+                self._filters = [BloomFilter(self.capacity, self.error_rate / 2)]
+        return self._filters
+
+    def __len__(self) -> int:
+        return sum(bloom_filter.count for bloom_filter in self.filters)
+
+    def __contains__(self, record) -> bool:
+        digest = fingerprint(record)
+        return any(digest in bloom_filter for bloom_filter in self.filters)
+
+    def check_and_add(self, record) -> bool:
+        """
+        Add the fingerprint of a record
+        :return: bool: True if the record was seen before and is a duplicate
+        """
+        digest = fingerprint(record)
+        filters = self.filters
+        if any(digest in bloom_filter for bloom_filter in filters):
+            return True
+        current = filters[-1]
+        if current.count >= current.capacity:
+            # the error rates of the filters form a geometric series, their sum stays below error_rate
+            current = BloomFilter(current.capacity * 2, self.error_rate / 2 ** (len(filters) + 1))
+            filters.append(current)
+        current.add(digest)
+        self._changed = True
+        return False
+
+    def save(self, file_path: str = None) -> None:
+        """
+        Save the fingerprints, the file is replaced atomically; nothing is written to file_path
+        if no fingerprint was added since it was loaded or saved
+        """
+        if not self._changed and file_path in (None, self.file_path):
+            return
+        file_path = file_path or self.file_path
+        if file_path is None:
+            raise ValueError("No file to save the fingerprints to, pass file_path.")
+        tmp_path = f"{file_path}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(HEADER.pack(MAGIC, VERSION, len(self.filters)))
+            for bloom_filter in self.filters:
+                file.write(FILTER.pack(bloom_filter.capacity, bloom_filter.hashes, bloom_filter.size,
+                                       bloom_filter.count))
+                file.write(bloom_filter.bits)
+        os.replace(tmp_path, file_path)
+        if file_path == self.file_path:
+            self._changed = False
+
+    def load(self, file_path: str) -> None:
+        with open(file_path, "rb") as file:
+            magic, version, filters = HEADER.unpack(file.read(HEADER.size))
+            if magic != MAGIC:
+                raise DedupError(f"{file_path} is not a fingerprint file.")
+            if version != VERSION:
+                raise DedupError(f"Unsupported fingerprint file version {version}.")
+            self._filters = []
+            for _ in range(filters):
+                capacity, hashes, size, count = FILTER.unpack(file.read(FILTER.size))
+                bloom_filter = BloomFilter.__new__(BloomFilter)
+                bloom_filter.capacity, bloom_filter.hashes, bloom_filter.size = capacity, hashes, size
+                bloom_filter.count = count
+                bloom_filter.bits = bytearray(file.read((size + 7) // 8))
+                self._filters.append(bloom_filter)
@@ -1,7 +1,114 @@
 
 import re
+from functools import lru_cache
 from typing import List
 
+from task9_corrections import DEFAULT_CORRECTIONS, Corrections
+
+# a sentence ends after . ? ! : or a newline, the whitespace following it separates it from the next one
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.?!:\n])\s*')
+# texts up to this length share their tokens through the cache, longer ones are tokenized on every call
+TOKEN_CACHE_TEXT_LIMIT = 4096
+
+
+class Tokens:
+    """
+    Sentence and word boundaries of a text, each computed on first use and then shared by capitalization,
+    last-word extraction and word counting. Every '.' ends a SENTENCE_BOUNDARY sentence as well,
+    the '.'-separated sentences of get_last_words are runs of them.
+    """
+
+    def __init__(self, text: str):
+        """
+        Args:
+        text (str): The text to tokenize.
+        """
+        self.text = text
+        self._sentences = None
+        self._closed_last_words = None
+        self._words = None
+
+    @property
+    def sentences(self) -> List[str]:
+        """
+        Returns:
+        list: The sentences split at SENTENCE_BOUNDARY, without the whitespace between them.
+        """
+        if self._sentences is None:
+            self._sentences = SENTENCE_BOUNDARY.split(self.text)
+        return self._sentences
+
+    def _split_periods(self) -> None:
+        segments = self.text.split('.')
+        self._closed_last_words = [words[-1] for segment in segments[:-1] for words in [segment.rsplit(None, 1)]
+                                   if words]
+        self._tail = segments[-1]
+
+    @property
+    def closed_last_words(self) -> List[str]:
+        """
+        Returns:
+        list: The last word of each sentence ended by a '.'.
+        """
+        if self._closed_last_words is None:
+            self._split_periods()
+        return self._closed_last_words
+
+    @property
+    def tail(self) -> str:
+        """
+        Returns:
+        str: The text after the last '.', its last word ends a sentence only at the end of the text.
+        """
+        if self._closed_last_words is None:
+            self._split_periods()
+        return self._tail
+
+    @property
+    def last_words(self) -> List[str]:
+        """
+        Returns:
+        list: The last word of each '.'-separated sentence.
+        """
+        return self.closed_last_words + self.tail.rsplit(None, 1)[-1:]
+
+    @property
+    def words(self) -> List[str]:
+        """
+        Returns:
+        list: The whitespace-separated words.
+        """
+        if self._words is None:
+            self._words = self.text.split()
+        return self._words
+
+    def capitalized(self) -> str:
+        """
+        Returns:
+        str: The text with the first word of each sentence capitalized.
+        """
+        return ' '.join([sentence.capitalize() for sentence in self.sentences])
+
+
+@lru_cache(maxsize=1024)
+def _cached_tokens(text: str) -> Tokens:
+    return Tokens(text)
+
+
+def tokenize(text: str) -> Tokens:
+    """
+    Tokenizes the text, the tokens of short texts are cached so repeated calls on the same text are free.
+
+    Args:
+    text (str): The text to tokenize.
+
+    Returns:
+    Tokens: The sentence and word boundaries of the text.
+    """
+    if len(text) > TOKEN_CACHE_TEXT_LIMIT:
+        return Tokens(text)
+    return _cached_tokens(text)
+
 
 def capitalize_first_word(text: str) -> str:
     """
@@ -13,29 +120,21 @@ def capitalize_first_word(text: str) -> str:
     Returns:
     str: The capitalized text.
     """
-    # Split the text into sentences
-    sentences = re.split(r'(?<=[.?!:\n])\s*', text)
-
-    # Capitalize the first word of each sentence
-    capitalized_sentences = [sentence.capitalize() for sentence in sentences]
-
-    # Join the sentences back into a single string
-    capitalized_text = ' '.join(capitalized_sentences)
-
-    return capitalized_text
+    return tokenize(text).capitalized()
 
 
-def normalize_text(text: str) -> str:
+def normalize_text(text: str, corrections: Corrections = DEFAULT_CORRECTIONS) -> str:
     """
-    Normalizes the text by converting it to lowercase and fixing the misspelling 'iz' to 'is'.
+    Normalizes the text by converting it to lowercase and fixing misspelled words, by default 'iz' to 'is'.
 
     Args:
     text (str): The text to normalize.
+    corrections (Corrections): Whole-word replacements applied to the lowercase text.
 
     Returns:
     str: The normalized text.
     """
-    return text.lower().replace(" iz ", " is ")
+    return corrections.apply(text.lower())
 
 
 def count_whitespace_characters(text: str) -> int:
@@ -61,8 +160,7 @@ def get_last_words(text: str) -> List[str]:
     Returns:
     list: A list of last words.
     """
-    sentences = [sentence.strip() for sentence in text.split('.') if sentence.strip()]
-    return [sentence.split()[-1] for sentence in sentences]
+    return tokenize(text).last_words
 
 
 def add_last_words_sentence(text: str, last_words: List[str]) -> str:
@@ -0,0 +1,183 @@
+"""
+File helpers shared by the task9 parsers and the news feed writers.
+Files with a compression suffix (.gz, .bz2, .xz and .zst where the standard library has zstd)
+are compressed and decompressed transparently while streaming.
+"""
+
+import importlib
+import os
+import sys
+import threading
+from types import ModuleType
+from typing import IO, Iterable, List, Optional
+
+from task9_metrics import flush_seconds, queue_depth
+
+# module and the name of its compression level argument for every suffix,
+# the modules are imported when a file with their suffix is opened
+COMPRESSORS = {
+    ".gz": ("gzip", "compresslevel"),
+    ".bz2": ("bz2", "compresslevel"),
+    # no .lzma: its legacy format cannot hold the streams appended by every write, which lzma tools reject
+    ".xz": ("lzma", "preset"),
+}
+
+if sys.version_info >= (3, 14):
+    # zstd is in the standard library since Python 3.14
+    COMPRESSORS[".zst"] = ("compression.zstd", "level")
+
+
+def compressor(suffix: str) -> ModuleType:
+    """
+    Get the compression module for a suffix like ".gz"
+    """
+    return importlib.import_module(COMPRESSORS[suffix][0])
+
+
+def compression_suffix(file_path: str) -> Optional[str]:
+    """
+    Get the compression suffix of the file
+    :param file_path: path or name of the file
+    :return: Optional[str]: suffix like ".gz" or None for not compressed files
+    """
+    suffix = os.path.splitext(file_path)[1].lower()
+    return suffix if suffix in COMPRESSORS else None
+
+
+def source_extension(file_path: str) -> str:
+    """
+    Get the extension of the file without the compression suffix, e.g. ".json" for "records.json.gz"
+    :param file_path: path or name of the file
+    :return: str: lowercase extension
+    """
+    if compression_suffix(file_path):
+        file_path = os.path.splitext(file_path)[0]
+    return os.path.splitext(file_path)[1].lower()
+
+
+def open_file(file_path: str, mode: str = "r", compresslevel: int = None, **kwargs) -> IO:
+    """
+    Open a file, compressed files are opened with the module for their suffix
+    :param file_path: path of the file
+    :param mode: mode like for open(), text mode by default
+    :param compresslevel: compression level for writing, the default of the compressor if None
+    :param kwargs: encoding, errors or newline for text mode
+    :return: IO: file object
+    """
+    suffix = compression_suffix(file_path)
+    if suffix is None:
+        return open(file_path, mode, **kwargs)
+
+    module, level_argument = compressor(suffix), COMPRESSORS[suffix][1]
+    if "b" not in mode and "t" not in mode:
+        mode += "t"
+    if compresslevel is not None and "r" not in mode:
+        kwargs[level_argument] = compresslevel
+    return module.open(file_path, mode, **kwargs)
+
+
+class FeedWriter:
+    """
+    Long lived output sink for the news feed.
+    Rendered records are collected in memory and written with one writelines call per buffer,
+    the flush policy decides when written data is flushed to the operating system:
+    every flush_every records, every flush_interval milliseconds or only on close.
+    With fsync the data is also synced to the disk on every flush, so a crash loses at most
+    the records written after the last flush.
+    """
+
+    def __init__(self, file_path: str = "NewsFeed.txt", buffer_size: int = 1024 * 1024, flush_every: int = None,
+                 flush_interval: float = None, fsync: bool = False, compresslevel: int = None):
+        """
+        Open the output file for appending
+        :param file_path: path of the output file, a compression suffix like .gz compresses the output
+        :param buffer_size: number of characters collected before they are written
+        :param flush_every: flush after this number of records
+        :param flush_interval: flush at least every this number of milliseconds
+        :param fsync: sync the file to the disk on every flush
+        :param compresslevel: compression level for compressed files
+        """
+        self.file_path = file_path
+        self.buffer_size = buffer_size
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        if compression_suffix(file_path):
+            self._file = open_file(file_path, "a", compresslevel)
+        else:
+            self._file = open(file_path, "a", buffering=buffer_size)
+        self._pending: List[str] = []
+        self._pending_size = 0
+        self._unflushed_records = 0
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._flusher = None
+        if flush_interval:
+            self._flusher = threading.Thread(target=self._flush_periodically, name="FeedWriter-flush", daemon=True)
+            self._flusher.start()
+
+    def write_records(self, records: Iterable[str]) -> None:
+        """
+        Write rendered records to the output
+        :param records: rendered records, each ends with a new line character
+        """
+        with self._lock:
+            if self._closed.is_set():
+                raise ValueError("Write to a closed FeedWriter.")
+            for record in records:
+                self._pending.append(record)
+                self._pending_size += len(record)
+                self._unflushed_records += 1
+                if self._pending_size >= self.buffer_size:
+                    self._write_pending()
+                if self.flush_every and self._unflushed_records >= self.flush_every:
+                    self._flush()
+            queue_depth.labels("feed_writer").set(self._unflushed_records)
+
+    def _write_pending(self) -> None:
+        if self._pending:
+            self._file.writelines(self._pending)
+            self._pending.clear()
+            self._pending_size = 0
+
+    def _flush(self) -> None:
+        with flush_seconds.time():
+            self._write_pending()
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+        self._unflushed_records = 0
+        queue_depth.labels("feed_writer").set(0)
+
+    def _flush_periodically(self) -> None:
+        while not self._closed.wait(self.flush_interval / 1000):
+            with self._lock:
+                if self._unflushed_records and not self._closed.is_set():
+                    self._flush()
+
+    def flush(self) -> None:
+        """
+        Write and flush all collected records
+        """
+        with self._lock:
+            if not self._closed.is_set():
+                self._flush()
+
+    def close(self) -> None:
+        """
+        Flush all collected records and close the file
+        """
+        with self._lock:
+            if self._closed.is_set():
+                return
+            self._flush()
+            self._closed.set()
+            self._file.close()
+        if self._flusher is not None:
+            self._flusher.join()
+
+    def __enter__(self) -> "FeedWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
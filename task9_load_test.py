@@ -0,0 +1,162 @@
+"""
+Load test of the HTTP ingestion endpoint of task9_server.
+Worker threads with one keep-alive connection each send batches of generated records and the latency
+of every request is measured from sending the request to reading the whole response.
+
+Run: python task9_load_test.py --serve --requests 2000 --concurrency 16 --batch 50 --format json
+     python task9_load_test.py --url http://127.0.0.1:8080 --requests 2000
+"""
+
+import argparse
+import http.client
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Sequence, Tuple
+from urllib.parse import urlsplit
+from xml.sax.saxutils import escape
+
+from task9_benchmark import generate_records
+
+FORMATS = {"json": "application/json", "xml": "application/xml", "txt": "text/plain"}
+
+
+def encode_batch(records: Sequence[dict], body_format: str) -> bytes:
+    """
+    Encode records in the body format of POST /records
+    :param records: fields of the records like the JSON source files
+    :param body_format: "json", "xml" or "txt"
+    """
+    if body_format == "json":
+        return json.dumps(records).encode("utf-8")
+    if body_format == "xml":
+        items = ["<record>" + "".join(f"<{key}>{escape(str(value))}</{key}>" for key, value in record.items()) +
+                 "</record>" for record in records]
+        return ("<records>" + "".join(items) + "</records>").encode("utf-8")
+    lines = []
+    for record in records:
+        if record["type"] == "weather":
+            lines.append(f"Weather|{record['city']}|{record['temperature']}\n")
+        elif record["type"] == "private ad":
+            lines.append(f"Private Ad|{record['text']}|{record['expiration_date']}\n")
+        else:
+            lines.append(f"News|{record['text']}|{record['city']}\n")
+    return "".join(lines).encode("utf-8")
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    """
+    Get the nearest-rank percentile of sorted values
+    :param fraction: percentile as a fraction, e.g. 0.99
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def run_load(url: str, requests: int = 1000, concurrency: int = 8, batch: int = 50, body_format: str = "json",
+             seed: int = 0) -> Dict[str, float]:
+    """
+    Send requests batches of records with concurrency connections
+    :return: Dict[str, float]: latency percentiles in milliseconds, throughput and response counts
+    """
+    parts = urlsplit(url)
+    bodies = []
+    records = list(generate_records(min(requests, 100) * batch, seed=seed))
+    for position in range(min(requests, 100)):
+        bodies.append(encode_batch(records[position * batch:(position + 1) * batch], body_format))
+    headers = {"Content-Type": FORMATS[body_format]}
+    counter = iter(range(requests))
+    counter_lock = threading.Lock()
+
+    def worker(_) -> Tuple[List[float], Dict[int, int], int]:
+        connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+        latencies, statuses, added = [], {}, 0
+        while True:
+            with counter_lock:
+                number = next(counter, None)
+            if number is None:
+                break
+            start = time.perf_counter()
+            connection.request("POST", "/records", body=bodies[number % len(bodies)], headers=headers)
+            response = connection.getresponse()
+            payload = response.read()
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status] = statuses.get(response.status, 0) + 1
+            if response.status == 200:
+                added += json.loads(payload)["added"]
+        connection.close()
+        return latencies, statuses, added
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for result in results for latency in result[0])
+    statuses: Dict[int, int] = {}
+    for _, worker_statuses, _ in results:
+        for status, count in worker_statuses.items():
+            statuses[status] = statuses.get(status, 0) + count
+    added = sum(result[2] for result in results)
+    return {
+        "requests": len(latencies),
+        "seconds": elapsed,
+        "requests_per_second": len(latencies) / elapsed if elapsed else 0.0,
+        "records_per_second": added / elapsed if elapsed else 0.0,
+        "added": added,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p90_ms": percentile(latencies, 0.9) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+        "statuses": statuses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the HTTP ingestion endpoint")
+    parser.add_argument("--url", default="http://127.0.0.1:8080", help="address of a running task9_server")
+    parser.add_argument("--serve", action="store_true",
+                        help="start a server in this process on a free port instead, writing to a temporary file")
+    parser.add_argument("--requests", type=int, default=1000, help="number of requests")
+    parser.add_argument("--concurrency", type=int, default=8, help="number of concurrent connections")
+    parser.add_argument("--batch", type=int, default=50, help="records per request")
+    parser.add_argument("--format", choices=FORMATS, default="json", help="body format")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the generated records")
+    args = parser.parse_args()
+
+    server = writer = None
+    url = args.url
+    if args.serve:
+        from task9 import NewsFeed
+        from task9_io import FeedWriter
+        from task9_server import IngestionServer
+        output = os.path.join(tempfile.mkdtemp(), "NewsFeed.txt")
+        writer = FeedWriter(output)
+        server = IngestionServer(("127.0.0.1", 0), NewsFeed(), writer)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = server.url
+        print(f"Serving on {url}, writing to {output}")
+    try:
+        stats = run_load(url, args.requests, args.concurrency, args.batch, args.format, args.seed)
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+            writer.close()
+
+    print(f"{stats['requests']} requests of {args.batch} {args.format} records with {args.concurrency} connections "
+          f"in {stats['seconds']:.2f}s: {stats['requests_per_second']:.0f} requests/s, "
+          f"{stats['records_per_second']:.0f} records/s")
+    print(f"latency p50 {stats['p50_ms']:.1f} ms, p90 {stats['p90_ms']:.1f} ms, p99 {stats['p99_ms']:.1f} ms, "
+          f"max {stats['max_ms']:.1f} ms")
+    print("responses: " + ", ".join(f"{status}: {count}" for status, count in sorted(stats["statuses"].items())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""
+Ingestion metrics of task9.py in the Prometheus text exposition format.
+The metrics are always collected, an update is a dictionary lookup and an addition under a lock.
+TextfileExporter writes them periodically to a .prom file for the node-exporter textfile collector;
+main() starts it when the environment variable TASK9_METRICS_FILE holds the path of that file.
+"""
+
+import bisect
+import functools
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """
+    Base class of the metrics, a metric with labels holds one child per combination of label values
+    """
+
+    metric_type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], "_Metric"] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *labelvalues: str):
+        """
+        Get the child for the label values, values are given in the order of labelnames
+        """
+        child = self._children.get(labelvalues)
+        if child is None:
+            if len(labelvalues) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(labelvalues, self._new_child())
+        return child
+
+    def _new_child(self) -> "_Metric":
+        raise NotImplementedError
+
+    def _samples(self) -> List[Tuple[str, Tuple[str, ...], str, float]]:
+        """
+        Get (suffix, label values, extra label, value) of every sample
+        """
+        children = [((), self)] if not self.labelnames else sorted(self._children.items())
+        samples = []
+        for labelvalues, child in children:
+            for suffix, extra, value in child._child_samples():
+                samples.append((suffix, labelvalues, extra, value))
+        return samples
+
+    def _child_samples(self) -> List[Tuple[str, str, float]]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {_escape(self.documentation)}", f"# TYPE {self.name} {self.metric_type}"]
+        for suffix, labelvalues, extra, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, labelvalues, extra)} "
+                         f"{_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """
+    Value that only goes up, e.g. number of added records
+    """
+
+    metric_type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.value = 0
+
+    def _new_child(self) -> "Counter":
+        return Counter(self.name, self.documentation)
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def _child_samples(self) -> List[Tuple[str, str, float]]:
+        return [("", "", self.value)]
+
+
+class Gauge(Counter):
+    """
+    Value that goes up and down, e.g. number of records waiting in a queue
+    """
+
+    metric_type = "gauge"
+
+    def _new_child(self) -> "Gauge":
+        return Gauge(self.name, self.documentation)
+
+    def dec(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values in cumulative buckets, e.g. flush latency in seconds
+    """
+
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def _new_child(self) -> "Histogram":
+        return Histogram(self.name, self.documentation, buckets=self.buckets)
+
+    def observe(self, value: float) -> None:
+        bucket = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[bucket] += 1
+            self.sum += value
+
+    def time(self) -> "_Timer":
+        """
+        Observe the duration of a block of code: with histogram.time(): ...
+        """
+        return _Timer(self)
+
+    def timed(self, func: Callable) -> Callable:
+        """
+        Decorator observing the duration of every call of a function
+        """
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.observe(time.perf_counter() - start)
+        return wrapper
+
+    def _child_samples(self) -> List[Tuple[str, str, float]]:
+        samples = []
+        cumulative = 0
+        for upper_bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            samples.append(("_bucket", f'le="{_format_value(float(upper_bound))}"', cumulative))
+        samples.append(("_sum", "", self.sum))
+        samples.append(("_count", "", cumulative))
+        return samples
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class Registry:
+    """
+    Collection of metrics rendered together
+    """
+
+    def __init__(self):
+        self.metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered.")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """
+        Render all metrics in the Prometheus text exposition format
+        """
+        return "\n".join(metric.render() for metric in self.metrics.values()) + "\n"
+
+
+class TextfileExporter:
+    """
+    Writes the registry to a file every interval seconds.
+    The file is replaced atomically, so the collector never reads a half written file
+    """
+
+    def __init__(self, registry: Registry, file_path: str, interval: float = 15.0):
+        self.registry = registry
+        self.file_path = file_path
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def write(self) -> None:
+        tmp_path = f"{self.file_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as file:
+            file.write(self.registry.render())
+        os.replace(tmp_path, self.file_path)
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.write()
+
+    def start(self) -> "TextfileExporter":
+        self.write()
+        self._thread = threading.Thread(target=self._run, name="TextfileExporter", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """
+        Stop the periodic writes and write the final values
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.write()
+
+
+registry = Registry()
+records_added = registry.register(Counter(
+    "news_feed_records_added_total", "Records added to the news feed.", ["type"]))
+records_parsed = registry.register(Counter(
+    "news_feed_parsed_records_total", "Records read from the sources by parser.", ["parser"]))
+parse_failures = registry.register(Counter(
+    "news_feed_parse_failures_total", "Source records or files skipped because they could not be parsed.",
+    ["parser"]))
+duplicates_skipped = registry.register(Counter(
+    "news_feed_duplicates_skipped_total", "Records skipped because they were ingested before."))
+feed_records = registry.register(Gauge(
+    "news_feed_records", "Records held by the news feed."))
+queue_depth = registry.register(Gauge(
+    "news_feed_queue_depth", "Records waiting to be written or processed.", ["queue"]))
+parse_seconds = registry.register(Histogram(
+    "news_feed_parse_seconds", "Time to parse one source.", ["parser"]))
+flush_seconds = registry.register(Histogram(
+    "news_feed_flush_seconds", "Time to write and flush buffered records to the news feed file."))
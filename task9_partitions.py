@@ -0,0 +1,253 @@
+"""
+Time-partitioned storage of the rendered news feed.
+Records are appended to one segment file per day or hour of their publication time instead of one
+ever growing NewsFeed.txt. manifest.json lists the segments with their time ranges, so
+
+- retention deletes whole segment files and never rewrites one,
+- compaction concatenates small closed segments into one file,
+- a range read only opens the segments overlapping the range.
+
+Every segment consists of parts: byte ranges of the file holding the records of one partition.
+A compacted segment keeps the parts of the segments it was made of, so range reads stay exact.
+With a compression suffix every written batch is compressed separately, so a part can be
+decompressed on its own; concatenated gzip, bz2, xz and zstd streams are valid files.
+
+PartitionedFeedStore has the write_records, flush and close methods of FeedWriter and can be passed
+as the writer of NewsFeed.save_to_file.
+"""
+
+import bisect
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator, List, Optional
+
+from task9_io import COMPRESSORS, compression_suffix, compressor
+
+MANIFEST = "manifest.json"
+MANIFEST_VERSION = 1
+GRANULARITIES = {
+    "day": (timedelta(days=1), "%Y-%m-%d"),
+    "hour": (timedelta(hours=1), "%Y-%m-%dT%H"),
+}
+
+
+def _base_name(file_name: str) -> str:
+    return file_name.split(".")[0]
+
+
+def partition_start(when: datetime, granularity: str) -> datetime:
+    """
+    Get the start of the day or hour partition holding the time
+    """
+    if granularity == "day":
+        return when.replace(hour=0, minute=0, second=0, microsecond=0)
+    return when.replace(minute=0, second=0, microsecond=0)
+
+
+class PartitionedFeedStore:
+    """
+    Directory of segment files with a manifest
+    """
+
+    def __init__(self, folder_path: str = "NewsFeed", granularity: str = "day", suffix: str = "",
+                 compresslevel: int = None):
+        """
+        :param folder_path: directory of the segments and the manifest, created if missing
+        :param granularity: "day" or "hour"
+        :param suffix: compression suffix of new segments like ".gz", not compressed by default
+        :param compresslevel: compression level of new segments
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown granularity: {granularity}. Use one of {', '.join(GRANULARITIES)}.")
+        if suffix and suffix not in COMPRESSORS:
+            raise ValueError(f"Unknown compression suffix: {suffix}.")
+        self.folder_path = folder_path
+        self.granularity = granularity
+        self.suffix = suffix
+        self.compresslevel = compresslevel
+        self.segments: List[dict] = []
+        os.makedirs(folder_path, exist_ok=True)
+        manifest_path = os.path.join(folder_path, MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as file:
+                manifest = json.load(file)
+            if manifest["granularity"] != granularity:
+                raise ValueError(f"{folder_path} is partitioned by {manifest['granularity']}, not {granularity}.")
+            self.segments = manifest["segments"]
+
+    def _save_manifest(self) -> None:
+        manifest_path = os.path.join(self.folder_path, MANIFEST)
+        tmp_path = f"{manifest_path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump({"version": MANIFEST_VERSION, "granularity": self.granularity, "segments": self.segments},
+                      file, indent=1)
+        os.replace(tmp_path, manifest_path)
+
+    def _find(self, when: str) -> Optional[int]:
+        """
+        Get the position of the segment whose time range holds the time, segments are sorted by start
+        """
+        position = bisect.bisect_right([segment["start"] for segment in self.segments], when) - 1
+        if position >= 0 and when < self.segments[position]["end"]:
+            return position
+        return None
+
+    def _encode(self, records: List[str], suffix: str) -> bytes:
+        data = "".join(records).encode("utf-8")
+        if not suffix:
+            return data
+        module, level_argument = compressor(suffix), COMPRESSORS[suffix][1]
+        kwargs = {level_argument: self.compresslevel} if self.compresslevel is not None else {}
+        return module.compress(data, **kwargs)
+
+    def write_records(self, records: Iterable[str], when: datetime = None) -> None:
+        """
+        Append rendered records to the segment of their publication time
+        :param records: rendered records
+        :param when: publication time, now by default
+        """
+        records = list(records)
+        if not records:
+            return
+        length, date_format = GRANULARITIES[self.granularity]
+        start = partition_start(when or datetime.now(), self.granularity)
+        start_key, end_key = start.isoformat(), (start + length).isoformat()
+
+        position = self._find(start_key)
+        if position is None:
+            segment = {"file": start.strftime(date_format) + ".txt" + self.suffix, "start": start_key,
+                       "end": end_key, "records": 0, "bytes": 0, "parts": []}
+            position = bisect.bisect_right([segment["start"] for segment in self.segments], start_key)
+            self.segments.insert(position, segment)
+        segment = self.segments[position]
+
+        data = self._encode(records, compression_suffix(segment["file"]) or "")
+        with open(os.path.join(self.folder_path, segment["file"]), "ab") as file:
+            if file.tell() > segment["bytes"]:
+                # a write that crashed before the manifest was saved, its records are not in any part
+                file.truncate(segment["bytes"])
+                file.seek(0, os.SEEK_END)
+            offset = file.tell()
+            file.write(data)
+        part = segment["parts"][-1] if segment["parts"] else None
+        if part is None or part["start"] != start_key or part["offset"] + part["length"] != offset:
+            part = {"start": start_key, "end": end_key, "offset": offset, "length": 0, "records": 0}
+            segment["parts"].append(part)
+        part["length"] += len(data)
+        part["records"] += len(records)
+        segment["bytes"] = offset + len(data)
+        segment["records"] += len(records)
+        self._save_manifest()
+
+    def flush(self) -> None:
+        """
+        Segments are written on every write_records call, kept for the FeedWriter interface
+        """
+
+    def close(self) -> None:
+        """
+        Kept for the FeedWriter interface
+        """
+
+    def __enter__(self) -> "PartitionedFeedStore":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def apply_retention(self, keep: timedelta, now: datetime = None) -> List[str]:
+        """
+        Delete the segments ending before now - keep, the cost does not depend on their size
+        :return: List[str]: names of the deleted segment files
+        """
+        cutoff = ((now or datetime.now()) - keep).isoformat()
+        expired = 0
+        while expired < len(self.segments) and self.segments[expired]["end"] <= cutoff:
+            expired += 1
+        deleted = [segment["file"] for segment in self.segments[:expired]]
+        if deleted:
+            del self.segments[:expired]
+            # the manifest goes first, a crash leaves unused files instead of missing ones
+            self._save_manifest()
+            for file_name in deleted:
+                os.remove(os.path.join(self.folder_path, file_name))
+        return deleted
+
+    def compact(self, min_bytes: int = 1024 * 1024, now: datetime = None) -> int:
+        """
+        Concatenate runs of neighbouring closed segments smaller than min_bytes,
+        each run becomes one segment of at most min_bytes
+        :return: int: number of segments removed by the compaction
+        """
+        current = partition_start(now or datetime.now(), self.granularity).isoformat()
+        runs, run = [], []
+        for segment in self.segments:
+            small = segment["end"] <= current and segment["bytes"] < min_bytes
+            if small and run and sum(item["bytes"] for item in run) + segment["bytes"] <= min_bytes and \
+                    compression_suffix(run[0]["file"]) == compression_suffix(segment["file"]):
+                run.append(segment)
+                continue
+            runs.append(run)
+            run = [segment] if small else []
+        runs.append(run)
+
+        removed = 0
+        for run in runs:
+            if len(run) < 2:
+                continue
+            self._merge_segments(run)
+            removed += len(run) - 1
+        return removed
+
+    def _merge_segments(self, run: List[dict]) -> None:
+        first = run[0]
+        file_name = f"{_base_name(first['file'])}--{_base_name(run[-1]['file'])}.txt" + \
+            (compression_suffix(first["file"]) or "")
+        merged = {"file": file_name, "start": first["start"], "end": run[-1]["end"], "records": 0, "bytes": 0,
+                  "parts": []}
+        tmp_path = os.path.join(self.folder_path, file_name + ".tmp")
+        with open(tmp_path, "wb") as output:
+            for segment in run:
+                with open(os.path.join(self.folder_path, segment["file"]), "rb") as file:
+                    data = file.read()
+                output.write(data)
+                for part in segment["parts"]:
+                    merged["parts"].append(dict(part, offset=part["offset"] + merged["bytes"]))
+                merged["bytes"] += len(data)
+                merged["records"] += segment["records"]
+        os.replace(tmp_path, os.path.join(self.folder_path, file_name))
+
+        position = self.segments.index(first)
+        self.segments[position:position + len(run)] = [merged]
+        self._save_manifest()
+        for segment in run:
+            if segment["file"] != file_name:
+                os.remove(os.path.join(self.folder_path, segment["file"]))
+
+    def read_range(self, start: datetime, end: datetime) -> Iterator[str]:
+        """
+        Get the rendered records published in [start, end), only the overlapping segments are opened
+        :return: Iterator[str]: text of every overlapping partition in time order
+        """
+        start_key = partition_start(start, self.granularity).isoformat()
+        end_key = end.isoformat()
+        position = self._find(start_key)
+        if position is None:
+            position = bisect.bisect_right([segment["start"] for segment in self.segments], start_key)
+        for segment in self.segments[position:]:
+            if segment["start"] >= end_key:
+                break
+            suffix = compression_suffix(segment["file"])
+            with open(os.path.join(self.folder_path, segment["file"]), "rb") as file:
+                for part in segment["parts"]:
+                    if part["end"] <= start_key or part["start"] >= end_key:
+                        continue
+                    file.seek(part["offset"])
+                    data = file.read(part["length"])
+                    if suffix is not None:
+                        data = compressor(suffix).decompress(data)
+                    yield data.decode("utf-8")
+
+    def __len__(self) -> int:
+        return len(self.segments)
@@ -0,0 +1,270 @@
+"""
+Staged ingestion pipeline: read -> parse -> build record -> statistics -> render -> write.
+Stages run in their own threads and are connected by bounded queues. When a stage is slow, for example
+writing to a slow disk, the queue in front of it fills up and the stages before it block on put,
+so memory stays bounded by the queue sizes instead of growing with the input.
+
+Run: python task9_pipeline.py news_file.txt --workers build=2 stats=2
+"""
+
+import argparse
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from task9 import NewsFeed, TxtParser
+from task9_concurrent import ConcurrentNewsFeed
+from task9_io import FeedWriter, open_file
+from task9_metrics import parse_failures, queue_depth
+
+STAGE_NAMES = ("parse", "build", "stats", "render", "write")
+
+# marks the end of the input in a queue, every worker of the next stage gets one
+_DONE = object()
+
+
+class Stage:
+    """
+    One step of the pipeline. func gets an item and returns the item for the next stage,
+    or None to drop the item
+    """
+
+    def __init__(self, name: str, func: Callable, workers: int = 1):
+        """
+        :param name: name of the stage in the report
+        :param func: function processing one item
+        :param workers: number of threads running the stage, with more than one the order of items can change
+        """
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.items_in = 0
+        self.items_out = 0
+        self.errors = 0
+        self.busy = 0.0
+        self.max_queue = 0
+        self._lock = threading.Lock()
+        self._running = workers
+
+    def _work(self, inbox: queue.Queue, outbox: Optional[queue.Queue], next_workers: int) -> None:
+        items_in = items_out = errors = 0
+        busy = 0.0
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                break
+            items_in += 1
+            start = time.perf_counter()
+            try:
+                result = self.func(item)
+            except Exception as e:
+                errors += 1
+                result = None
+                parse_failures.labels("pipeline").inc()
+                print(f"An error occurred in the {self.name} stage: {e}. Skipping.")
+            busy += time.perf_counter() - start
+            if result is not None and outbox is not None:
+                outbox.put(result)
+                items_out += 1
+        with self._lock:
+            self.items_in += items_in
+            self.items_out += items_out
+            self.errors += errors
+            self.busy += busy
+            self._running -= 1
+            last = self._running == 0
+        if last and outbox is not None:
+            for _ in range(next_workers):
+                outbox.put(_DONE)
+
+
+class Pipeline:
+    """
+    Source followed by stages connected with bounded queues
+    """
+
+    def __init__(self, source: Iterable, stages: List[Stage], queue_size: int = 1000):
+        """
+        :param source: iterable producing the input items, read in its own thread
+        :param stages: stages in processing order
+        :param queue_size: maximum number of items waiting in front of a stage
+        """
+        self.source = source
+        self.stages = stages
+        self.queue_size = queue_size
+        self.read = Stage("read", None)
+        self.elapsed = 0.0
+
+    def _read(self, outbox: queue.Queue, next_workers: int, errors: list) -> None:
+        items = 0
+        busy = 0.0
+        try:
+            iterator = iter(self.source)
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    busy += time.perf_counter() - start
+                outbox.put(item)
+                items += 1
+        except Exception as e:
+            errors.append(e)
+        finally:
+            self.read.items_out = items
+            self.read.busy = busy
+            for _ in range(next_workers):
+                outbox.put(_DONE)
+
+    def _watch(self, queues: List[queue.Queue], stopped: threading.Event) -> None:
+        """
+        Sample the queue depths while the pipeline runs
+        """
+        while not stopped.wait(0.05):
+            for stage, inbox in zip(self.stages, queues):
+                depth = inbox.qsize()
+                stage.max_queue = max(stage.max_queue, depth)
+                queue_depth.labels(stage.name).set(depth)
+
+    def run(self) -> None:
+        """
+        Run the pipeline until the source is exhausted and every stage has processed its input
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        errors = []
+        threads = [threading.Thread(target=self._read, args=(queues[0], self.stages[0].workers, errors),
+                                    name="pipeline-read")]
+        for position, stage in enumerate(self.stages):
+            last = position == len(self.stages) - 1
+            outbox = None if last else queues[position + 1]
+            next_workers = 0 if last else self.stages[position + 1].workers
+            for worker in range(stage.workers):
+                threads.append(threading.Thread(target=stage._work, args=(queues[position], outbox, next_workers),
+                                                name=f"pipeline-{stage.name}-{worker}"))
+        stopped = threading.Event()
+        watcher = threading.Thread(target=self._watch, args=(queues, stopped), name="pipeline-watch", daemon=True)
+
+        start = time.perf_counter()
+        watcher.start()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.elapsed = time.perf_counter() - start
+        stopped.set()
+        watcher.join()
+        if errors:
+            raise errors[0]
+
+    def report(self) -> str:
+        """
+        Get the throughput of every stage: items per second of the whole run and of the busy time
+        """
+        lines = [f"{'stage':<10}{'workers':>8}{'in':>10}{'out':>10}{'errors':>8}{'busy s':>9}"
+                 f"{'items/s':>11}{'busy items/s':>14}{'max queue':>11}"]
+        for stage in [self.read] + self.stages:
+            items = stage.items_out if stage is self.read else stage.items_in
+            rate = items / self.elapsed if self.elapsed else 0.0
+            busy_rate = items / stage.busy * stage.workers if stage.busy else 0.0
+            lines.append(f"{stage.name:<10}{stage.workers:>8}{stage.items_in:>10}{stage.items_out:>10}"
+                         f"{stage.errors:>8}{stage.busy:>9.2f}{rate:>11.0f}{busy_rate:>14.0f}{stage.max_queue:>11}")
+        lines.append(f"total {self.elapsed:.2f}s")
+        return "\n".join(lines)
+
+
+def _parse_line(line: str) -> Optional[tuple]:
+    record_data = line.strip().split("|")
+    if len(record_data) < 3:
+        parse_failures.labels("pipeline").inc()
+        print(f"Unknown record type: {record_data[0]}. Skipping.")
+        return None
+    return record_data[0].strip().lower(), record_data[1], record_data[2]
+
+
+def _parse_record(record_data) -> Optional[tuple]:
+    """
+    Get (type, first, second) fields from a txt line or a JSON or XML record dictionary
+    """
+    if isinstance(record_data, str):
+        return _parse_line(record_data)
+    record_type = record_data.get("type", "").strip().lower()
+    if record_type == "news":
+        return record_type, record_data["text"], record_data["city"]
+    if record_type == "private ad":
+        return record_type, record_data["text"], record_data["expiration_date"]
+    if record_type == "weather":
+        return record_type, record_data["city"], record_data["temperature"]
+    return None
+
+
+def ingestion_pipeline(source: Iterable, news_feed: NewsFeed, writer: FeedWriter,
+                       workers: Dict[str, int] = None, queue_size: int = 1000) -> Pipeline:
+    """
+    Create the pipeline adding records from the source to the news feed and writing them with the writer
+    :param source: txt lines, or record dictionaries from JsonParser.read_records or XmlParser.read_records
+    :param news_feed: news feed for the statistics, must be a ConcurrentNewsFeed if stats has several workers
+    :param writer: writer of the rendered records
+    :param workers: number of threads of the parse, build, stats, render and write stages, 1 by default
+    :param queue_size: maximum number of items waiting in front of a stage
+    :return: Pipeline: pipeline ready to run
+    """
+    workers = workers or {}
+    if workers.get("stats", 1) > 1 and not isinstance(news_feed, ConcurrentNewsFeed):
+        raise ValueError("Several stats workers need a ConcurrentNewsFeed.")
+    if workers.get("write", 1) > 1:
+        raise ValueError("The write stage keeps the order of the output and runs in one thread.")
+
+    def build(fields: tuple):
+        return TxtParser.build_record(*fields)
+
+    def stats(record):
+        # duplicates are dropped and not written
+        return record if news_feed.add_record(record) else None
+
+    def write(rendered: str):
+        writer.write_records((rendered,))
+
+    stages = [
+        Stage("parse", _parse_record, workers.get("parse", 1)),
+        Stage("build", build, workers.get("build", 1)),
+        Stage("stats", stats, workers.get("stats", 1)),
+        Stage("render", NewsFeed.render_record, workers.get("render", 1)),
+        Stage("write", write),
+    ]
+    return Pipeline(source, stages, queue_size)
+
+
+def _read_lines(file_path: str) -> Iterable[str]:
+    with open_file(file_path) as file:
+        yield from file
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest a txt source file through the staged pipeline")
+    parser.add_argument("file_path", help="txt source file, it is not deleted")
+    parser.add_argument("--output", default="NewsFeed.txt", help="news feed file to append to")
+    parser.add_argument("--workers", nargs="*", default=[], help="stage=threads, e.g. build=2 stats=2")
+    parser.add_argument("--queue-size", type=int, default=1000, help="maximum items waiting in front of a stage")
+    args = parser.parse_args()
+
+    workers = {}
+    for value in args.workers:
+        name, _, count = value.partition("=")
+        if name not in STAGE_NAMES:
+            parser.error(f"Unknown stage: {name}")
+        if not count.strip().isdigit() or int(count) < 1:
+            parser.error(f"Invalid number of threads for stage {name}: {count!r}, use a positive integer")
+        workers[name] = int(count)
+    news_feed = ConcurrentNewsFeed() if workers.get("stats", 1) > 1 else NewsFeed()
+
+    with FeedWriter(args.output) as writer:
+        pipeline = ingestion_pipeline(_read_lines(args.file_path), news_feed, writer, workers, args.queue_size)
+        pipeline.run()
+    print(pipeline.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Timing of the ingestion stages of task9.py.
+The profiler is off by default; it is switched on at runtime with profiler.enabled = True
+or with the environment variable TASK9_PROFILE=1. When it is off, a timed stage costs one attribute check.
+"""
+
+import functools
+import os
+import time
+from typing import Callable, Dict
+
+# latency histograms have power of two buckets in microseconds: bucket n counts durations below 2**n us
+HISTOGRAM_BUCKETS = 32
+
+
+class StageStats:
+    """
+    Timings and counters of one stage
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.records = 0
+        self.bytes = 0
+        self.histogram = [0] * HISTOGRAM_BUCKETS
+
+    def add_timing(self, seconds: float) -> None:
+        self.calls += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        bucket = min(int(seconds * 1_000_000).bit_length(), HISTOGRAM_BUCKETS - 1)
+        self.histogram[bucket] += 1
+
+    def percentile(self, fraction: float) -> float:
+        """
+        Get an upper bound of the percentile from the histogram
+        :param fraction: percentile as a fraction, e.g. 0.99
+        :return: float: upper bound of the bucket of the percentile in seconds
+        """
+        if not self.calls:
+            return 0.0
+        rank = fraction * self.calls
+        seen = 0
+        for bucket, count in enumerate(self.histogram):
+            seen += count
+            if seen >= rank:
+                return min(2 ** bucket / 1_000_000, self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "total_seconds": self.total,
+            "mean_seconds": self.total / self.calls if self.calls else 0.0,
+            "p50_seconds": self.percentile(0.5),
+            "p99_seconds": self.percentile(0.99),
+            "max_seconds": self.max,
+            "records": self.records,
+            "bytes": self.bytes,
+            "histogram_us": {f"<{2 ** bucket}": count for bucket, count in enumerate(self.histogram) if count},
+        }
+
+
+class _Stage:
+    """
+    Context manager timing one execution of a stage
+    """
+
+    __slots__ = ("stats", "start")
+
+    def __init__(self, stats: StageStats):
+        self.stats = stats
+
+    def __enter__(self) -> "_Stage":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.stats.add_timing(time.perf_counter() - self.start)
+
+    def add(self, records: int = 0, nbytes: int = 0) -> None:
+        self.stats.records += records
+        self.stats.bytes += nbytes
+
+
+class _NullStage:
+    """
+    Stage used while the profiler is off, it does nothing
+    """
+
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullStage":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        pass
+
+    def add(self, records: int = 0, nbytes: int = 0) -> None:
+        pass
+
+
+NULL_STAGE = _NullStage()
+
+
+class Profiler:
+    """
+    Collection of stage timings with a summary table and a JSON report
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.stages: Dict[str, StageStats] = {}
+        self.started = time.perf_counter()
+
+    def _stats(self, name: str) -> StageStats:
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = StageStats()
+        return stats
+
+    def stage(self, name: str):
+        """
+        Time a block of code: with profiler.stage("txt.parse") as stage: ...
+        :param name: name of the stage
+        :return: context manager with add(records, nbytes) to count processed records and bytes
+        """
+        if not self.enabled:
+            return NULL_STAGE
+        return _Stage(self._stats(name))
+
+    def timed(self, name: str, count_result: bool = False) -> Callable:
+        """
+        Decorator timing every call of a function as a stage
+        :param name: name of the stage
+        :param count_result: count the length of the returned value as processed records
+        """
+        def decorator(func: Callable) -> Callable:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                stats = self._stats(name)
+                start = time.perf_counter()
+                try:
+                    result = func(*args, **kwargs)
+                finally:
+                    stats.add_timing(time.perf_counter() - start)
+                if count_result and result:
+                    stats.records += len(result)
+                return result
+            return wrapper
+        return decorator
+
+    def add(self, name: str, records: int = 0, nbytes: int = 0) -> None:
+        """
+        Count processed records and bytes of a stage without timing it
+        """
+        if self.enabled:
+            stats = self._stats(name)
+            stats.records += records
+            stats.bytes += nbytes
+
+    def reset(self) -> None:
+        self.stages.clear()
+        self.started = time.perf_counter()
+
+    def report(self) -> dict:
+        """
+        Get the machine readable report of the run
+        """
+        return {
+            "wall_seconds": time.perf_counter() - self.started,
+            "stages": {name: stats.to_dict() for name, stats in self.stages.items()},
+        }
+
+    def save_report(self, file_path: str) -> None:
+        import json
+        with open(file_path, "w") as file:
+            json.dump(self.report(), file, indent=4)
+
+    def summary(self) -> str:
+        """
+        Get the summary table of the run
+        """
+        lines = [f"{'stage':<24}{'calls':>10}{'total s':>10}{'mean us':>10}{'p50 us':>10}{'p99 us':>10}"
+                 f"{'max us':>10}{'records':>10}{'MB':>8}"]
+        for name, stats in self.stages.items():
+            mean = stats.total / stats.calls if stats.calls else 0.0
+            lines.append(f"{name:<24}{stats.calls:>10}{stats.total:>10.3f}{mean * 1e6:>10.1f}"
+                         f"{stats.percentile(0.5) * 1e6:>10.0f}{stats.percentile(0.99) * 1e6:>10.0f}"
+                         f"{stats.max * 1e6:>10.0f}{stats.records:>10}{stats.bytes / 1024 / 1024:>8.1f}")
+        return "\n".join(lines)
+
+
+profiler = Profiler(enabled=os.environ.get("TASK9_PROFILE", "") not in ("", "0"))
@@ -0,0 +1,225 @@
+"""
+Paginated and filtered publishing of a news feed.
+FeedIndex keeps the positions of the records in NewsFeed.records per record type, per city and per
+type and city, every index sorted by record date. A query picks the narrowest index, finds the date range
+with a binary search and slices the page out of it, so rendering page 1 of a feed with millions of records
+reads only the records of that page.
+
+Records do not arrive in date order: private ads are dated by their future expiration date and weather
+records at midnight, before the news of the same day. Adding a record therefore only appends it, and an
+index is sorted when it is queried after records were added. The sort is one pass over the sorted part and
+the new records, so the cost of adding stays constant and a query pays for the records added since the last one.
+
+The date of a record is the creation date of news and weather records and the expiration date of private ads.
+Type, city and date are indexed when the record is added, later changes of a record are not reindexed.
+
+Use: NewsFeed(feed_index=FeedIndex()), the index is updated by add_record and merge, then
+     publish_page(news_feed, writer, record_type="news", city="London", offset=0, limit=20)
+"""
+
+import bisect
+import threading
+from array import array
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, Optional, TextIO, Tuple
+
+from task9 import News, NewsFeed, PrivateAd, Record, Weather
+
+EPOCH = datetime(1970, 1, 1)
+ORDERS = ("asc", "desc")
+RECORD_TYPES = {News: "news", PrivateAd: "private ad", Weather: "weather"}
+DATE_FORMATS = {News: "%d/%m/%Y %H.%M", Weather: "%d/%m/%Y"}
+
+
+@lru_cache(maxsize=4096)
+def _parse_timestamp(value: str, date_format: str) -> int:
+    # records of one run share a handful of date strings
+    return int((datetime.strptime(value, date_format) - EPOCH).total_seconds())
+
+
+def record_timestamp(record: Record) -> int:
+    """
+    Get the date of a record in seconds since 1970-01-01, 0 if the record has no date
+    """
+    if isinstance(record, PrivateAd):
+        return int((record.expiration_date - EPOCH).total_seconds())
+    date_format = DATE_FORMATS.get(type(record))
+    if date_format is None or getattr(record, "date", None) is None:
+        return 0
+    return _parse_timestamp(record.date, date_format)
+
+
+def type_name(record: Record) -> str:
+    """
+    Get the type name of a record: "news", "private ad", "weather" or "record"
+    """
+    return RECORD_TYPES.get(type(record), "record")
+
+
+class _SortedPositions:
+    """
+    Positions of records, sorted by (timestamp, position) after sort()
+    """
+
+    def __init__(self):
+        self.timestamps = array("q")
+        self.positions = array("q")
+        # number of leading entries known to be sorted
+        self._sorted = 0
+
+    def add(self, timestamp: int, position: int) -> None:
+        timestamps = self.timestamps
+        if self._sorted == len(timestamps) and (not timestamps or timestamp >= timestamps[-1]):
+            self._sorted += 1
+        timestamps.append(timestamp)
+        self.positions.append(position)
+
+    def sort(self) -> None:
+        """
+        Sort the entries added out of order since the last sort
+        """
+        if self._sorted == len(self.timestamps):
+            return
+        # Timsort finds the sorted prefix as one run and merges the sorted tail into it
+        entries = sorted(zip(self.timestamps, self.positions))
+        self.timestamps = array("q", [timestamp for timestamp, _ in entries])
+        self.positions = array("q", [position for _, position in entries])
+        self._sorted = len(entries)
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+
+class FeedIndex:
+    """
+    Record positions of a news feed by type, city and date, safe to update from several threads
+    """
+
+    def __init__(self):
+        self._all = _SortedPositions()
+        self._indexes: Dict[Tuple[Optional[str], Optional[str]], _SortedPositions] = {}
+        self._lock = threading.Lock()
+
+    def add(self, record: Record, position: int) -> None:
+        """
+        Index a record at its position in NewsFeed.records
+        """
+        timestamp = record_timestamp(record)
+        kind = type_name(record)
+        city = getattr(record, "city", None)
+        keys = [(kind, None)]
+        if city:
+            city = city.casefold()
+            keys += [(None, city), (kind, city)]
+        with self._lock:
+            self._all.add(timestamp, position)
+            for key in keys:
+                index = self._indexes.get(key)
+                if index is None:
+                    index = self._indexes[key] = _SortedPositions()
+                index.add(timestamp, position)
+
+    def add_records(self, records: Iterable[Record], start: int = 0) -> None:
+        """
+        Index records stored in NewsFeed.records from position start on
+        """
+        for position, record in enumerate(records, start):
+            self.add(record, position)
+
+    def __len__(self) -> int:
+        return len(self._all)
+
+    def query(self, record_type: str = None, city: str = None, start: datetime = None, end: datetime = None,
+              order: str = "asc", offset: int = 0, limit: int = None) -> Tuple[array, int]:
+        """
+        Find the positions of a page of records
+        :param record_type: "news", "private ad" or "weather", all types if None
+        :param city: city of the records, case insensitive, all records if None
+        :param start: first date of the range, inclusive
+        :param end: last date of the range, exclusive
+        :param order: "asc" for the oldest records first, "desc" for the newest first
+        :param offset: number of matching records skipped
+        :param limit: maximum number of records of the page, all the rest if None
+        :return: Tuple[array, int]: positions of the page in NewsFeed.records and the number of matching records
+        """
+        if order not in ORDERS:
+            raise ValueError(f"Unknown order: {order}. Use one of {', '.join(ORDERS)}.")
+        if offset < 0 or (limit is not None and limit < 0):
+            raise ValueError("offset and limit must not be negative.")
+        key = (record_type, city.casefold() if city else None)
+        with self._lock:
+            index = self._all if key == (None, None) else self._indexes.get(key)
+            if index is None:
+                return array("q"), 0
+            index.sort()
+            low = 0 if start is None else bisect.bisect_left(index.timestamps, _timestamp(start))
+            high = len(index) if end is None else bisect.bisect_left(index.timestamps, _timestamp(end))
+            total = max(0, high - low)
+            count = total - offset if limit is None else min(limit, total - offset)
+            if count <= 0:
+                return array("q"), total
+            if order == "asc":
+                page = index.positions[low + offset:low + offset + count]
+            else:
+                page = index.positions[high - offset - count:high - offset]
+                page.reverse()
+        return page, total
+
+
+def _timestamp(when: datetime) -> int:
+    return int((when - EPOCH).total_seconds())
+
+
+def feed_index(news_feed: NewsFeed) -> FeedIndex:
+    """
+    Get the index of a news feed, a feed without one is indexed once and keeps the index
+    """
+    if news_feed.feed_index is None:
+        lock = getattr(news_feed, "_lock", None)
+        if lock is None:
+            _build_feed_index(news_feed)
+        else:
+            # ConcurrentNewsFeed indexes added records under its lock, so no record is added between
+            # indexing the records and assigning the index, and only one thread builds it
+            with lock:
+                _build_feed_index(news_feed)
+    return news_feed.feed_index
+
+
+def _build_feed_index(news_feed: NewsFeed) -> None:
+    """
+    Index the records of a news feed unless another thread did it already
+    """
+    if news_feed.feed_index is None:
+        index = FeedIndex()
+        index.add_records(news_feed.records)
+        news_feed.feed_index = index
+
+
+def page_records(news_feed: NewsFeed, **query) -> Iterator[Record]:
+    """
+    Get the records of a page, see FeedIndex.query for the filters
+    """
+    records = news_feed.records
+    positions, _ = feed_index(news_feed).query(**query)
+    return (records[position] for position in positions)
+
+
+def publish_page(news_feed: NewsFeed, writer: TextIO = None, **query) -> Optional[str]:
+    """
+    Publish a page of the news feed the way publish_feed does, see FeedIndex.query for the filters
+    :param news_feed: feed to publish
+    :param writer: text stream the page is written to record by record, e.g. an open file or
+                   socket.makefile("w"); the page is returned as a string if None
+    :return: Optional[str]: the page if writer is None
+    """
+    positions, total = feed_index(news_feed).query(**query)
+    records = news_feed.records
+    header = f"News feed: {len(positions)} of {total} records\n"
+    if writer is None:
+        return header + "".join([records[position].render_normalized() for position in positions])
+    writer.write(header)
+    for position in positions:
+        writer.write(records[position].render_normalized())
+    return None
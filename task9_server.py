@@ -0,0 +1,425 @@
+"""
+Local HTTP ingestion endpoint of the news feed, built on http.server only.
+
+    POST /records   a batch of records as JSON, XML or txt lines, see parse_body for the formats
+    GET  /health    number of records in the feed
+    GET  /metrics   metrics of task9_metrics in the Prometheus text format
+
+Records are checked with the rules of get_user_input (no digits in cities, future expiration dates,
+integer temperatures). Valid records of concurrent requests are committed together by one committer
+thread: written to the output file with a FeedWriter and, once the writer is flushed, added to the NewsFeed.
+A request is answered after its records are committed, so a response means the records are in the feed and
+were handed to the file; a 503 response means none of them was added to the feed.
+
+Run: python task9_server.py --port 8080 --output NewsFeed.txt
+     python task9_load_test.py --url http://127.0.0.1:8080 --requests 2000 --concurrency 16
+"""
+
+import argparse
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional, Tuple
+
+from task9 import NewsFeed, Record, validate_record
+from task9_io import FeedWriter
+from task9_metrics import Counter, Histogram, registry
+
+MAX_BODY_SIZE = 16 * 1024 * 1024
+TXT_FIELDS = {"news": ("text", "city"), "private ad": ("text", "expiration_date"), "weather": ("city", "temperature")}
+
+ingested_records = registry.register(Counter(
+    "news_feed_ingested_records_total", "Records received over HTTP by result", ["result"]))
+commit_seconds = registry.register(Histogram(
+    "news_feed_commit_seconds", "Time to commit one batch of records received over HTTP"))
+request_seconds = registry.register(Histogram(
+    "news_feed_ingest_request_seconds", "Time to handle one POST /records request"))
+
+
+def parse_body(body: bytes, content_type: str) -> List[dict]:
+    """
+    Get the fields of the submitted records
+    :param body: request body in utf-8
+    :param content_type: "application/json": a list of objects or {"records": [...]} with the keys of the
+                         JSON source files; "application/xml": <records><record><type>...</type>...</record>;
+                         "text/plain": lines like the txt source file, e.g. news|text|city
+    :return: List[dict]: fields of every record
+    :raises ValueError: if the body cannot be parsed
+    """
+    media_type = content_type.split(";")[0].strip().lower()
+    text = body.decode("utf-8")
+    if media_type in ("application/json", "text/json"):
+        data = json.loads(text)
+        if isinstance(data, dict):
+            data = data.get("records")
+        if not isinstance(data, list) or not all(isinstance(item, dict) for item in data):
+            raise ValueError("JSON body must be a list of record objects or {\"records\": [...]}.")
+        return data
+    if media_type in ("application/xml", "text/xml"):
+        import xml.etree.ElementTree as eT
+        try:
+            root = eT.fromstring(text)
+        except eT.ParseError as e:
+            raise ValueError(f"Invalid XML: {e}") from None
+        return [{child.tag: child.text or "" for child in record} for record in root.iter("record")]
+    if media_type == "text/plain":
+        records = []
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            record_type, first, second = (line.strip().split("|") + ["", ""])[:3]
+            record_type = record_type.strip().lower()
+            names = TXT_FIELDS.get(record_type, ("text", "city"))
+            records.append({"type": record_type, names[0]: first, names[1]: second})
+        return records
+    raise ValueError(f"Unsupported content type: {content_type or 'none'}. Use JSON, XML or text/plain.")
+
+
+class _Batch:
+    """
+    Records of one request waiting for their commit
+    """
+
+    def __init__(self, records: List[Record]):
+        self.records = records
+        self.added = 0
+        self.error: Optional[Exception] = None
+        self.done = threading.Event()
+
+
+class BatchCommitter:
+    """
+    Thread committing the records of concurrent requests together: every batch is rendered to the writer
+    at once, the writer is flushed, then the records are added to the feed
+    """
+
+    def __init__(self, news_feed: NewsFeed, writer: FeedWriter = None, batch_size: int = 1000,
+                 max_delay: float = 5.0):
+        """
+        :param news_feed: feed the records are added to, only the committer thread adds records
+        :param writer: FeedWriter of the output file, records are only kept in the feed if None
+        :param batch_size: number of records committed at once at most
+        :param max_delay: milliseconds to wait for more requests before a batch smaller than batch_size is committed
+        """
+        self.news_feed = news_feed
+        self.writer = writer
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._queue: "queue.Queue[Optional[_Batch]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="BatchCommitter", daemon=True)
+        self._thread.start()
+
+    def submit(self, records: List[Record], timeout: float = 30.0) -> int:
+        """
+        Commit records together with the records of other requests and wait for the commit
+        :return: int: number of records added, duplicates skipped by the dedup of the feed are not counted
+        :raises Exception: the error of the commit
+        """
+        batch = _Batch(records)
+        self._queue.put(batch)
+        if not batch.done.wait(timeout):
+            raise TimeoutError("The records were not committed in time.")
+        if batch.error is not None:
+            raise batch.error
+        return batch.added
+
+    def _run(self) -> None:
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                return
+            batches = [batch]
+            size = len(batch.records)
+            deadline = time.monotonic() + self.max_delay / 1000
+            stop = False
+            while size < self.batch_size:
+                try:
+                    batch = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if batch is None:
+                    stop = True
+                    break
+                batches.append(batch)
+                size += len(batch.records)
+            self._commit(batches)
+            if stop:
+                return
+
+    def _commit(self, batches: List[_Batch]) -> None:
+        with commit_seconds.time():
+            written = batches if self.writer is None else self._write(batches)
+            # the records are added only after they were written, a failed write leaves the feed unchanged
+            for batch in written:
+                try:
+                    for record in batch.records:
+                        if self.news_feed.add_record(record):
+                            batch.added += 1
+                except Exception as e:
+                    batch.error = e
+        for batch in batches:
+            batch.done.set()
+
+    def _write(self, batches: List[_Batch]) -> List[_Batch]:
+        """
+        Render the records of the batches that are not duplicates, write them and flush the writer
+        :return: List[_Batch]: the written batches, the others have their error set
+        """
+        dedup = self.news_feed.dedup
+        if dedup is not None:
+            from task9_dedup import fingerprint
+        seen = set()
+        rendered, written = [], []
+        for batch in batches:
+            # a record failing to render fails only its own request
+            try:
+                texts, digests = [], set()
+                for record in batch.records:
+                    if dedup is not None:
+                        # add_record skips the same records, so the file gets the records the feed gets
+                        digest = fingerprint(record)
+                        if digest in seen or digest in digests or record in dedup:
+                            continue
+                        digests.add(digest)
+                    texts.append(NewsFeed.render_record(record))
+            except Exception as e:
+                batch.error = e
+                continue
+            seen.update(digests)
+            rendered.extend(texts)
+            written.append(batch)
+        try:
+            self.writer.write_records(rendered)
+            self.writer.flush()
+        except Exception as e:
+            for batch in written:
+                batch.error = e
+            return []
+        return written
+
+    def close(self) -> None:
+        """
+        Commit the waiting records and stop the thread
+        """
+        self._queue.put(None)
+        self._thread.join()
+
+
+class IngestionHandler(BaseHTTPRequestHandler):
+    """
+    Request handler, server is an IngestionServer
+    """
+
+    server: "IngestionServer"
+    protocol_version = "HTTP/1.1"
+    # headers and body are written separately, with Nagle's algorithm the body waits for the delayed ACK
+    disable_nagle_algorithm = True
+
+    def _send(self, status: int, payload, content_type: str = "application/json") -> None:
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        if self.path == "/health":
+            self._send(200, {"status": "ok", "records": len(self.server.news_feed.records)})
+        elif self.path == "/metrics":
+            self._send(200, registry.render().encode("utf-8"), "text/plain; version=0.0.4")
+        else:
+            self._send(404, {"error": f"Unknown path {self.path}."})
+
+    def do_POST(self) -> None:
+        if self.path != "/records":
+            self._send(404, {"error": f"Unknown path {self.path}."})
+            return
+        with request_seconds.time():
+            status, payload = self._ingest()
+            self._send(status, payload)
+
+    def _ingest(self) -> Tuple[int, dict]:
+        try:
+            length = int(self.headers.get("Content-Length", ""))
+        except ValueError:
+            return 411, {"error": "Content-Length is required."}
+        if length < 0:
+            # rfile.read(-1) would wait until the client closes the connection
+            self.close_connection = True
+            return 400, {"error": "Content-Length must not be negative."}
+        if length > MAX_BODY_SIZE:
+            # the body is not read, so the connection cannot be reused
+            self.close_connection = True
+            return 413, {"error": f"Batches are limited to {MAX_BODY_SIZE} bytes."}
+        body = self.rfile.read(length)
+        try:
+            fields = parse_body(body, self.headers.get("Content-Type", ""))
+        except (ValueError, UnicodeDecodeError) as e:
+            return 400, {"error": str(e)}
+
+        records, rejected = [], []
+        for position, record_fields in enumerate(fields):
+            try:
+                records.append(validate_record(record_fields))
+            except ValueError as e:
+                rejected.append({"index": position, "error": str(e)})
+        ingested_records.labels("rejected").inc(len(rejected))
+        added = 0
+        if records:
+            try:
+                added = self.server.committer.submit(records)
+            except Exception as e:
+                return 503, {"error": f"Commit failed: {e}", "rejected": rejected}
+        ingested_records.labels("added").inc(added)
+        ingested_records.labels("duplicate").inc(len(records) - added)
+        return (200 if records or not fields else 422), {
+            "accepted": len(records), "added": added, "duplicates": len(records) - added, "rejected": rejected}
+
+    def log_message(self, format: str, *args) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class IngestionServer(ThreadingHTTPServer):
+    """
+    HTTP server with one thread per connection committing to one news feed
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], news_feed: NewsFeed, writer: FeedWriter = None,
+                 batch_size: int = 1000, max_delay: float = 5.0, verbose: bool = False):
+        """
+        :param address: host and port, port 0 picks a free port
+        :param news_feed: feed the records are added to
+        :param writer: FeedWriter of the output file
+        :param batch_size: number of records committed at once at most
+        :param max_delay: milliseconds a commit waits for more requests
+        :param verbose: log every request to stderr
+        """
+        super().__init__(address, IngestionHandler)
+        self.news_feed = news_feed
+        self.verbose = verbose
+        self.committer = BatchCommitter(news_feed, writer, batch_size, max_delay)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.committer.close()
+
+
+def check() -> int:
+    """
+    Commit records with a writer that fails and then recovers and check that a failed commit adds nothing
+    to the feed, that duplicates are written once and that a broken record fails only its own request
+    :return: int: number of failed checks, they are printed
+    """
+    import http.client
+    from task9 import News
+    from task9_dedup import RecordDeduplicator
+
+    class FailingWriter:
+        def __init__(self):
+            self.fail = True
+            self.lines: List[str] = []
+
+        def write_records(self, records) -> None:
+            records = list(records)
+            if self.fail:
+                raise OSError("No space left on device")
+            self.lines.extend(records)
+
+        def flush(self) -> None:
+            pass
+
+    news_feed, writer = NewsFeed(dedup=RecordDeduplicator()), FailingWriter()
+    server = IngestionServer(("127.0.0.1", 0), news_feed, writer, max_delay=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    connection = http.client.HTTPConnection(*server.server_address[:2], timeout=30)
+
+    def post(*texts: str) -> Tuple[int, dict]:
+        body = json.dumps([{"type": "news", "text": text, "city": "London"} for text in texts])
+        connection.request("POST", "/records", body=body, headers={"Content-Type": "application/json"})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+
+    try:
+        failed_status, _ = post("First")
+        failed = (len(news_feed.records), len(writer.lines))
+        writer.fail = False
+        retried_status, retried = post("First")
+        _, duplicates = post("First", "Second", "Second")
+        broken, valid = _Batch([News.__new__(News)]), _Batch([News("Third", "London")])
+        server.committer._commit([broken, valid])
+    finally:
+        connection.close()
+        server.shutdown()
+        server.server_close()
+
+    checks = {
+        "failed commit is not answered with 503": failed_status == 503,
+        "failed commit added records": failed == (0, 0),
+        "retried commit is not added": retried_status == 200 and retried["added"] == 1,
+        "duplicates are written": duplicates["added"] == 1 and len(writer.lines) == 3,
+        "broken record does not fail its request": broken.error is not None,
+        "broken record fails another request": valid.error is None and valid.added == 1,
+        "feed and file differ": [NewsFeed.render_record(record) for record in news_feed.records] == writer.lines,
+    }
+    mismatches = 0
+    for message, passed in checks.items():
+        if not passed:
+            mismatches += 1
+            print(f"Check failed: {message}")
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Receive news feed records over HTTP")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on, local only by default")
+    parser.add_argument("--port", type=int, default=8080, help="port to listen on")
+    parser.add_argument("--output", default="NewsFeed.txt", help="file the committed records are appended to")
+    parser.add_argument("--batch-size", type=int, default=1000, help="records committed at once at most")
+    parser.add_argument("--max-delay", type=float, default=5.0,
+                        help="milliseconds a commit waits for the records of more requests")
+    parser.add_argument("--concurrent", action="store_true",
+                        help="use a ConcurrentNewsFeed, e.g. when records are also added by other threads")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    parser.add_argument("--check", action="store_true",
+                        help="check the commits with a failing writer on a free port instead of serving")
+    args = parser.parse_args()
+
+    if args.check:
+        mismatches = check()
+        print(f"{mismatches} failed checks")
+        if mismatches:
+            raise SystemExit(1)
+        return
+
+    if args.concurrent:
+        from task9_concurrent import ConcurrentNewsFeed
+        news_feed = ConcurrentNewsFeed()
+    else:
+        news_feed = NewsFeed()
+    writer = FeedWriter(args.output)
+    server = IngestionServer((args.host, args.port), news_feed, writer, args.batch_size, args.max_delay,
+                             args.verbose)
+    print(f"Listening on {server.url}, records are appended to {args.output}. Press Ctrl+C to stop.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        writer.close()
+        print(f"{len(news_feed.records)} records received.")
+
+
+if __name__ == "__main__":
+    main()
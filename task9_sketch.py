@@ -0,0 +1,253 @@
+"""
+Approximate word statistics with memory that does not grow with the vocabulary.
+
+CountMinSketch   frequency of every word, never underestimated, overestimated by at most
+                 epsilon * total words with probability 1 - delta
+HyperLogLog      number of distinct words with a standard error of 1.04 / sqrt(2 ** precision)
+TopK             heavy hitters: the k most frequent words by their Count-Min estimates
+
+ApproximateWordCounts combines them behind the part of the Counter interface NewsFeed uses,
+so it can replace NewsFeed.word_counts: NewsFeed(word_counts=ApproximateWordCounts()).
+save_cnt_words then exports the heavy hitters.
+"""
+
+import hashlib
+import math
+from collections import Counter
+from array import array
+from typing import Dict, Iterable, List, Tuple, Union
+
+_MASK_32 = 0xFFFFFFFF
+_MASK_64 = 0xFFFFFFFFFFFFFFFF
+
+
+def hash_word(word: str) -> int:
+    """
+    Get a 64 bit hash of the word which is the same in every process, unlike hash()
+    """
+    return int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class CountMinSketch:
+    """
+    Table of depth rows with width counters, a word increments one counter in every row
+    and its estimate is the smallest of them
+    """
+
+    def __init__(self, epsilon: float = 0.0001, delta: float = 0.001):
+        """
+        :param epsilon: overestimate bound as a fraction of the total count, width is e / epsilon
+        :param delta: probability that an estimate exceeds the bound, depth is ln(1 / delta)
+        """
+        self.epsilon = epsilon
+        self.delta = delta
+        self.width = math.ceil(math.e / epsilon)
+        self.depth = math.ceil(math.log(1 / delta))
+        self.rows = [array("Q", bytes(8 * self.width)) for _ in range(self.depth)]
+        self.total = 0
+
+    def columns(self, word_hash: int) -> Tuple[int, ...]:
+        """
+        Get the counter of every row for a word, row i uses column h1 + i * h2 (double hashing)
+        :param word_hash: hash_word of the word
+        """
+        first, second = word_hash & _MASK_32, word_hash >> 32 | 1
+        width = self.width
+        return tuple((first + i * second) % width for i in range(self.depth))
+
+    def add(self, columns: Tuple[int, ...], count: int = 1) -> int:
+        """
+        Add occurrences of a word
+        :param columns: columns of the word
+        :param count: number of occurrences
+        :return: int: estimate of the word after adding
+        """
+        self.total += count
+        estimate = None
+        for row, column in zip(self.rows, columns):
+            value = row[column] + count
+            row[column] = value
+            if estimate is None or value < estimate:
+                estimate = value
+        return estimate
+
+    def estimate(self, columns: Tuple[int, ...]) -> int:
+        return min(row[column] for row, column in zip(self.rows, columns))
+
+    def error_bound(self) -> float:
+        """
+        Get the overestimate that is not exceeded with probability 1 - delta
+        """
+        return self.epsilon * self.total
+
+    def merge(self, other: "CountMinSketch") -> None:
+        if (self.width, self.depth) != (other.width, other.depth):
+            raise ValueError("Only sketches with the same width and depth can be merged.")
+        for row, other_row in zip(self.rows, other.rows):
+            for column, value in enumerate(other_row):
+                if value:
+                    row[column] += value
+        self.total += other.total
+
+    def memory(self) -> int:
+        return self.width * self.depth * 8
+
+
+class HyperLogLog:
+    """
+    Distinct count estimate from the longest runs of leading zero bits of the hashes in 2 ** precision registers
+    """
+
+    def __init__(self, precision: int = 14):
+        """
+        :param precision: number of index bits, from 4 to 18; memory is 2 ** precision bytes
+        """
+        if not 4 <= precision <= 18:
+            raise ValueError("HyperLogLog precision must be between 4 and 18.")
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(self.size)
+
+    def add(self, word_hash: int) -> None:
+        index = word_hash >> (64 - self.precision)
+        rest = (word_hash << self.precision) & _MASK_64
+        rank = 64 - self.precision + 1 if rest == 0 else 64 - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self) -> int:
+        """
+        Get the estimate of the number of distinct words
+        """
+        size = self.size
+        alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(size, 0.7213 / (1 + 1.079 / size))
+        estimate = alpha * size * size / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * size and zeros:
+            # linear counting is more precise for small cardinalities
+            estimate = size * math.log(size / zeros)
+        return round(estimate)
+
+    def standard_error(self) -> float:
+        return 1.04 / math.sqrt(self.size)
+
+    def merge(self, other: "HyperLogLog") -> None:
+        if self.precision != other.precision:
+            raise ValueError("Only HyperLogLogs with the same precision can be merged.")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+
+class TopK:
+    """
+    The k words with the highest estimates seen so far
+    """
+
+    def __init__(self, k: int = 100):
+        self.k = k
+        self.counts: Dict[str, int] = {}
+        self._min_word = None
+
+    def offer(self, word: str, estimate: int) -> None:
+        """
+        Offer a word with its current estimate
+        """
+        counts = self.counts
+        if word in counts:
+            counts[word] = estimate
+            if word == self._min_word:
+                self._min_word = None
+            return
+        if len(counts) < self.k:
+            counts[word] = estimate
+            self._min_word = None
+            return
+        if self._min_word is None:
+            self._min_word = min(counts, key=counts.get)
+        if estimate > counts[self._min_word]:
+            del counts[self._min_word]
+            counts[word] = estimate
+            self._min_word = None
+
+    def most_common(self, n: int = None) -> List[Tuple[str, int]]:
+        return sorted(self.counts.items(), key=lambda item: item[1], reverse=True)[:n]
+
+
+class ApproximateWordCounts:
+    """
+    Drop-in replacement for the word Counter of NewsFeed with fixed memory
+    """
+
+    def __init__(self, epsilon: float = 0.0001, delta: float = 0.001, precision: int = 14, top_k: int = 1000,
+                 cache_size: int = 10000):
+        """
+        :param epsilon: Count-Min overestimate bound as a fraction of the total number of words
+        :param delta: probability that an estimate exceeds the bound
+        :param precision: HyperLogLog precision of the distinct word count
+        :param top_k: number of heavy hitters kept and exported by NewsFeed.save_cnt_words
+        :param cache_size: number of recently seen words whose columns are kept, frequent words are not hashed again
+        """
+        self.sketch = CountMinSketch(epsilon, delta)
+        self.distinct = HyperLogLog(precision)
+        self.top = TopK(top_k)
+        self.cache_size = cache_size
+        self._columns: Dict[str, Tuple[int, ...]] = {}
+
+    def _word_columns(self, word: str) -> Tuple[int, ...]:
+        columns = self._columns.get(word)
+        if columns is None:
+            word_hash = hash_word(word)
+            # a cached word is already in the HyperLogLog, adding it again would not change it
+            self.distinct.add(word_hash)
+            columns = self.sketch.columns(word_hash)
+            if len(self._columns) >= self.cache_size:
+                self._columns.clear()
+            self._columns[word] = columns
+        return columns
+
+    def update(self, words: Union[Iterable[str], Dict[str, int], "ApproximateWordCounts"]) -> None:
+        """
+        Count words like Counter.update: an iterable of words, a mapping of counts or another sketch
+        """
+        if isinstance(words, ApproximateWordCounts):
+            self.merge(words)
+            return
+        if not hasattr(words, "items"):
+            # repeated words of a text are hashed once
+            words = Counter(words)
+        sketch, top, cache = self.sketch, self.top, self._columns
+        for word, count in words.items():
+            columns = cache.get(word) or self._word_columns(word)
+            top.offer(word, sketch.add(columns, count))
+
+    def merge(self, other: "ApproximateWordCounts") -> None:
+        self.sketch.merge(other.sketch)
+        self.distinct.merge(other.distinct)
+        for word in set(self.top.counts) | set(other.top.counts):
+            self.top.offer(word, self[word])
+
+    def __getitem__(self, word: str) -> int:
+        return self.sketch.estimate(self.sketch.columns(hash_word(word)))
+
+    def get(self, word: str, default: int = 0) -> int:
+        return self[word] or default
+
+    def most_common(self, n: int = None) -> List[Tuple[str, int]]:
+        return self.top.most_common(n)
+
+    def items(self) -> List[Tuple[str, int]]:
+        """
+        Get the heavy hitters with their estimates, most frequent first
+        """
+        return self.most_common()
+
+    def total(self) -> int:
+        return self.sketch.total
+
+    def distinct_count(self) -> int:
+        return self.distinct.count()
+
+    def memory(self) -> int:
+        """
+        Get the approximate memory of the sketches in bytes, it does not depend on the vocabulary
+        """
+        return self.sketch.memory() + self.distinct.size + (self.top.k + self.cache_size) * 100
@@ -0,0 +1,399 @@
+"""
+Binary snapshot of a NewsFeed: records, word counts and letter counts in one versioned file.
+
+Layout (little endian):
+    header      magic, version, flags, record count, offsets of the sections, total_letters
+    records     per record: u8 type, i32 city index (-1 if none), i64 timestamp, i64 value, length prefixed text
+    cities      u32 count, then length prefixed utf-8 strings; records refer to cities by index
+    index       u64 offset of every record, 8 byte aligned, so the file can be memory mapped
+                and a record can be read without reading the records before it
+    counters    word counts, letter counts and uppercase letter counts: u64 count,
+                then length prefixed utf-8 keys with u64 values
+    sketch      instead of the word counts if FLAG_APPROXIMATE_WORDS is set: the parameters of an
+                ApproximateWordCounts, its Count-Min rows as u64, its HyperLogLog registers as u8
+                and its heavy hitters as counters
+
+Timestamps are seconds since 1970-01-01 of naive datetimes: creation date of news and weather records,
+expiration date of private ads. The value is the temperature of weather records and days left of private ads
+at saving time; days left of loaded private ads are computed from the expiration date.
+Version 1 snapshots have no flags and are read like version 2 snapshots without flags.
+"""
+
+import mmap
+import os
+import struct
+from array import array
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Iterator, List, Union
+
+from task9 import News, NewsFeed, PrivateAd, Record, Weather
+from task9_sketch import ApproximateWordCounts
+
+MAGIC = b"NFSNAP\x00\x00"
+VERSION = 2
+SUPPORTED_VERSIONS = (1, 2)
+FLAG_APPROXIMATE_WORDS = 1
+
+HEADER = struct.Struct("<8sIIQQQQQQQq")
+RECORD = struct.Struct("<BiqqI")
+LENGTH = struct.Struct("<I")
+COUNT = struct.Struct("<Q")
+# epsilon, delta, width, depth, precision, top k, cache size, total words
+SKETCH = struct.Struct("<ddIIIIIQ")
+
+TYPE_RECORD, TYPE_NEWS, TYPE_PRIVATE_AD, TYPE_WEATHER = range(4)
+NEWS_DATE_FORMAT = "%d/%m/%Y %H.%M"
+WEATHER_DATE_FORMAT = "%d/%m/%Y"
+EPOCH = datetime(1970, 1, 1)
+
+
+class SnapshotError(Exception):
+    """
+    Raised when a file is not a snapshot or has an unsupported version
+    """
+
+
+def to_timestamp(date: datetime) -> int:
+    return int((date - EPOCH).total_seconds())
+
+
+def from_timestamp(timestamp: int) -> datetime:
+    return EPOCH + timedelta(seconds=timestamp)
+
+
+def _write_string(file, value: str) -> None:
+    data = value.encode("utf-8")
+    file.write(LENGTH.pack(len(data)))
+    file.write(data)
+
+
+def _write_counter(file, counter: dict) -> None:
+    file.write(COUNT.pack(len(counter)))
+    for key, count in counter.items():
+        _write_string(file, key)
+        file.write(COUNT.pack(count))
+
+
+def _write_sketch(file, counts) -> None:
+    sketch, distinct, top = counts.sketch, counts.distinct, counts.top
+    file.write(SKETCH.pack(sketch.epsilon, sketch.delta, sketch.width, sketch.depth, distinct.precision, top.k,
+                           counts.cache_size, sketch.total))
+    for row in sketch.rows:
+        row.tofile(file)
+    file.write(distinct.registers)
+    _write_counter(file, top.counts)
+
+
+def _align(file, alignment: int = 8) -> int:
+    position = file.tell()
+    padding = -position % alignment
+    file.write(b"\x00" * padding)
+    return position + padding
+
+
+def save_snapshot(news_feed: NewsFeed, file_path: str) -> None:
+    """
+    Save records and statistics of the news feed to a binary snapshot.
+    The snapshot is written to a temporary file first, so an existing snapshot is never left half written
+    :param news_feed: NewsFeed to save
+    :param file_path: path of the snapshot file
+    """
+    cities = {}
+    timestamps = {}
+    offsets = array("Q")
+    approximate = isinstance(news_feed.word_counts, ApproximateWordCounts)
+    if not approximate and not isinstance(news_feed.word_counts, dict):
+        raise TypeError(f"Word counts of type {type(news_feed.word_counts).__name__} cannot be saved to a snapshot, "
+                        f"use a Counter or an ApproximateWordCounts.")
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(b"\x00" * HEADER.size)
+
+        # records come first, the city table is only complete after all of them are seen
+        records_offset = file.tell()
+        for record in news_feed.records:
+            offsets.append(file.tell())
+            record_type, city, timestamp, value = _record_fields(record, timestamps)
+            city_index = cities.setdefault(city, len(cities)) if city is not None else -1
+            text = record.text.encode("utf-8")
+            file.write(RECORD.pack(record_type, city_index, timestamp, value, len(text)))
+            file.write(text)
+
+        cities_offset = file.tell()
+        file.write(LENGTH.pack(len(cities)))
+        for city in cities:
+            _write_string(file, city)
+
+        index_offset = _align(file)
+        offsets.tofile(file)
+
+        words_offset = file.tell()
+        if approximate:
+            _write_sketch(file, news_feed.word_counts)
+        else:
+            _write_counter(file, news_feed.word_counts)
+        letters_offset = file.tell()
+        _write_counter(file, news_feed.letter_counts)
+        uppercase_offset = file.tell()
+        _write_counter(file, news_feed.total_uppercase_letters)
+
+        file.seek(0)
+        flags = FLAG_APPROXIMATE_WORDS if approximate else 0
+        file.write(HEADER.pack(MAGIC, VERSION, flags, len(news_feed.records), cities_offset, records_offset,
+                               index_offset, words_offset, letters_offset, uppercase_offset,
+                               news_feed.total_letters))
+    os.replace(tmp_path, file_path)
+
+
+def _record_fields(record: Record, timestamps: dict) -> tuple:
+    """
+    Get (type, city, timestamp, value) of a record for the snapshot
+    :param record: record to save
+    :param timestamps: cache of parsed dates, records of one run mostly share the same date
+    """
+    if isinstance(record, News):
+        return TYPE_NEWS, record.city, _parse_date(record.date, NEWS_DATE_FORMAT, timestamps), 0
+    if isinstance(record, PrivateAd):
+        return TYPE_PRIVATE_AD, None, to_timestamp(record.expiration_date), record.days_left
+    if isinstance(record, Weather):
+        return (TYPE_WEATHER, record.city, _parse_date(record.date, WEATHER_DATE_FORMAT, timestamps),
+                record.temperature)
+    return TYPE_RECORD, None, 0, 0
+
+
+def _parse_date(date: str, date_format: str, timestamps: dict) -> int:
+    timestamp = timestamps.get(date)
+    if timestamp is None:
+        timestamp = timestamps[date] = to_timestamp(datetime.strptime(date, date_format))
+    return timestamp
+
+
+class FeedSnapshot:
+    """
+    Memory mapped snapshot. Opening reads only the header and the city table,
+    records and counters are decoded when they are accessed
+    """
+
+    def __init__(self, file_path: str):
+        """
+        Open a snapshot
+        :param file_path: path of the snapshot file
+        """
+        self._file = open(file_path, "rb")
+        try:
+            self._buf = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise SnapshotError(f"Empty snapshot file: {file_path}")
+        if len(self._buf) < HEADER.size:
+            self.close()
+            raise SnapshotError(f"Not a news feed snapshot: {file_path}")
+        (magic, version, self.flags, self.record_count, cities_offset, self._records_offset, index_offset,
+         self._words_offset, self._letters_offset, self._uppercase_offset,
+         self.total_letters) = HEADER.unpack_from(self._buf, 0)
+        if magic != MAGIC:
+            self.close()
+            raise SnapshotError(f"Not a news feed snapshot: {file_path}")
+        if version not in SUPPORTED_VERSIONS:
+            self.close()
+            raise SnapshotError(f"Unsupported snapshot version {version}: {file_path}")
+
+        self._view = memoryview(self._buf)
+        self._index = self._view[index_offset:index_offset + self.record_count * COUNT.size].cast("Q")
+        self.cities = self._read_strings(cities_offset)
+
+    def _read_strings(self, offset: int) -> List[str]:
+        (count,) = LENGTH.unpack_from(self._buf, offset)
+        offset += LENGTH.size
+        strings = []
+        for _ in range(count):
+            (length,) = LENGTH.unpack_from(self._buf, offset)
+            offset += LENGTH.size
+            strings.append(str(self._view[offset:offset + length], "utf-8"))
+            offset += length
+        return strings
+
+    def _read_counter(self, offset: int) -> Counter:
+        buf, view = self._buf, self._view
+        (count,) = COUNT.unpack_from(buf, offset)
+        offset += COUNT.size
+        counter = Counter()
+        for _ in range(count):
+            (length,) = LENGTH.unpack_from(buf, offset)
+            offset += LENGTH.size
+            key = str(view[offset:offset + length], "utf-8")
+            offset += length
+            (counter[key],) = COUNT.unpack_from(buf, offset)
+            offset += COUNT.size
+        return counter
+
+    def __len__(self) -> int:
+        return self.record_count
+
+    def __getitem__(self, position: int) -> Record:
+        """
+        Decode one record, records are restored without calling __init__,
+        so their dates are the dates of the original records and not the time of loading
+        """
+        if position < 0:
+            position += self.record_count
+        if not 0 <= position < self.record_count:
+            raise IndexError("snapshot record index out of range")
+        offset = self._index[position]
+        record_type, city_index, timestamp, value, length = RECORD.unpack_from(self._buf, offset)
+        offset += RECORD.size
+        text = str(self._view[offset:offset + length], "utf-8")
+        city = self.cities[city_index] if city_index >= 0 else None
+
+        if record_type == TYPE_NEWS:
+            record = News.__new__(News)
+            record.city = city
+            record.date = from_timestamp(timestamp).strftime(NEWS_DATE_FORMAT)
+        elif record_type == TYPE_PRIVATE_AD:
+            record = PrivateAd.__new__(PrivateAd)
+            record.expiration_date = from_timestamp(timestamp)
+        elif record_type == TYPE_WEATHER:
+            record = Weather.__new__(Weather)
+            record.city = city
+            record.temperature = value
+            record.date = from_timestamp(timestamp).strftime(WEATHER_DATE_FORMAT)
+        else:
+            record = Record.__new__(Record)
+        record.text = text
+        return record
+
+    def __iter__(self) -> Iterator[Record]:
+        for position in range(self.record_count):
+            yield self[position]
+
+    @property
+    def approximate(self) -> bool:
+        """
+        True if the word counts are an ApproximateWordCounts
+        """
+        return bool(self.flags & FLAG_APPROXIMATE_WORDS)
+
+    def word_counts(self) -> Union[Counter, ApproximateWordCounts]:
+        """
+        Get the word counts: a Counter, or an ApproximateWordCounts if the snapshot is approximate
+        """
+        if self.approximate:
+            return self._read_sketch(self._words_offset)
+        return self._read_counter(self._words_offset)
+
+    def _read_sketch(self, offset: int) -> ApproximateWordCounts:
+        epsilon, delta, width, depth, precision, top_k, cache_size, total = SKETCH.unpack_from(self._buf, offset)
+        offset += SKETCH.size
+        counts = ApproximateWordCounts(epsilon, delta, precision, top_k, cache_size)
+        sketch = counts.sketch
+        if (sketch.width, sketch.depth) != (width, depth):
+            raise SnapshotError(f"Count-Min sketch of {width}x{depth} does not match epsilon {epsilon} "
+                                f"and delta {delta}")
+        for row in sketch.rows:
+            row[:] = array("Q", bytes(self._view[offset:offset + width * COUNT.size]))
+            offset += width * COUNT.size
+        sketch.total = total
+        counts.distinct.registers = bytearray(self._view[offset:offset + counts.distinct.size])
+        offset += counts.distinct.size
+        counts.top.counts = dict(self._read_counter(offset))
+        return counts
+
+    def letter_counts(self) -> Counter:
+        return self._read_counter(self._letters_offset)
+
+    def total_uppercase_letters(self) -> dict:
+        return dict(self._read_counter(self._uppercase_offset))
+
+    def to_news_feed(self) -> NewsFeed:
+        """
+        Restore the whole news feed
+        :return: NewsFeed: news feed with the records and statistics of the snapshot
+        """
+        news_feed = NewsFeed(self.word_counts())
+        news_feed.records = list(self)
+        news_feed.letter_counts = self.letter_counts()
+        news_feed.total_uppercase_letters = self.total_uppercase_letters()
+        news_feed.total_letters = self.total_letters
+        return news_feed
+
+    def close(self) -> None:
+        if getattr(self, "_view", None) is not None:
+            self._index.release()
+            self._view.release()
+            self._view = None
+        if not self._buf.closed:
+            self._buf.close()
+        self._file.close()
+
+    def __enter__(self) -> "FeedSnapshot":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+def load_snapshot(file_path: str) -> NewsFeed:
+    """
+    Restore a news feed from a binary snapshot
+    :param file_path: path of the snapshot file
+    :return: NewsFeed: restored news feed
+    """
+    with FeedSnapshot(file_path) as snapshot:
+        return snapshot.to_news_feed()
+
+
+def check(records: int = 10000, seed: int = 0) -> int:
+    """
+    Save and load feeds with exact and with approximate word counts and compare them with the originals
+    :return: int: number of mismatches, they are printed
+    """
+    import tempfile
+    from task9_benchmark import build_records
+    built = build_records(records, seed)
+    mismatches = 0
+    with tempfile.TemporaryDirectory() as folder:
+        for word_counts in (None, ApproximateWordCounts(top_k=100)):
+            name = "exact" if word_counts is None else "approximate"
+            news_feed = NewsFeed(word_counts)
+            for record in built:
+                news_feed.add_record(record)
+            file_path = os.path.join(folder, f"{name}.snapshot")
+            save_snapshot(news_feed, file_path)
+            loaded = load_snapshot(file_path)
+            expected, actual = news_feed.word_counts, loaded.word_counts
+            if word_counts is not None:
+                # compare the state of the sketches, the heavy hitters alone do not cover every estimate
+                expected = (expected.sketch.rows, expected.sketch.total, expected.distinct.registers,
+                            expected.top.counts)
+                actual = (actual.sketch.rows, actual.sketch.total, actual.distinct.registers, actual.top.counts)
+            comparisons = {
+                "records": ([record.publish() for record in news_feed.records],
+                            [record.publish() for record in loaded.records]),
+                "word counts": (expected, actual),
+                "letter counts": (news_feed.letter_counts, loaded.letter_counts),
+                "uppercase letters": (news_feed.total_uppercase_letters, loaded.total_uppercase_letters),
+                "total letters": (news_feed.total_letters, loaded.total_letters),
+            }
+            for part, (before, after) in comparisons.items():
+                if before != after:
+                    mismatches += 1
+                    print(f"Mismatch of the {part} of the {name} snapshot")
+    return mismatches
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Check the binary news feed snapshot")
+    parser.add_argument("--check", type=int, default=10000, metavar="RECORDS",
+                        help="save and load feeds with this many generated records")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the generated records")
+    args = parser.parse_args()
+    mismatches = check(args.check, args.seed)
+    print(f"{args.check} records, {mismatches} mismatches")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Batch text normalization of a folder of documents with a pool of processes.
+Every document goes through normalize_text -> capitalize_first_word -> last-words sentence with the streaming
+normalizer of task9_text_stream, so large documents do not need to fit in memory either.
+Documents are sent to the workers in chunks of several files, so thousands of small files
+do not spend their time in inter-process communication.
+
+Run: python task9_text_batch.py documents --output-dir formatted --workers 4 --report timings.csv
+"""
+
+import argparse
+import csv
+import fnmatch
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+from task9_text_stream import CHUNK_SIZE, formatted_path, process_document
+
+
+def find_documents(folder_path: str, pattern: str = "*.txt", recursive: bool = False) -> List[str]:
+    """
+    Find the documents of a folder, formatted documents of an earlier run are skipped
+    :param folder_path: folder with the documents
+    :param pattern: file name pattern, e.g. *.txt or *.txt.gz
+    :param recursive: also search the subfolders
+    :return: List[str]: sorted paths of the documents
+    """
+    documents = []
+    for root, folders, files in os.walk(folder_path):
+        for file_name in files:
+            if fnmatch.fnmatch(file_name, pattern) and ".formatted." not in file_name:
+                documents.append(os.path.join(root, file_name))
+        if not recursive:
+            break
+    return sorted(documents)
+
+
+def output_path(input_path: str, folder_path: str, output_dir: Optional[str]) -> str:
+    """
+    Get the path of the formatted document: next to the source or at the same relative path in output_dir
+    """
+    if output_dir is None:
+        return formatted_path(input_path)
+    return os.path.join(output_dir, os.path.relpath(input_path, folder_path))
+
+
+def format_file(job: Tuple[str, str, int]) -> dict:
+    """
+    Format one document in a worker process
+    :param job: source path, output path and number of characters read at once
+    :return: dict: path, size, seconds and statistics of the document, or the error
+    """
+    input_path, result_path, chunk_size = job
+    start = time.perf_counter()
+    result = {"path": input_path, "output": result_path, "bytes": 0, "characters": 0, "whitespace": 0,
+              "sentences": 0, "error": ""}
+    try:
+        result["bytes"] = os.path.getsize(input_path)
+        os.makedirs(os.path.dirname(result_path) or ".", exist_ok=True)
+        result.update(process_document(input_path, result_path, chunk_size))
+    except Exception as e:
+        result["error"] = str(e)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def default_chunksize(files: int, workers: int) -> int:
+    """
+    Get the number of files sent to a worker at once: about four chunks per worker, like multiprocessing.Pool.map
+    """
+    chunksize, extra = divmod(files, workers * 4)
+    return max(1, chunksize + bool(extra))
+
+
+def format_documents(documents: List[str], folder_path: str, output_dir: str = None, workers: int = None,
+                     chunksize: int = None, chunk_size: int = CHUNK_SIZE) -> List[dict]:
+    """
+    Format documents with a pool of processes
+    :param documents: paths of the documents
+    :param folder_path: folder the documents were found in, their paths in output_dir are relative to it
+    :param output_dir: folder of the formatted documents, next to the sources if None
+    :param workers: number of processes, the number of CPUs by default
+    :param chunksize: number of documents sent to a worker at once, computed from the number of documents if None
+    :param chunk_size: number of characters a worker reads from a document at once
+    :return: List[dict]: result of every document in the order of documents
+    """
+    workers = workers or os.cpu_count() or 1
+    chunksize = chunksize or default_chunksize(len(documents), workers)
+    jobs = [(path, output_path(path, folder_path, output_dir), chunk_size) for path in documents]
+    if workers == 1:
+        return [format_file(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(format_file, jobs, chunksize=chunksize))
+
+
+def save_report(results: List[dict], file_path: str) -> None:
+    """
+    Save the per-file timings to a CSV file
+    """
+    headers = ["path", "output", "bytes", "characters", "whitespace", "sentences", "seconds", "error"]
+    with open(file_path, "w", newline="") as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=headers, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Normalize all text documents of a folder in parallel")
+    parser.add_argument("folder_path", help="folder with the documents")
+    parser.add_argument("--pattern", default="*.txt", help="file name pattern of the documents")
+    parser.add_argument("--recursive", action="store_true", help="also format the documents of subfolders")
+    parser.add_argument("--output-dir", help="folder of the formatted documents, next to the sources by default")
+    parser.add_argument("--workers", type=int, help="number of processes, the number of CPUs by default")
+    parser.add_argument("--chunksize", type=int, help="documents sent to a worker at once")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="characters read from a document at once")
+    parser.add_argument("--report", help="CSV file for the per-file timings")
+    parser.add_argument("--slowest", type=int, default=10, help="number of the slowest documents to print")
+    args = parser.parse_args()
+
+    documents = find_documents(args.folder_path, args.pattern, args.recursive)
+    if not documents:
+        print("No documents found in the specified folder.")
+        return
+    start = time.perf_counter()
+    results = format_documents(documents, args.folder_path, args.output_dir, args.workers, args.chunksize,
+                               args.chunk_size)
+    elapsed = time.perf_counter() - start
+
+    failed = [result for result in results if result["error"]]
+    for result in failed:
+        print(f"An error occurred while formatting {result['path']}: {result['error']}")
+    print(f"\n{'document':<48}{'KB':>10}{'seconds':>10}{'MB/s':>8}")
+    for result in sorted(results, key=lambda item: item["seconds"], reverse=True)[:args.slowest]:
+        speed = result["bytes"] / result["seconds"] / 1024 / 1024 if result["seconds"] else 0.0
+        print(f"{os.path.relpath(result['path'], args.folder_path):<48}{result['bytes'] / 1024:>10.1f}"
+              f"{result['seconds']:>10.3f}{speed:>8.1f}")
+    total_bytes = sum(result["bytes"] for result in results)
+    busy = sum(result["seconds"] for result in results)
+    print(f"\n{len(results) - len(failed)} documents formatted, {len(failed)} failed, "
+          f"{total_bytes / 1024 / 1024:.1f} MB in {elapsed:.2f}s: {len(results) / elapsed:.0f} documents/s, "
+          f"{total_bytes / 1024 / 1024 / elapsed:.1f} MB/s ({busy:.2f}s of worker time)")
+    if args.report:
+        save_report(results, args.report)
+        print(f"Per-file timings saved to {args.report}")
+    if failed:
+        # scripts running the batch can tell a partial failure from success
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
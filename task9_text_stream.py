@@ -0,0 +1,249 @@
+"""
+Streaming version of the text processing of task9_imp_module / task4_str for documents too large for memory.
+The document is read in chunks and in one pass produces the same output as
+
+    tokens = Tokens(normalize_text(text))
+    add_last_words_sentence(tokens.capitalized(), tokens.last_words)
+
+together with count_whitespace_characters(text).
+
+Every step keeps the text it cannot process yet, because its result may depend on the next chunk:
+- lower() looks at the neighbouring letters of a capital sigma, text is lowered up to the last whitespace
+- corrections never contain whitespace, so the lowered text, which ends at a whitespace, is corrected at once
+- sentences are capitalized up to the last sentence boundary which is followed by a word
+- the last word of the current '.' sentence is kept until its '.' arrives
+
+So the memory is bounded by the chunk size and the longest sentence, not by the document.
+The last words are spilled to a temporary file until the last-words sentence is written.
+
+Run: python task9_text_stream.py document.txt --output formatted.txt
+     python task9_text_stream.py --check 1000
+"""
+
+import argparse
+import io
+import os
+import random
+import re
+import tempfile
+import time
+from typing import TextIO
+
+from task9_corrections import DEFAULT_CORRECTIONS, Corrections
+from task9_imp_module import (Tokens, add_last_words_sentence, capitalize_first_word, count_whitespace_characters,
+                              normalize_text)
+from task9_io import open_file
+
+CHUNK_SIZE = 1024 * 1024
+
+# end of a sentence boundary of capitalize_first_word after which the text can be processed separately:
+# the whitespace after the punctuation ends before a word and its last character is not a newline,
+# which would start another, empty, sentence
+_SENTENCE_CUT = re.compile(r"[.?!:\n]\s*[^\S\n](?=\S)")
+
+
+def _last_word_start(segment: str) -> str:
+    """
+    Get the segment from the start of its last word, the part Tokens.last_words can still use
+    """
+    stripped = segment.rstrip()
+    start = len(stripped)
+    while start and not stripped[start - 1].isspace():
+        start -= 1
+    return segment[start:] if stripped else ""
+
+
+class StreamingNormalizer:
+    """
+    Normalizes a document fed in chunks of any size and writes the formatted text to output
+    """
+
+    def __init__(self, output: TextIO, spill_folder: str = None, corrections: Corrections = DEFAULT_CORRECTIONS):
+        """
+        :param output: text file the formatted text is written to
+        :param spill_folder: folder of the temporary file with the last words, the system default if None
+        :param corrections: whole-word replacements of normalize_text
+        """
+        self.output = output
+        self.corrections = corrections
+        self.characters = 0
+        self.whitespace = 0
+        self.sentences = 0
+        self._raw = ""
+        self._normalized = ""
+        self._segment = ""
+        self._last_words = tempfile.TemporaryFile("w+", encoding="utf-8", newline="\n", dir=spill_folder)
+
+    def feed(self, chunk: str) -> None:
+        """
+        Process the next chunk of the document
+        """
+        self.characters += len(chunk)
+        self.whitespace += chunk.count(" ") + chunk.count("\t") + chunk.count("\n")
+        raw = self._raw + chunk
+        # whitespace is neither cased nor case-ignorable, lower() of the text before it does not depend on the rest
+        cut = max(raw.rfind(" "), raw.rfind("\t"), raw.rfind("\n")) + 1
+        self._raw = raw[cut:]
+        if cut:
+            self._feed_normalized(self.corrections.apply(raw[:cut].lower()))
+
+    def _feed_normalized(self, normalized: str, final: bool = False) -> None:
+        self._collect_last_words(normalized)
+        carried = self._normalized
+        text = carried + normalized
+        cut = len(text) if final else 0
+        if not final:
+            # a boundary ending in the new text starts at the punctuation before the trailing whitespace of the carry
+            start = max(0, len(carried.rstrip()) - 1)
+            for match in _SENTENCE_CUT.finditer(text, start):
+                cut = match.end()
+        self._normalized = text[cut:]
+        if cut:
+            self.output.write(capitalize_first_word(text[:cut]))
+
+    def _collect_last_words(self, normalized: str) -> None:
+        tokens = Tokens(self._segment + normalized)
+        last_words = tokens.closed_last_words
+        if last_words:
+            self._last_words.writelines([word + "\n" for word in last_words])
+            self.sentences += len(last_words)
+        self._segment = _last_word_start(tokens.tail)
+
+    def close(self) -> dict:
+        """
+        Process the rest of the document and write the last-words sentence
+        :return: dict: number of characters, whitespace characters and sentences of the document
+        """
+        raw, self._raw = self._raw, ""
+        self._feed_normalized(self.corrections.apply(raw.lower()), final=True)
+        words = self._segment.split()
+        if words:
+            self._last_words.write(words[-1] + "\n")
+            self.sentences += 1
+        self._segment = ""
+
+        self.output.write("\n\n")
+        self._last_words.seek(0)
+        for position, line in enumerate(self._last_words):
+            word = line[:-1]
+            # capitalize() of the whole sentence lowercases the words after the first one, corrections may
+            # have put capitals into them
+            self.output.write(word.capitalize() if position == 0 else " " + word.lower())
+        self.output.write(".")
+        self._last_words.close()
+        return {"characters": self.characters, "whitespace": self.whitespace, "sentences": self.sentences}
+
+
+def process_document(input_path: str, output_path: str, chunk_size: int = CHUNK_SIZE,
+                     encoding: str = "utf-8", corrections: Corrections = DEFAULT_CORRECTIONS) -> dict:
+    """
+    Write the normalized and capitalized document with the last-words sentence in one pass
+    :param input_path: document, a compression suffix like .gz is decompressed while reading
+    :param output_path: formatted document
+    :param chunk_size: number of characters read at once
+    :param encoding: encoding of both files
+    :param corrections: whole-word replacements of normalize_text
+    :return: dict: number of characters, whitespace characters and sentences of the document
+    :raises ValueError: if output_path is the document itself
+    """
+    if os.path.realpath(input_path) == os.path.realpath(output_path):
+        raise ValueError(f"The formatted document would overwrite its source {input_path}.")
+    # written to a temporary file next to output_path and moved in place at the end,
+    # so a failed run never leaves a truncated document behind; the name keeps the compression suffix
+    folder, file_name = os.path.split(output_path)
+    tmp_path = os.path.join(folder, f".{os.getpid()}.{file_name}")
+    try:
+        with open_file(input_path, encoding=encoding, newline="") as source, \
+                open_file(tmp_path, "w", encoding=encoding, newline="") as output:
+            normalizer = StreamingNormalizer(output, corrections=corrections)
+            while True:
+                chunk = source.read(chunk_size)
+                if not chunk:
+                    break
+                normalizer.feed(chunk)
+            stats = normalizer.close()
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return stats
+
+
+def format_text(text: str, corrections: Corrections = DEFAULT_CORRECTIONS) -> str:
+    """
+    In-memory result the streaming normalizer reproduces
+    """
+    tokens = Tokens(normalize_text(text, corrections))
+    return add_last_words_sentence(tokens.capitalized(), tokens.last_words)
+
+
+def check(samples: int = 1000, seed: int = 0) -> int:
+    """
+    Compare the streaming normalizer with the in-memory functions on random texts cut into random chunks
+    :return: int: number of mismatches, they are printed
+    """
+    rng = random.Random(seed)
+    rule_sets = [DEFAULT_CORRECTIONS, Corrections({"iz": "is", "i": "I.", "wrd": "word", "x.": "ex", "σ": "Σ!"})]
+    pieces = [" ", "  ", "\t", "\n", "\n\n", ".", "?", "!", ":", ". ", ".\n", " iz ", "iz", " i", "z ", "IZ",
+              "Iz", "word", "Word", "ΟΔΟΣ", "Σ", "σ", "İ", "ß", "“iZ”", "x", "\r\n", " ", "\x1c",
+              "wrd", "x.", "iz."]
+    mismatches = 0
+    for _ in range(samples):
+        text = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 60)))
+        corrections = rng.choice(rule_sets)
+        expected = format_text(text, corrections), count_whitespace_characters(text)
+        sizes = rng.choice([1, 2, 3, 5, 8, 1000])
+        output = io.StringIO()
+        normalizer = StreamingNormalizer(output, corrections=corrections)
+        position = 0
+        while position < len(text):
+            size = rng.randint(1, sizes)
+            normalizer.feed(text[position:position + size])
+            position += size
+        stats = normalizer.close()
+        actual = output.getvalue(), stats["whitespace"]
+        if actual != expected:
+            mismatches += 1
+            print(f"Mismatch for {text!r}:\n  expected {expected!r}\n  actual   {actual!r}")
+    return mismatches
+
+
+def formatted_path(file_path: str) -> str:
+    """
+    Get the default path of the formatted document: .formatted before the extension, e.g. notes.formatted.txt
+    """
+    folder, file_name = os.path.split(file_path)
+    base, dot, extension = file_name.partition(".")
+    return os.path.join(folder, f"{base}.formatted{dot}{extension}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Normalize a large text document in one streaming pass")
+    parser.add_argument("input_path", nargs="?", help="document to format")
+    parser.add_argument("--output", help="formatted document, input_path with .formatted before the suffix by default")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="characters read at once")
+    parser.add_argument("--corrections", help="JSON file of whole-word replacements, iz -> is by default")
+    parser.add_argument("--check", type=int, metavar="SAMPLES",
+                        help="compare with the in-memory functions on random texts instead")
+    args = parser.parse_args()
+
+    if args.check is not None:
+        mismatches = check(args.check)
+        print(f"{args.check} samples, {mismatches} mismatches")
+        return
+    if not args.input_path:
+        parser.error("input_path is required")
+    output_path = args.output or formatted_path(args.input_path)
+    start = time.perf_counter()
+    corrections = Corrections.load(args.corrections) if args.corrections else DEFAULT_CORRECTIONS
+    stats = process_document(args.input_path, output_path, args.chunk_size, corrections=corrections)
+    elapsed = time.perf_counter() - start
+    print(f"Formatted text saved to {output_path}")
+    print(f"Number of whitespace characters: {stats['whitespace']}")
+    print(f"{stats['characters']} characters, {stats['sentences']} sentences in {elapsed:.2f}s, "
+          f"{stats['characters'] / elapsed / 1024 / 1024 if elapsed else 0:.1f} M characters/s")
+
+
+if __name__ == "__main__":
+    main()
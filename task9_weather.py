@@ -0,0 +1,138 @@
+"""
+Per-city index of weather records maintained while records are added.
+Every city keeps its count, minimum, maximum and sum of temperatures, running sums over the last
+readings of each rolling window and a histogram of the temperature bands of Weather.publish,
+so the current conditions of all cities are read in O(cities) without scanning NewsFeed.records.
+
+Use: NewsFeed(weather_index=WeatherIndex()), the index is updated by add_record and merge.
+"""
+
+import threading
+from collections import deque
+from typing import Dict, List, Sequence
+
+from task9 import Weather, temperature_band
+
+TEMPERATURE_BANDS = ("cold", "cool", "warm", "hot")
+
+
+class CityWeather:
+    """
+    Statistics of the temperatures of one city
+    """
+
+    def __init__(self, city: str, windows: Sequence[int]):
+        """
+        :param city: name of the city
+        :param windows: sizes of the rolling windows in number of readings
+        """
+        self.city = city
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.total = 0
+        self.last = None
+        self.last_date = None
+        self.bands = dict.fromkeys(TEMPERATURE_BANDS, 0)
+        self.windows = tuple(windows)
+        # the longest window holds the readings of all windows, every window keeps a running sum
+        self._readings = deque(maxlen=max(self.windows, default=0))
+        self._sums = [0] * len(self.windows)
+
+    def add(self, temperature: int, date: str = None) -> None:
+        """
+        Add a reading in O(number of windows)
+        """
+        readings = self._readings
+        for position, window in enumerate(self.windows):
+            self._sums[position] += temperature
+            if len(readings) >= window:
+                # the reading leaving this window
+                self._sums[position] -= readings[-window]
+        readings.append(temperature)
+
+        self.count += 1
+        self.total += temperature
+        if self.min is None or temperature < self.min:
+            self.min = temperature
+        if self.max is None or temperature > self.max:
+            self.max = temperature
+        self.last = temperature
+        self.last_date = date
+        self.bands[temperature_band(temperature)] += 1
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def rolling_mean(self, window: int) -> float:
+        """
+        Get the mean of the last readings
+        :param window: one of the window sizes of the index
+        """
+        position = self.windows.index(window)
+        readings = min(window, len(self._readings))
+        return self._sums[position] / readings if readings else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "city": self.city,
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+            "mean": self.mean,
+            "last": self.last,
+            "last_date": self.last_date,
+            "band": temperature_band(self.last) if self.count else None,
+            "rolling_means": {window: self.rolling_mean(window) for window in self.windows},
+            "bands": dict(self.bands),
+        }
+
+
+class WeatherIndex:
+    """
+    Weather statistics per city, safe to update from several threads
+    """
+
+    def __init__(self, windows: Sequence[int] = (10, 100)):
+        """
+        :param windows: sizes of the rolling windows in number of readings of a city
+        """
+        self.windows = tuple(windows)
+        self.cities: Dict[str, CityWeather] = {}
+        self._lock = threading.Lock()
+
+    def add(self, record: Weather) -> None:
+        with self._lock:
+            city = self.cities.get(record.city)
+            if city is None:
+                city = self.cities[record.city] = CityWeather(record.city, self.windows)
+            city.add(record.temperature, record.date)
+
+    def add_records(self, records) -> None:
+        """
+        Add the weather records of an iterable of records, other records are ignored
+        """
+        for record in records:
+            if isinstance(record, Weather):
+                self.add(record)
+
+    def __len__(self) -> int:
+        return len(self.cities)
+
+    def __getitem__(self, city: str) -> CityWeather:
+        return self.cities[city]
+
+    def current_conditions(self) -> List[dict]:
+        """
+        Get the statistics of every city, ordered by city name
+        """
+        with self._lock:
+            return [self.cities[city].to_dict() for city in sorted(self.cities)]
+
+    def bands(self) -> Dict[str, int]:
+        """
+        Get the histogram of the temperature bands of all cities
+        """
+        with self._lock:
+            return {band: sum(city.bands[band] for city in self.cities.values()) for band in TEMPERATURE_BANDS}